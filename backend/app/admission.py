@@ -0,0 +1,186 @@
+"""
+CPU-aware admission control for research requests.
+
+Every research request runs llama.cpp with `threads` cores, so the host can
+only serve a few of them at once before they oversubscribe the CPU and all
+of them slow down. AdmissionController hands out that many slots; excess
+requests wait in a priority queue (interactive UI requests ahead of batch /
+MCP work), are degraded to fewer sources and a smaller token budget when the
+queue is backed up, and are rejected when it is full or they waited too long.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITIES = {"interactive": INTERACTIVE, "batch": BATCH}
+
+# Limits applied to a degraded request
+DEGRADED_MAX_SOURCES = 2
+DEGRADED_MAX_TOKENS = 200
+
+
+class Overloaded(Exception):
+    """The request was not admitted; `retry_after` is a hint in seconds."""
+
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def host_capacity(profile: Optional[dict] = None, threads: int = 6) -> int:
+    """Concurrent generations this host sustains: the autotuned value, else cores / threads."""
+    if profile and profile.get("max_concurrent_generations"):
+        return int(profile["max_concurrent_generations"])
+    return max(1, (os.cpu_count() or 1) // max(1, threads))
+
+
+def parse_priority(value, default: int = INTERACTIVE) -> int:
+    if isinstance(value, int) and value in PRIORITIES.values():
+        return value
+    return PRIORITIES.get(str(value or "").strip().lower(), default)
+
+
+class Ticket:
+    """An admitted request. Release it (or use it as a context manager) when done."""
+
+    def __init__(self, controller: "AdmissionController", priority: int, waited: float, degraded: bool):
+        self.controller = controller
+        self.priority = priority
+        self.waited = waited
+        self.degraded = degraded
+        self._released = False
+
+    def limits(self, max_sources: int, max_tokens: int):
+        """Source and token budgets for this request."""
+        if not self.degraded:
+            return max_sources, max_tokens
+        return min(max_sources, DEGRADED_MAX_SOURCES), min(max_tokens, DEGRADED_MAX_TOKENS)
+
+    def info(self) -> dict:
+        return {"queue_wait_s": round(self.waited, 3), "degraded": self.degraded}
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    def __init__(self, capacity: int, max_queue: Optional[int] = None,
+                 max_wait: float = 120.0, degrade_depth: Optional[int] = None):
+        """
+        capacity       requests that may run at once
+        max_queue      waiting requests of equal or higher priority beyond which
+                       new ones are rejected
+        max_wait       seconds a request may wait before it is rejected
+        degrade_depth  queue depth at which admitted requests are degraded
+        """
+        self.capacity = max(1, capacity)
+        self.max_queue = max_queue if max_queue is not None else 4 * self.capacity
+        self.max_wait = max_wait
+        self.degrade_depth = degrade_depth if degrade_depth is not None else self.capacity
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._queue = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._waits = deque(maxlen=200)
+        self._admitted = 0
+        self._degraded = 0
+        self._rejected = 0
+
+    def acquire(self, priority: int = INTERACTIVE, timeout: Optional[float] = None) -> Ticket:
+        """
+        Block until a slot is free and return a Ticket, or raise Overloaded if
+        the queue is full or the wait exceeds `timeout` (default: max_wait).
+        """
+        timeout = self.max_wait if timeout is None else timeout
+        started = time.monotonic()
+        with self._cond:
+            # Batch work counts the whole queue; interactive only counts its own class
+            ahead = [e for e in self._queue if e[0] <= priority]
+            if self._active >= self.capacity and len(ahead) >= self.max_queue:
+                self._rejected += 1
+                raise Overloaded(f"Server busy: {len(self._queue)} requests already queued",
+                                 retry_after=self._retry_after())
+
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._queue, entry)
+            depth = len(self._queue)
+            try:
+                # Only the head of the queue may take a free slot
+                while self._active >= self.capacity or self._queue[0] != entry:
+                    remaining = timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self._rejected += 1
+                        raise Overloaded(f"Timed out after {timeout:.0f}s waiting for capacity",
+                                         retry_after=self._retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    self._cond.notify_all()
+
+            self._active += 1
+            waited = time.monotonic() - started
+            # Degrade if the queue was backed up when we arrived or still is
+            degraded = max(depth - 1, len(self._queue)) >= self.degrade_depth
+            self._waits.append(waited)
+            self._admitted += 1
+            self._degraded += int(degraded)
+            return Ticket(self, priority, waited, degraded)
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def _retry_after(self) -> int:
+        mean_wait = sum(self._waits) / len(self._waits) if self._waits else 5.0
+        return max(1, int(mean_wait))
+
+    def stats(self) -> dict:
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                "capacity": self.capacity,
+                "active": self._active,
+                "queue_depth": len(self._queue),
+                "queued_interactive": sum(1 for p, _ in self._queue if p == INTERACTIVE),
+                "queued_batch": sum(1 for p, _ in self._queue if p == BATCH),
+                "max_queue": self.max_queue,
+                "admitted": self._admitted,
+                "degraded": self._degraded,
+                "rejected": self._rejected,
+                "mean_wait_s": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "p95_wait_s": round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+            }
+
+
+def from_environment(profile: Optional[dict] = None, threads: int = 6, workers: int = 1) -> AdmissionController:
+    """
+    Controller sized from the host profile, overridable with ADMISSION_* variables.
+    With several server processes on one host, each gets its share of the capacity.
+    """
+    capacity = int(os.environ.get("ADMISSION_CAPACITY", host_capacity(profile, threads)))
+    capacity = max(1, capacity // max(1, workers))
+    max_queue = os.environ.get("ADMISSION_MAX_QUEUE")
+    return AdmissionController(
+        capacity,
+        max_queue=int(max_queue) if max_queue else None,
+        max_wait=float(os.environ.get("ADMISSION_MAX_WAIT", "120")),
+    )
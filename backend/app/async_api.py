@@ -0,0 +1,666 @@
+"""
+Async (ASGI) API server for Deep Research Agent
+Same routes as simple_api.py / backend_api.py, but handlers await the
+research pipeline directly instead of spinning up an event loop per request.
+
+Run behind a production ASGI server, e.g.:
+    uvicorn async_api:app --workers 4 --host 0.0.0.0 --port 5000
+"""
+
+from quart import Quart, Response, request, jsonify
+from quart_cors import cors
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import logging
+import sys
+import os
+import weakref
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from model import GGUFModel, render_facts, summarize_stats
+    from scrapper import scrape_source
+    from social_media import RapidAIAgent
+    from url_generator import generate_urls
+    from batch_research import run_batch
+    from date_range import build_date_filter
+    from doc_index import DocumentIndex, categorize_scraped_data
+    from segment_store import open_store
+    from autotune import load_host_profile, model_settings
+    from admission import BATCH, INTERACTIVE, Overloaded, from_environment, parse_priority
+    from sessions import SessionStore, summary_key
+    from source_gain import adaptive_gain
+    from report_cache import ReportCache
+    from broker import Broker, RemoteModel, remote_scrape_source
+    from model_manager import LOADING, ModelManager, SharedModelTarget
+except ImportError as e:
+    print(f"Error importing modules: {e}")
+    sys.exit(1)
+
+app = cors(Quart(__name__))
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("deep-research-async-api")
+
+MODEL_PATH = r"C:\Users\jashp\Downloads\Deep Research Agent\mistral-7b-instruct-v0.2.Q4_K_S.gguf"
+LLAMA_CLI_BIN = r"C:\Users\jashp\Downloads\Deep Research Agent\llama.cpp\build\bin\Release\llama-cli.exe"
+DRAFT_MODEL_PATH = os.environ.get("DRAFT_MODEL_PATH")  # optional draft model for speculative decoding
+RESEARCH_BROKER = os.environ.get("RESEARCH_BROKER")  # set to run generation and scraping on worker.py nodes
+RAPIDAI_API_KEY = "YOUR API KEY"
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")  # /api/admin/* is refused unless this is set
+# Hot swaps reach every uvicorn worker through this file, polled every MODEL_POLL_INTERVAL s
+MODEL_TARGET_PATH = os.environ.get(
+    "MODEL_TARGET_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_target.json")
+)
+MODEL_POLL_INTERVAL = float(os.environ.get("MODEL_POLL_INTERVAL", "5"))
+
+# Blocking work runs on bounded pools so the event loop never stalls.
+# Scraping is network bound and can fan out; llama-cli already uses all
+# `threads` cores, so generations are kept to a small fixed number per worker.
+# GGUFModel calls don't share state, so MODEL_WORKERS only bounds CPU use.
+SCRAPE_WORKERS = int(os.environ.get("SCRAPE_WORKERS", "8"))
+MODEL_WORKERS = int(os.environ.get("MODEL_WORKERS", "1"))
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", "2"))
+# Adaptive mode fetches this many sources ahead of the one being scored
+ADAPTIVE_PREFETCH = int(os.environ.get("ADAPTIVE_PREFETCH", "2"))
+
+scrape_executor = ThreadPoolExecutor(max_workers=SCRAPE_WORKERS, thread_name_prefix="scrape")
+model_executor = ThreadPoolExecutor(max_workers=MODEL_WORKERS, thread_name_prefix="model")
+# Requests waiting for an admission slot block one of these threads each
+admission_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="admission")
+
+models = ModelManager()  # serving model: warm-up, readiness, hot swap
+model_target = SharedModelTarget(MODEL_TARGET_PATH)  # the model all workers should serve
+applied_version = None  # model_target version this worker has swapped to (or tried to)
+failed_version = None  # set when that swap failed, with swap_error
+swap_error = None
+model_swap_lock = None  # asyncio.Lock, created on the serving loop
+rapid_agent = None
+doc_index = None
+raw_store = None
+admission = None
+report_cache = None
+broker = None
+# Sessions live in this worker's memory; clients pinned to a worker keep theirs
+sessions = SessionStore()
+
+CAPABILITIES = """Deep Research Agent Capabilities:
+
+1. Social Media Research (RapidAI)
+2. Web Content Scraping (Google, Google News, Wikipedia, Reddit, Medium, BBC/CNN)
+3. AI-Powered Analysis (categorized, source-specific summaries)
+4. Output Format (categorized summaries by source)
+"""
+
+
+def scrape(url, date_filter):
+    """scrape_source() locally, or on a worker node in distributed mode."""
+    if broker is not None:
+        return remote_scrape_source(broker, url, date_filter)
+    return scrape_source(url, date_filter, doc_index, raw_store)
+
+
+def build_model(model_path, draft_model_path=None):
+    # threads / max_tokens / ctx / batch / mmap come from `python autotune.py`
+    return GGUFModel(
+        model_path=model_path,
+        llama_cli_path=LLAMA_CLI_BIN,
+        temperature=0.7,
+        timeout=600,
+        draft_model_path=draft_model_path,
+        **model_settings(load_host_profile()),
+    )
+
+
+def initialize_components():
+    """Set up everything but the model; returns (model, name) for load_model()."""
+    global rapid_agent, doc_index, raw_store, admission, report_cache, broker
+    try:
+        profile = load_host_profile()
+        settings = model_settings(profile)
+        if RESEARCH_BROKER:
+            # Distributed mode: this node only orchestrates, workers run the model
+            broker = Broker(RESEARCH_BROKER)
+            candidate, name = RemoteModel(broker), f"broker:{RESEARCH_BROKER}"
+            logger.info(f"Distributed mode: jobs go through broker {RESEARCH_BROKER}")
+        else:
+            candidate, name = build_model(MODEL_PATH, DRAFT_MODEL_PATH), MODEL_PATH
+        if profile:
+            logger.info(f"Loaded host profile for {profile.get('host')}: {profile.get('settings')}")
+        if admission is None:
+            # Every uvicorn worker runs its own controller over a share of the host
+            admission = from_environment(profile, settings["threads"], workers=WEB_WORKERS)
+            logger.info(f"Admission control: {admission.capacity} concurrent research request(s) per worker")
+        if raw_store is None:
+            raw_store = open_store()
+        rapid_agent = RapidAIAgent(RAPIDAI_API_KEY, store=raw_store)
+        doc_index = DocumentIndex()
+        report_cache = ReportCache()
+        logger.info("Components initialized successfully")
+        return candidate, name
+    except Exception as e:
+        logger.error(f"Failed to initialize components: {e}")
+        raise
+
+
+async def load_model(candidate, name):
+    """Warm up `candidate` and start serving it; /api/ready reports progress."""
+    logger.info(f"Warming up model {name}...")
+    try:
+        # Remote models are warmed by their workers
+        info = await run_blocking(model_executor, models.load, candidate, name=name, warm=broker is None)
+        logger.info(f"Model ready ({info['warmup_s']}s warm-up)")
+    except Exception as e:
+        logger.error(f"Model warm-up failed: {e}")
+
+
+def model_unavailable():
+    status = models.status()
+    message = 'Model is warming up' if status['state'] == LOADING else f"Model is not available: {status['error']}"
+    return jsonify({'error': message, 'model': status}), 503, {'Retry-After': '10'}
+
+
+async def run_blocking(executor, func, *args, **kwargs):
+    """Run a blocking call on one of the bounded executors."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, lambda: func(*args, **kwargs))
+
+
+def is_admin():
+    # No token configured: admin endpoints are off, since the server listens on all interfaces
+    return bool(ADMIN_TOKEN) and request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+
+
+def admin_forbidden():
+    message = 'Forbidden' if ADMIN_TOKEN else 'Admin endpoints are disabled: set ADMIN_TOKEN'
+    return jsonify({'error': message}), 403
+
+
+async def admit(priority):
+    """Wait for an admission slot without blocking the event loop."""
+    future = admission_executor.submit(admission.acquire, priority)
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        # Client went away while queued: hand the slot back once it is granted
+        future.add_done_callback(
+            lambda f: f.result().release() if not f.cancelled() and f.exception() is None else None
+        )
+        raise
+
+
+async def scrape_adaptively(source_urls, session, date_filter, gain):
+    """
+    Adaptive mode: score sources in order while the next ADAPTIVE_PREFETCH
+    are fetched, and start no more fetches once the gain is saturated.
+    Returns (used_urls, texts, reused_documents, dropped_by_date).
+    """
+    gain.plan(source_urls)
+    ahead = {}
+    used_urls, texts = [], []
+    reused = dropped_by_date = 0
+    for i, url in enumerate(source_urls):
+        for next_url in source_urls[i:i + ADAPTIVE_PREFETCH + 1]:
+            if next_url not in ahead:
+                ahead[next_url] = session.document(next_url, date_filter)
+                if ahead[next_url] is None:
+                    ahead[next_url] = asyncio.ensure_future(
+                        run_blocking(scrape_executor, scrape, next_url, date_filter)
+                    )
+        fetched = ahead.pop(url)
+        if isinstance(fetched, str):
+            text = fetched
+            reused += 1
+        else:
+            text, dropped = await fetched
+            session.add_document(url, date_filter, text, dropped)
+            dropped_by_date += dropped
+        if gain.add(url, text):
+            used_urls.append(url)
+            texts.append(text)
+        if gain.saturated:
+            logger.info(f"Sources saturated after {len(gain.scores)} of {len(source_urls)}, skipping the rest")
+            break
+
+    # Fetches already running are left to finish; the session keeps their documents
+    in_flight = [(url, f) for url, f in ahead.items() if not isinstance(f, str)]
+    for url, future in in_flight:
+        future.add_done_callback(
+            lambda f, url=url: session.add_document(url, date_filter, *f.result())
+            if not f.cancelled() and f.exception() is None else None
+        )
+    gain.fetched_unscored = len(in_flight)
+    return used_urls, texts, reused, dropped_by_date
+
+
+async def summarize_category(model, source, texts, user_query, initial_output, stats=None, max_total_tokens=400):
+    combined_text = "\n\n".join(texts)
+    summary = await run_blocking(
+        model_executor,
+        model.enhanced_generation,
+        f"Summarize ONLY facts present in the following text from {source} for the query: {user_query}. "
+        f"Do not invent or hallucinate. Return only structured headlines or facts that exactly appear in the input text. "
+        f"If there is not enough relevant information, say \"Not enough explicit information found.\"",
+        initial_output,
+        combined_text,
+        max_total_tokens=max_total_tokens,
+        chunk_size=200,
+        timeout=600,
+        stats=stats,
+    )
+    return summary
+
+
+async def extract_category_facts(model, source, texts, user_query, stats=None, max_tokens=400):
+    """Structured mode: schema-constrained [{fact, source_url}] for one category."""
+    return await run_blocking(
+        model_executor,
+        model.structured_generation,
+        f"Extract ONLY facts present in the following text from {source} for the query: {user_query}. "
+        f"Do not invent or hallucinate.",
+        "\n\n".join(texts),
+        # RapidAI text has no "--- Content from" header to take URLs from
+        source_urls=["RapidAI"] if source == "RapidAI" else None,
+        max_tokens=max_tokens,
+        timeout=600,
+        stats=stats,
+    )
+
+
+async def session_summary(model, session, source, texts, user_query, initial_output, structured,
+                          stats=None, max_tokens=400):
+    """Summary (or facts) for one category, reused from the session if its inputs are unchanged."""
+    key = summary_key(source, texts, user_query, structured, max_tokens)
+    cached = session.summary(source, key)
+    if cached is not None:
+        return cached, True
+    if structured:
+        result = await extract_category_facts(model, source, texts, user_query, stats, max_tokens)
+    else:
+        result = await summarize_category(model, source, texts, user_query, initial_output, stats, max_tokens)
+    session.add_summary(source, key, result)
+    return result, False
+
+
+@app.before_serving
+async def startup():
+    global applied_version, model_swap_lock
+    candidate, name = initialize_components()
+    model_swap_lock = asyncio.Lock()
+    # A worker (re)started after a hot swap comes up on the swapped-in model
+    target = model_target.read()
+    if target and broker is None:
+        candidate, name = build_model(target['model_path'], target.get('draft_model_path')), target['model_path']
+        applied_version = target['version']
+    # Warm up in the background so /api/health and /api/ready answer meanwhile
+    asyncio.ensure_future(load_model(candidate, name))
+    asyncio.ensure_future(follow_model_target())
+
+
+async def apply_model_target(target):
+    """
+    Swap this worker to `target` unless it already has; returns the swap
+    result or None. Raises if this version's swap failed, including when the
+    poll loop tried it first.
+    """
+    global applied_version, failed_version, swap_error
+    async with model_swap_lock:
+        if target['version'] == applied_version:
+            if failed_version == applied_version:
+                raise RuntimeError(swap_error)
+            return None
+        # Recorded first, so a model that fails to warm up is not retried on every poll
+        applied_version = target['version']
+        logger.info(f"Hot swap to {target['model_path']}")
+        try:
+            # Warm-up runs off the model pool so in-flight generations keep their slots
+            result = await run_blocking(
+                None, models.swap, build_model(target['model_path'], target.get('draft_model_path')),
+                name=target['model_path']
+            )
+        except Exception as e:
+            failed_version, swap_error = target['version'], str(e)
+            logger.error(f"Hot swap failed, still serving the previous model: {e}")
+            raise
+        failed_version = swap_error = None
+        logger.info(f"Now serving {target['model_path']} ({result['current']['warmup_s']}s warm-up)")
+        return result
+
+
+async def follow_model_target():
+    """Poll the shared model target, swap when it changes, and report this worker's state."""
+    while True:
+        try:
+            target = model_target.read()
+            if target and broker is None and models.state != LOADING:
+                try:
+                    await apply_model_target(target)
+                except Exception:
+                    pass  # logged and reported as swap_error
+            status = models.status()
+            model_target.report({
+                'version': applied_version,
+                'state': status['state'],
+                'model': (status['current'] or {}).get('name'),
+                'draining': len(status['draining']),
+                'error': swap_error or status['error'],
+            })
+        except Exception as e:
+            logger.warning(f"Model target poll failed: {e}")
+        await asyncio.sleep(MODEL_POLL_INTERVAL)
+
+
+@app.route('/api/research', methods=['POST'])
+async def research_query():
+    ticket = lease = None
+    try:
+        data = await request.get_json()
+        user_query = data.get('query', '').strip()
+        start_date = data.get('start_date', '').strip()
+        end_date = data.get('end_date', '').strip()
+        max_sources = data.get('max_sources', 5)
+        structured = bool(data.get('structured', False))
+        force_refresh = bool(data.get('force_refresh', False))
+        # Adaptive mode stops collecting sources once they add little new
+        gain = adaptive_gain(user_query, data)
+        cache_options = {'structured': structured}
+        if gain is not None:
+            cache_options['min_gain'] = gain.min_gain
+
+        logger.info(f"Received research request: '{user_query}'")
+
+        if not user_query:
+            return jsonify({'error': 'Query cannot be empty'}), 400
+        try:
+            date_filter = build_date_filter(start_date, end_date)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # The same question in other words, casing or order is served from the report cache
+        if not force_refresh:
+            hit = report_cache.lookup(user_query, date_filter, max_sources, **cache_options)
+            if hit:
+                logger.info(f"Serving cached report ({hit['match']} match for '{hit['cached_query']}')")
+                cache_info = {k: v for k, v in hit.items() if k != 'report'}
+                return jsonify({**hit['report'], 'query': user_query, 'cached': True, 'cache': cache_info})
+
+        if not models.ready:
+            return model_unavailable()
+
+        # Interactive UI requests are queued ahead of batch work; under
+        # overload the request is degraded or rejected instead of slowing everyone
+        try:
+            ticket = await admit(parse_priority(data.get('priority'), INTERACTIVE))
+        except Overloaded as e:
+            logger.warning(f"Rejected research request: {e}")
+            return jsonify({'error': str(e), 'admission': admission.stats()}), 503, {'Retry-After': str(e.retry_after)}
+        max_sources, summary_tokens = ticket.limits(max_sources, 400)
+        if ticket.degraded:
+            logger.info(f"Degraded request under load: max_sources={max_sources}, max_total_tokens={summary_tokens}")
+
+        # The request finishes on this model even if a hot swap happens meanwhile
+        lease = models.acquire()
+        model = lease.model
+
+        # Follow-up queries in a session reuse its documents and summaries
+        session = sessions.get_or_create(data.get('session_id'))
+        session.queries.append(user_query)
+
+        # The initial generation and the RapidAI lookup are independent
+        logger.info("Starting initial LLM generation and RapidAI fetch...")
+        initial_task = asyncio.ensure_future(
+            run_blocking(model_executor, model.generate_text, user_query)
+        )
+
+        # Fresh documents already in the local index are used first; the
+        # network only fills the remaining source slots.
+        indexed = doc_index.search(user_query, limit=max_sources)
+        logger.info(f"Retrieved {len(indexed)} fresh documents from the local index")
+
+        urls, aggregated_content = [], ""
+        dropped_by_date = 0
+        try:
+            rapidai_data = await run_blocking(
+                scrape_executor, rapid_agent.fetch_data, user_query,
+                date_range=date_filter, max_results=max_sources
+            )
+            urls = rapidai_data.get("urls", [])
+            aggregated_content = rapidai_data.get("content", "")
+            dropped_by_date += rapidai_data.get("dropped_by_date", 0)
+            logger.info(f"Retrieved {len(urls)} URLs from RapidAI")
+        except Exception as e:
+            logger.warning(f"RapidAI fetch failed: {e}")
+
+        if not urls:
+            logger.info("Generating URLs using url_generator...")
+            urls = generate_urls(user_query, date_filter)
+
+        source_urls = [doc["url"] for doc in indexed]
+        for url in urls:
+            if len(source_urls) >= max_sources:
+                break
+            if url not in source_urls:
+                source_urls.append(url)
+
+        logger.info("Scraping URLs...")
+        if gain is not None:
+            gain.seed(aggregated_content)
+            used_urls, scraped_texts, reused_documents, dropped = await scrape_adaptively(
+                source_urls, session, date_filter, gain
+            )
+            dropped_by_date += dropped
+        else:
+            texts_by_url = {url: session.document(url, date_filter) for url in source_urls}
+            new_urls = [url for url, text in texts_by_url.items() if text is None]
+            scraped = await asyncio.gather(*[
+                run_blocking(scrape_executor, scrape, url, date_filter)
+                for url in new_urls
+            ])
+            for url, (text, dropped) in zip(new_urls, scraped):
+                session.add_document(url, date_filter, text, dropped)
+                texts_by_url[url] = text
+            used_urls = source_urls
+            scraped_texts = [texts_by_url[url] for url in source_urls]
+            reused_documents = len(source_urls) - len(new_urls)
+            dropped_by_date += sum(dropped for _, dropped in scraped)
+        logger.info(f"Reused {reused_documents} documents from session {session.id}")
+        if date_filter:
+            logger.info(f"Dropped {dropped_by_date} items outside the date range before summarization")
+
+        logger.info("Categorizing scraped data...")
+        categorized_data = categorize_scraped_data(used_urls, scraped_texts, aggregated_content)
+
+        initial_output = await initial_task
+
+        logger.info("Generating category summaries with fact check prompt...")
+        generation_stats = {}
+        results = await asyncio.gather(*[
+            session_summary(model, session, source, texts, user_query, initial_output, structured,
+                            generation_stats, summary_tokens)
+            for source, texts in categorized_data.items()
+        ])
+        reused_summaries = sum(1 for _, was_reused in results if was_reused)
+        summaries = dict(zip(categorized_data, (result for result, _ in results)))
+        facts = summaries if structured else {}
+        final_sections = [
+            f"### {source} Summary\n{render_facts(result) if structured else result}"
+            for source, result in summaries.items()
+        ]
+
+        final_output = "\n\n".join(final_sections)
+        sessions.save(session)
+        generation_stats = summarize_stats(generation_stats)
+        logger.info(f"Generation stats: {generation_stats}")
+        logger.info("Research completed successfully")
+
+        response = {
+            'success': True,
+            'final_summary': final_output,
+            'query': user_query,
+            'sources_processed': len(categorized_data),
+            # Sources actually looked at: adaptive mode may stop before the end of the list
+            'urls_scraped': len(source_urls) if gain is None else len(gain.scores) + gain.fetched_unscored,
+            'items_dropped_by_date': dropped_by_date,
+            'indexed_documents': len(indexed),
+            'generation_stats': generation_stats,
+            'admission': ticket.info(),
+            'session_id': session.id,
+            'session': {**session.info(), 'reused_documents': reused_documents, 'reused_summaries': reused_summaries}
+        }
+        if structured:
+            response['facts'] = facts
+        if gain is not None:
+            response['adaptive'] = gain.report()
+            logger.info(f"Adaptive mode avoided {response['adaptive']['fetches_avoided']} fetches, "
+                        f"{response['adaptive']['generations_avoided']} generations")
+        if not ticket.degraded:
+            # Per-request fields are not part of the cached report
+            report = {k: v for k, v in response.items() if k not in ('admission', 'session_id', 'session')}
+            report_cache.store(user_query, report, date_filter, max_sources, **cache_options)
+        response['cached'] = False
+        return jsonify(response)
+
+    except Exception as e:
+        logger.error(f"Research failed with exception: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if lease is not None:
+            lease.release()
+        if ticket is not None:
+            ticket.release()
+
+
+@app.route('/api/research/batch', methods=['POST'])
+async def batch_research_query():
+    """Run many queries at once, streaming one JSON line per finished query."""
+    data = await request.get_json() or {}
+    queries = [str(q) for q in data.get('queries', []) if str(q).strip()]
+    max_sources = data.get('max_sources', 5)
+
+    if not queries:
+        return jsonify({'error': 'queries must be a non-empty list'}), 400
+
+    logger.info(f"Received batch research request: {len(queries)} queries")
+
+    if not models.ready:
+        return model_unavailable()
+
+    try:
+        ticket = await admit(BATCH)
+    except Overloaded as e:
+        logger.warning(f"Rejected batch research request: {e}")
+        return jsonify({'error': str(e), 'admission': admission.stats()}), 503, {'Retry-After': str(e.retry_after)}
+    max_sources, _ = ticket.limits(max_sources, 400)
+    try:
+        lease = models.acquire()
+    except RuntimeError:
+        ticket.release()
+        return model_unavailable()
+
+    async def stream():
+        # The slot and the model are held until the last result has been streamed
+        with ticket, lease as model:
+            # Generations share model_executor with /api/research, so MODEL_WORKERS
+            # bounds them across everything; only advance the batch off-loop
+            results = run_batch(queries, model, rapid_agent, max_sources=max_sources,
+                                scrape_pool=scrape_executor, model_pool=model_executor, scrape=scrape)
+            while True:
+                result = await run_blocking(None, next, results, None)
+                if result is None:
+                    break
+                yield json.dumps(result) + "\n"
+
+    body = stream()
+    # A client that disconnects before the first line drops a generator that
+    # never started, so its `with` never runs: release when it is collected too
+    weakref.finalize(body, lease.release)
+    weakref.finalize(body, ticket.release)
+    return Response(body, mimetype='application/x-ndjson')
+
+
+@app.route('/api/capabilities', methods=['GET'])
+async def get_capabilities():
+    return jsonify({
+        'success': True,
+        'capabilities': CAPABILITIES
+    })
+
+
+@app.route('/api/admission', methods=['GET'])
+async def admission_status():
+    """Capacity, queue depth and wait times of this worker's admission controller."""
+    return jsonify(admission.stats())
+
+
+@app.route('/api/cluster', methods=['GET'])
+async def cluster_status():
+    """Broker queue and live workers in distributed mode."""
+    if broker is None:
+        return jsonify({'distributed': False})
+    return jsonify({'distributed': True, **broker.stats()})
+
+
+@app.route('/api/admin/model', methods=['GET', 'POST'])
+async def admin_model():
+    """
+    GET: this worker's serving and draining models, the shared target and
+    every worker's state.
+    POST {"model_path", "draft_model_path"}: warm up a new model next to the
+    current one, move new requests to it and let the old one drain. The
+    target is shared, so the other uvicorn workers follow within
+    MODEL_POLL_INTERVAL seconds.
+    """
+    if not is_admin():
+        return admin_forbidden()
+    if request.method == 'GET':
+        return jsonify({**models.status(), 'target': model_target.read(),
+                        'workers': model_target.workers(max_age=3 * MODEL_POLL_INTERVAL)})
+    if broker is not None:
+        return jsonify({'error': 'Distributed mode: restart worker.py nodes with the new model instead'}), 400
+
+    data = await request.get_json() or {}
+    model_path = data.get('model_path', '').strip()
+    if not model_path:
+        return jsonify({'error': 'model_path is required'}), 400
+
+    logger.info(f"Hot swap requested for all workers: {model_path}")
+    previous = model_target.read()
+    target = model_target.write(model_path, data.get('draft_model_path'))
+    try:
+        result = await apply_model_target(target)
+    except Exception as e:
+        # Don't leave the other workers (or restarts) chasing a model that won't load
+        model_target.restore(previous)
+        return jsonify({'error': str(e), 'model': models.status(), 'target': previous}), 500
+    return jsonify({'success': True, **(result or {}), 'model': models.status(), 'target': target,
+                    'note': f'Other workers switch within {MODEL_POLL_INTERVAL:g}s; GET shows each worker'})
+
+
+@app.route('/api/ready', methods=['GET'])
+async def readiness_check():
+    """200 once the model is warmed up and serving, 503 before that."""
+    status = models.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    return jsonify({
+        'status': 'healthy',
+        'message': 'Deep Research Agent Async API is running',
+        'version': '1.0.0',
+        'ready': models.ready,
+        'model_state': models.state
+    })
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("🚀 Starting Deep Research Agent Async API...")
+    print(f"🌐 API running on http://localhost:5000 ({WEB_WORKERS} workers)")
+    print("📊 Frontend should connect to http://localhost:3000")
+
+    uvicorn.run("async_api:app", host='0.0.0.0', port=5000, workers=WEB_WORKERS)
@@ -0,0 +1,206 @@
+"""
+Hardware autotuner for GGUFModel.
+
+Runs a standard prompt set through llama-cli across thread counts,
+batch/ubatch sizes, mmap/no-mmap and context lengths, measures prefill and
+decode throughput, and writes a per-host profile that the servers load at
+startup:
+
+    python autotune.py --model path/to/model.gguf --llama-cli path/to/llama-cli
+
+The profile also records how many generations the host can run at once
+before aggregate decode throughput stops improving.
+"""
+
+import argparse
+import json
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from model import GGUFModel
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+DEFAULT_SETTINGS = {"threads": 6, "max_tokens": 256}
+
+# Short prompt for decode speed, long one shaped like a category summary
+# (several sources of up to 2000 chars) for prefill speed.
+_SOURCE = (
+    "--- Content from https://example.com/article ---\n"
+    + "Researchers reported new results on efficient inference for language models. " * 25
+)
+STANDARD_PROMPTS = [
+    "Explain in three sentences what a research assistant does.",
+    "Summarize ONLY facts present in the following text for the query: AI trends.\n\n"
+    f"=== Source Text Start ===\n{_SOURCE * 3}\n=== Source Text End ===",
+]
+
+
+def profile_path(host: Optional[str] = None) -> str:
+    return os.environ.get("HOST_PROFILE") or os.path.join(PROFILE_DIR, f"{host or socket.gethostname()}.json")
+
+
+def load_host_profile(path: Optional[str] = None) -> dict:
+    """Load this host's profile, or {} if none has been written yet."""
+    path = path or profile_path()
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def model_settings(profile: Optional[dict] = None) -> dict:
+    """GGUFModel keyword arguments from a host profile, falling back to the old defaults."""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update((profile or {}).get("settings", {}))
+    return settings
+
+
+# ---------------------------------------------------------------------- #
+#  MEASUREMENT                                                           #
+# ---------------------------------------------------------------------- #
+def measure(model_path: str, llama_cli: str, settings: dict, max_tokens: int) -> dict:
+    """Run the standard prompts once with `settings` and return throughput."""
+    model = GGUFModel(model_path=model_path, llama_cli_path=llama_cli,
+                      temperature=0.0, **{**settings, "max_tokens": max_tokens})
+    stats = {}
+    started = time.perf_counter()
+    for prompt in STANDARD_PROMPTS:
+        model.generate_text(prompt, stats=stats)
+    result = {
+        "settings": settings,
+        "wall_seconds": round(time.perf_counter() - started, 2),
+        "prefill_tps": round(stats["prompt_tokens"] / stats["prompt_seconds"], 2)
+        if stats.get("prompt_seconds") else 0.0,
+        "decode_tps": round(stats["decoded_tokens"] / stats["decode_seconds"], 2)
+        if stats.get("decode_seconds") else 0.0,
+    }
+    print(f"  {settings} -> prefill {result['prefill_tps']} t/s, decode {result['decode_tps']} t/s")
+    return result
+
+
+def measure_concurrency(model_path: str, llama_cli: str, settings: dict,
+                        max_tokens: int, max_parallel: int) -> List[Dict]:
+    """Aggregate decode throughput with 1..max_parallel simultaneous generations."""
+    results = []
+    for parallel in range(1, max_parallel + 1):
+        stats_list = [{} for _ in range(parallel)]
+
+        def run(stats):
+            model = GGUFModel(model_path=model_path, llama_cli_path=llama_cli,
+                              temperature=0.0, **{**settings, "max_tokens": max_tokens})
+            model.generate_text(STANDARD_PROMPTS[0], stats=stats)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            list(pool.map(run, stats_list))
+        elapsed = time.perf_counter() - started
+        tokens = sum(s.get("decoded_tokens", 0) for s in stats_list)
+        results.append({"parallel": parallel, "aggregate_decode_tps": round(tokens / elapsed, 2)})
+        print(f"  {parallel} concurrent -> {results[-1]['aggregate_decode_tps']} t/s aggregate")
+    return results
+
+
+def best(results: List[Dict], key: str) -> Dict:
+    return max(results, key=lambda r: r[key])
+
+
+def autotune(model_path: str, llama_cli: str, thread_counts: List[int], batch_sizes: List[int],
+             ubatch_sizes: List[int], ctx_sizes: List[int], max_tokens: int = 64,
+             min_gain: float = 0.1) -> dict:
+    """
+    Staged sweep: threads (decode-bound), then batch/ubatch (prefill-bound),
+    then mmap, then context length, then concurrency. Each stage keeps the
+    winner of the previous one.
+    """
+    measurements = []
+    settings = {"ctx_size": max(ctx_sizes)}
+
+    print("Sweeping thread counts...")
+    runs = [measure(model_path, llama_cli, {**settings, "threads": t}, max_tokens) for t in thread_counts]
+    measurements += runs
+    settings = dict(best(runs, "decode_tps")["settings"])
+
+    print("Sweeping batch / ubatch sizes...")
+    runs = [
+        measure(model_path, llama_cli, {**settings, "batch_size": b, "ubatch_size": ub}, max_tokens)
+        for b in batch_sizes for ub in ubatch_sizes if ub <= b
+    ]
+    measurements += runs
+    if runs:
+        settings = dict(best(runs, "prefill_tps")["settings"])
+
+    print("Comparing mmap / no-mmap...")
+    runs = [measure(model_path, llama_cli, {**settings, "use_mmap": m}, max_tokens) for m in (False, True)]
+    measurements += runs
+    # Every call starts a fresh llama-cli process, so model load time counts
+    settings = dict(min(runs, key=lambda r: r["wall_seconds"])["settings"])
+
+    print("Sweeping context lengths...")
+    runs = [measure(model_path, llama_cli, {**settings, "ctx_size": c}, max_tokens) for c in sorted(ctx_sizes)]
+    measurements += runs
+    # Smallest context within 5% of the best decode speed: less KV-cache memory
+    top = best(runs, "decode_tps")["decode_tps"]
+    settings = dict(next(r for r in runs if r["decode_tps"] >= 0.95 * top)["settings"])
+
+    final = next(r for r in reversed(measurements) if r["settings"] == settings)
+
+    print("Measuring concurrent generations...")
+    cpu_count = os.cpu_count() or 1
+    max_parallel = max(1, cpu_count // settings["threads"]) + 1
+    concurrency = measure_concurrency(model_path, llama_cli, settings, max_tokens, max_parallel)
+    sustainable = 1
+    for prev, cur in zip(concurrency, concurrency[1:]):
+        if cur["aggregate_decode_tps"] < prev["aggregate_decode_tps"] * (1 + min_gain):
+            break
+        sustainable = cur["parallel"]
+
+    return {
+        "host": socket.gethostname(),
+        "cpu_count": cpu_count,
+        "model_path": model_path,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "settings": {**settings, "max_tokens": DEFAULT_SETTINGS["max_tokens"]},
+        "prefill_tps": final["prefill_tps"],
+        "decode_tps": final["decode_tps"],
+        "max_concurrent_generations": sustainable,
+        "concurrency": concurrency,
+        "measurements": measurements,
+    }
+
+
+def main():
+    cpu_count = os.cpu_count() or 1
+    default_threads = sorted({t for t in (1, 2, 4, 6, 8, 12, 16, 24, 32, cpu_count // 2, cpu_count)
+                              if 0 < t <= cpu_count})
+
+    parser = argparse.ArgumentParser(description="Autotune llama-cli settings for this host")
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--llama-cli", required=True)
+    parser.add_argument("--threads", type=int, nargs="+", default=default_threads)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[512, 2048])
+    parser.add_argument("--ubatch-sizes", type=int, nargs="+", default=[128, 512])
+    parser.add_argument("--ctx-sizes", type=int, nargs="+", default=[2048, 4096, 8192])
+    parser.add_argument("--max-tokens", type=int, default=64, help="Tokens to decode per measurement")
+    parser.add_argument("--output", default=None, help=f"Profile path (default: {profile_path()})")
+    args = parser.parse_args()
+
+    profile = autotune(args.model, args.llama_cli, args.threads, args.batch_sizes,
+                       args.ubatch_sizes, args.ctx_sizes, max_tokens=args.max_tokens)
+
+    output = args.output or profile_path()
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(profile, f, indent=2)
+
+    print(f"\nBest settings: {profile['settings']}")
+    print(f"Prefill {profile['prefill_tps']} t/s, decode {profile['decode_tps']} t/s, "
+          f"{profile['max_concurrent_generations']} concurrent generation(s)")
+    print(f"Profile written to {output}")
+
+
+if __name__ == "__main__":
+    main()
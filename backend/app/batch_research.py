@@ -0,0 +1,195 @@
+"""
+Batch research runner.
+
+Runs many research queries as one job: identical URLs are scraped once for
+the whole batch, and category summaries are queued to the model as soon as
+a query's sources are in, so generation overlaps with the remaining scrapes.
+URLs are fetched with the caller's `scrape(url, date_filter)`, the same
+helper its single-query pipeline uses (document index, raw store, broker).
+"""
+
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import ExitStack
+from typing import Callable, Dict, Iterator, List, Optional
+
+from doc_index import categorize_scraped_data
+from scrapper import scrape_source
+from url_generator import generate_urls
+
+
+def _summarize(model, source: str, query: str, texts: List[str]) -> str:
+    combined_text = "\n\n".join(texts)
+    # enhanced_generation only uses the source text, so the per-query
+    # initial generation is skipped for batches.
+    return model.enhanced_generation(
+        f"Summarize ONLY facts present in the following text from {source} for the query: {query}. "
+        f"Do not invent or hallucinate. Return only structured headlines or facts that exactly appear in the input text. "
+        f"If there is not enough relevant information, say \"Not enough explicit information found.\"",
+        "",
+        combined_text,
+        max_total_tokens=400,
+        chunk_size=200,
+        timeout=600,
+    )
+
+
+def run_batch(
+    queries: List[str],
+    model,
+    rapid_agent=None,
+    max_sources: int = 5,
+    scrape_workers: int = 8,
+    model_workers: int = 1,
+    scrape_pool: Optional[Executor] = None,
+    model_pool: Optional[Executor] = None,
+    scrape: Optional[Callable] = None,
+) -> Iterator[Dict]:
+    """
+    Run a batch of research queries.
+
+    Yields one result dict per query as soon as it completes (in completion
+    order), followed by a final dict with batch-level throughput stats.
+    Scrapes (RapidAI lookups included) and generations run on `scrape_pool` /
+    `model_pool` if given, otherwise on pools of `scrape_workers` /
+    `model_workers` threads. `scrape(url, date_filter)` returns
+    (text, dropped_by_date) like scrape_source, which is the default.
+    """
+    started = time.perf_counter()
+    scrape = scrape or scrape_source
+    queries = [q.strip() for q in queries if q and q.strip()]
+    # Repeated queries are researched once and reported for each occurrence
+    copies: Dict[str, int] = {}
+    for query in queries:
+        copies[query] = copies.get(query, 0) + 1
+
+    with ExitStack() as stack:
+        # Pools shared with the caller's other work are used as is, so its
+        # bounds (e.g. concurrent generations) also cover the batch
+        if scrape_pool is None:
+            scrape_pool = stack.enter_context(
+                ThreadPoolExecutor(max_workers=scrape_workers, thread_name_prefix="batch-scrape"))
+        if model_pool is None:
+            model_pool = stack.enter_context(
+                ThreadPoolExecutor(max_workers=model_workers, thread_name_prefix="batch-model"))
+
+        # -- Plan: resolve URLs per query, share identical ones ----------------
+        # RapidAI lookups for every query run at once on the scrape pool
+        lookups = {}
+        if rapid_agent is not None:
+            lookups = {query: scrape_pool.submit(rapid_agent.fetch_data, query, max_results=max_sources)
+                       for query in copies}
+        plan = []
+        url_waiters: Dict[str, List[int]] = {}
+        for qi, query in enumerate(copies):
+            urls, content = [], ""
+            if query in lookups:
+                try:
+                    rapidai_data = lookups[query].result()
+                    urls = rapidai_data.get("urls", [])
+                    content = rapidai_data.get("content", "")
+                except Exception as e:
+                    print(f"RapidAI fetch failed for '{query}': {e}")
+            if not urls:
+                urls = generate_urls(query)
+            urls = urls[:max_sources]
+
+            plan.append({
+                "query": query,
+                "urls": urls,
+                "rapidai_content": content,
+                "pending_urls": len(set(urls)),
+                "sections": {},
+                "pending_sections": 0,
+                "started": time.perf_counter(),
+            })
+            for url in dict.fromkeys(urls):
+                url_waiters.setdefault(url, []).append(qi)
+
+        url_requests = sum(len(p["urls"]) * copies[p["query"]] for p in plan)
+        scraped: Dict[str, str] = {}
+        generations = 0
+        completed = 0
+
+        def finish(qi):
+            entry = plan[qi]
+            # Keep the category order the single-query pipeline would produce
+            sections = [f"### {source} Summary\n{entry['sections'][source]}"
+                        for source in entry["order"]]
+            result = {
+                "query": entry["query"],
+                "final_summary": "\n\n".join(sections),
+                "sources_processed": len(entry["order"]),
+                "urls_scraped": len(entry["urls"]),
+                "elapsed_s": round(time.perf_counter() - entry["started"], 3),
+            }
+            return [result] * copies[entry["query"]]
+
+        futures = {}
+        try:
+            # Submitted in query order so early queries become ready first and
+            # the model starts working while later URLs are still being fetched.
+            for url in url_waiters:
+                futures[scrape_pool.submit(scrape, url, None)] = ("scrape", url)
+
+            def on_query_ready(qi):
+                entry = plan[qi]
+                texts = [scraped.get(url, "") for url in entry["urls"]]
+                categorized = categorize_scraped_data(entry["urls"], texts, entry["rapidai_content"])
+                entry["order"] = list(categorized)
+                entry["pending_sections"] = len(categorized)
+                for source, source_texts in categorized.items():
+                    fut = model_pool.submit(_summarize, model, source, entry["query"], source_texts)
+                    futures[fut] = ("summary", (qi, source))
+                return not categorized
+
+            for qi, entry in enumerate(plan):
+                if entry["pending_urls"] == 0 and on_query_ready(qi):
+                    for result in finish(qi):
+                        completed += 1
+                        yield result
+
+            while futures:
+                done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    kind, key = futures.pop(fut)
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        print(f"Batch {kind} failed for {key}: {e}")
+                        result = ""
+
+                    if kind == "scrape":
+                        scraped[key] = result[0] if result else ""
+                        for qi in url_waiters[key]:
+                            plan[qi]["pending_urls"] -= 1
+                            if plan[qi]["pending_urls"] == 0 and on_query_ready(qi):
+                                for result in finish(qi):
+                                    completed += 1
+                                    yield result
+                    else:
+                        qi, source = key
+                        generations += 1
+                        plan[qi]["sections"][source] = result
+                        plan[qi]["pending_sections"] -= 1
+                        if plan[qi]["pending_sections"] == 0:
+                            for result in finish(qi):
+                                completed += 1
+                                yield result
+        finally:
+            # Stopped early (e.g. the client went away): drop work not started yet
+            for fut in futures:
+                fut.cancel()
+
+    elapsed = time.perf_counter() - started
+    yield {
+        "batch_complete": True,
+        "queries": len(queries),
+        "completed": completed,
+        "url_requests": url_requests,
+        "unique_urls": len(url_waiters),
+        "scrapes_saved": url_requests - len(url_waiters),
+        "generations": generations,
+        "elapsed_s": round(elapsed, 3),
+        "queries_per_minute": round(completed / elapsed * 60, 2) if elapsed else 0.0,
+    }
@@ -0,0 +1,105 @@
+"""
+Benchmark speculative decoding on real scraped inputs.
+
+Runs the pipeline's category-summary prompts with and without the draft
+model and reports wall time, decode tokens/sec and draft acceptance rate:
+
+    python bench_speculative.py --model mistral-7b-instruct-v0.2.Q4_K_S.gguf \
+        --draft tinymistral-248m.Q8_0.gguf --llama-cli llama.cpp/build/bin/llama-cli \
+        --query "AI trends 2024" --query "quantum computing startups"
+
+Source text comes from the local document index when it has fresh matches,
+otherwise the query's URLs are scraped.
+"""
+
+import argparse
+import time
+
+from doc_index import DocumentIndex, source_category
+from model import GGUFModel, summarize_stats
+from scrapper import scrape_url
+from url_generator import generate_urls
+
+
+def load_inputs(query: str, max_sources: int, index: DocumentIndex) -> dict:
+    """Return {category: combined_text} for a query, as the pipeline would build it."""
+    docs = index.search(query, limit=max_sources)
+    if not docs:
+        docs = []
+        for url in generate_urls(query)[:max_sources]:
+            text = scrape_url(url)
+            if text:
+                index.add(url, text)
+                docs.append({"url": url, "source": source_category(url), "text": text})
+
+    categorized = {}
+    for doc in docs:
+        categorized.setdefault(doc["source"], []).append(f"--- Content from {doc['url']} ---\n{doc['text']}")
+    return {source: "\n\n".join(texts) for source, texts in categorized.items()}
+
+
+def run(model: GGUFModel, prompts: list) -> dict:
+    stats = {}
+    started = time.perf_counter()
+    for source, query, text in prompts:
+        model.enhanced_generation(
+            f"Summarize ONLY facts present in the following text from {source} for the query: {query}. "
+            f"Do not invent or hallucinate. Return only structured headlines or facts that exactly appear in the input text. "
+            f"If there is not enough relevant information, say \"Not enough explicit information found.\"",
+            "",
+            text,
+            max_total_tokens=400,
+            chunk_size=200,
+            timeout=600,
+            stats=stats,
+        )
+    stats = summarize_stats(stats)
+    stats["wall_seconds"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark speculative decoding in GGUFModel")
+    parser.add_argument("--model", required=True, help="Main GGUF model")
+    parser.add_argument("--draft", required=True, help="Small draft GGUF model (same tokenizer)")
+    parser.add_argument("--llama-cli", required=True)
+    parser.add_argument("--speculative-cli", default=None, help="Defaults to llama-speculative next to llama-cli")
+    parser.add_argument("--draft-tokens", type=int, default=16)
+    parser.add_argument("--threads", type=int, default=6)
+    parser.add_argument("--query", action="append", required=True)
+    parser.add_argument("--max-sources", type=int, default=3)
+    args = parser.parse_args()
+
+    index = DocumentIndex()
+    prompts = []
+    for query in args.query:
+        for source, text in load_inputs(query, args.max_sources, index).items():
+            prompts.append((source, query, text))
+    if not prompts:
+        print("No source text found for the given queries")
+        return
+
+    # Greedy sampling keeps both runs comparable
+    common = dict(model_path=args.model, llama_cli_path=args.llama_cli,
+                  threads=args.threads, temperature=0.0)
+    baseline = GGUFModel(**common)
+    speculative = GGUFModel(**common, draft_model_path=args.draft,
+                            speculative_cli_path=args.speculative_cli, draft_tokens=args.draft_tokens)
+
+    print(f"\nRunning {len(prompts)} summarization prompts...")
+    results = {"baseline": run(baseline, prompts), "speculative": run(speculative, prompts)}
+
+    print(f"\n{'mode':<13}{'wall s':>10}{'tokens':>10}{'tok/s':>10}{'accept':>10}")
+    for mode, stats in results.items():
+        accept = f"{stats['acceptance_rate']:.1%}" if "acceptance_rate" in stats else "-"
+        print(f"{mode:<13}{stats['wall_seconds']:>10.2f}{stats.get('decoded_tokens', 0):>10}"
+              f"{stats.get('tokens_per_second', 0):>10.2f}{accept:>10}")
+
+    base_tps = results["baseline"].get("tokens_per_second")
+    spec_tps = results["speculative"].get("tokens_per_second")
+    if base_tps and spec_tps:
+        print(f"\nDecode speedup: {spec_tps / base_tps:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
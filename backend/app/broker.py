@@ -0,0 +1,321 @@
+"""
+Job broker for distributed research.
+
+API nodes submit jobs (a scrape, a model call) and wait for results. Worker
+nodes (`python worker.py`) claim jobs, heartbeat while they run them and post
+results back. A claimed job carries a lease: a worker that stops
+heartbeating (crashed, killed, lost its host) lets the lease expire, and the
+job is queued again for another worker until it runs out of attempts.
+
+This implementation keeps the queue in a SQLite database (WAL), which is
+enough for any number of API and worker processes on one host or on hosts
+sharing a filesystem that supports SQLite locking. Callers only use the
+Broker methods, so a networked queue can replace it without touching them.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+DEFAULT_BROKER_PATH = os.environ.get(
+    "RESEARCH_BROKER",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "broker.db"),
+)
+DEFAULT_LEASE = 60.0  # seconds a claimed job survives without a heartbeat
+DEFAULT_MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs(status, priority, created);
+CREATE INDEX IF NOT EXISTS jobs_lease ON jobs(status, lease_expires);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    kinds TEXT NOT NULL,
+    started REAL NOT NULL,
+    heartbeat REAL NOT NULL,
+    current_job TEXT,
+    jobs_done INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class JobFailed(RuntimeError):
+    """A job failed on every attempt; the message is the last worker error."""
+
+
+class Broker:
+    def __init__(self, path: str = DEFAULT_BROKER_PATH, lease: float = DEFAULT_LEASE):
+        self.path = path
+        self.lease = lease
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; transactions are managed explicitly
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    # ------------------------------------------------------------------ #
+    #  API NODE SIDE                                                     #
+    # ------------------------------------------------------------------ #
+    def submit(self, kind: str, payload: dict, priority: int = 0,
+               max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> str:
+        """Queue a job and return its id. Lower `priority` runs first."""
+        job_id = uuid.uuid4().hex
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, payload, priority, max_attempts, created) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload), priority, max_attempts, time.time()),
+        )
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT id, kind, status, attempts, worker, created, started, finished, error FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def wait(self, job_id: str, timeout: Optional[float] = None, poll: float = 0.05):
+        """Block until the job finishes and return its result; raise JobFailed or TimeoutError."""
+        deadline = time.time() + timeout if timeout else None
+        delay = poll
+        while True:
+            row = self._conn().execute(
+                "SELECT status, result, error FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(f"Unknown job {job_id}")
+            if row["status"] == "done":
+                return json.loads(row["result"])
+            if row["status"] == "failed":
+                raise JobFailed(row["error"] or "job failed")
+            if deadline and time.time() > deadline:
+                raise TimeoutError(f"Job {job_id} did not finish within {timeout}s")
+            self.requeue_expired()
+            time.sleep(delay)
+            delay = min(delay * 1.5, 1.0)
+
+    def call(self, kind: str, payload: dict, timeout: Optional[float] = None, priority: int = 0):
+        """submit() + wait()."""
+        return self.wait(self.submit(kind, payload, priority=priority), timeout=timeout)
+
+    # ------------------------------------------------------------------ #
+    #  WORKER SIDE                                                       #
+    # ------------------------------------------------------------------ #
+    def register_worker(self, kinds: List[str]) -> str:
+        worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO workers (id, host, pid, kinds, started, heartbeat) VALUES (?, ?, ?, ?, ?, ?)",
+            (worker_id, socket.gethostname(), os.getpid(), ",".join(kinds), now, now),
+        )
+        return worker_id
+
+    def claim(self, worker_id: str, kinds: List[str]) -> Optional[Dict]:
+        """Take the next queued job of one of `kinds`, or None if there is none."""
+        self.requeue_expired()
+        now = time.time()
+        conn = self._transaction()
+        try:
+            row = conn.execute(
+                f"SELECT id, kind, payload, attempts FROM jobs WHERE status = 'queued' "
+                f"AND kind IN ({','.join('?' * len(kinds))}) ORDER BY priority, created LIMIT 1",
+                kinds,
+            ).fetchone()
+            if row is None:
+                conn.execute("UPDATE workers SET heartbeat = ?, current_job = NULL WHERE id = ?", (now, worker_id))
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                "lease_expires = ?, started = ? WHERE id = ?",
+                (worker_id, now + self.lease, now, row["id"]),
+            )
+            conn.execute("UPDATE workers SET heartbeat = ?, current_job = ? WHERE id = ?", (now, row["id"], worker_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return {"id": row["id"], "kind": row["kind"], "payload": json.loads(row["payload"]),
+                "attempt": row["attempts"] + 1}
+
+    def heartbeat(self, worker_id: str, job_id: Optional[str] = None) -> bool:
+        """
+        Extend the lease on `job_id`. Returns False if the job is no longer
+        this worker's (its lease expired and it was handed to someone else).
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute("UPDATE workers SET heartbeat = ? WHERE id = ?", (now, worker_id))
+        if job_id is None:
+            return True
+        cur = conn.execute(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (now + self.lease, job_id, worker_id),
+        )
+        return cur.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result) -> bool:
+        """Post a result. Ignored (returns False) if the job was reassigned meanwhile."""
+        conn = self._transaction()
+        cur = conn.execute(
+            "UPDATE jobs SET status = 'done', result = ?, finished = ?, lease_expires = NULL "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (json.dumps(result), time.time(), job_id, worker_id),
+        )
+        if cur.rowcount:
+            conn.execute("UPDATE workers SET jobs_done = jobs_done + 1, current_job = NULL WHERE id = ?", (worker_id,))
+        conn.execute("COMMIT")
+        return cur.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str):
+        """Report an error: the job is retried until it runs out of attempts."""
+        conn = self._transaction()
+        conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END, "
+            "error = ?, worker = NULL, lease_expires = NULL, "
+            "finished = CASE WHEN attempts >= max_attempts THEN ? ELSE NULL END "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (error, time.time(), job_id, worker_id),
+        )
+        conn.execute("UPDATE workers SET current_job = NULL WHERE id = ?", (worker_id,))
+        conn.execute("COMMIT")
+
+    def unregister_worker(self, worker_id: str):
+        self._conn().execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+    def requeue_expired(self) -> int:
+        """Put jobs whose worker stopped heartbeating back in the queue (or fail them)."""
+        now = time.time()
+        conn = self._conn()
+        cur = conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END, "
+            "error = 'worker ' || worker || ' stopped heartbeating', worker = NULL, lease_expires = NULL, "
+            "finished = CASE WHEN attempts >= max_attempts THEN ? ELSE NULL END "
+            "WHERE status = 'running' AND lease_expires < ?",
+            (now, now),
+        )
+        return cur.rowcount
+
+    # ------------------------------------------------------------------ #
+    #  MONITORING                                                        #
+    # ------------------------------------------------------------------ #
+    def stats(self) -> Dict:
+        conn = self._conn()
+        counts = {r["status"]: r["n"] for r in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+        retried = conn.execute("SELECT COUNT(*) FROM jobs WHERE attempts > 1").fetchone()[0]
+        live_after = time.time() - 3 * self.lease
+        workers = [dict(r) for r in conn.execute(
+            "SELECT id, host, kinds, heartbeat, current_job, jobs_done FROM workers WHERE heartbeat >= ?",
+            (live_after,),
+        )]
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "retried": retried,
+            "workers": workers,
+        }
+
+    def prune(self, max_age: float = 24 * 3600):
+        """Delete finished jobs and dead workers older than `max_age` seconds."""
+        cutoff = time.time() - max_age
+        conn = self._conn()
+        conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished < ?", (cutoff,))
+        conn.execute("DELETE FROM workers WHERE heartbeat < ?", (cutoff,))
+
+
+def merge_stats(into: Optional[dict], stats: Optional[dict]):
+    """Add a worker's per-call generation stats into the caller's dict."""
+    if into is None or not stats:
+        return
+    for key, value in stats.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            into[key] = into.get(key, 0) + value
+
+
+class RemoteModel:
+    """
+    Drop-in stand-in for GGUFModel on API nodes: each call becomes a
+    "generate" job run by a worker's GGUFModel.
+    """
+
+    def __init__(self, broker: Broker, timeout: float = 900, priority: int = 0):
+        self.broker = broker
+        self.timeout = timeout
+        self.priority = priority
+
+    def _call(self, method: str, args: tuple, kwargs: dict):
+        stats = kwargs.pop("stats", None)
+        timeout = kwargs.get("timeout") or self.timeout
+        result = self.broker.call(
+            "generate", {"method": method, "args": list(args), "kwargs": kwargs},
+            timeout=timeout * DEFAULT_MAX_ATTEMPTS, priority=self.priority,
+        )
+        merge_stats(stats, result.get("stats"))
+        return result["output"]
+
+    def generate_text(self, *args, **kwargs):
+        return self._call("generate_text", args, kwargs)
+
+    def enhanced_generation(self, *args, **kwargs):
+        return self._call("enhanced_generation", args, kwargs)
+
+    def structured_generation(self, *args, **kwargs):
+        return self._call("structured_generation", args, kwargs)
+
+    # asyncio callers: waiting on the broker happens in a worker thread
+    async def agenerate_text(self, *args, **kwargs):
+        return await asyncio.to_thread(self.generate_text, *args, **kwargs)
+
+    async def aenhanced_generation(self, *args, **kwargs):
+        return await asyncio.to_thread(self.enhanced_generation, *args, **kwargs)
+
+    async def astructured_generation(self, *args, **kwargs):
+        return await asyncio.to_thread(self.structured_generation, *args, **kwargs)
+
+
+def remote_scrape_source(broker: Broker, url: str, date_filter: Optional[dict] = None,
+                         index=None, store=None, timeout: float = 300):
+    """
+    scrape_source() run by a worker. `index`/`store` are accepted for the same
+    signature but unused: workers use their own document index and raw store.
+    """
+    result = broker.call("scrape", {"url": url, "date_filter": date_filter}, timeout=timeout)
+    return result["text"], result["dropped"]
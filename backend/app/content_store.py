@@ -0,0 +1,56 @@
+"""
+Content-addressed store for the fine-grained MCP tools.
+
+The `scrape`, `categorize` and `summarize` tools pass documents and summaries
+around by SHA-256 content hash instead of full text. The server keeps recent
+texts here so a client can send just the hashes back, and a client that
+already holds a hash can ask for it to be left out of a response. Bounded by
+total stored characters, least-recently-used first.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+DEFAULT_MAX_CHARS = 20_000_000
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+EMPTY_HASH = content_hash("")
+
+
+class ContentStore:
+    def __init__(self, max_chars: int = DEFAULT_MAX_CHARS):
+        self.max_chars = max_chars
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def put(self, text: str, key: Optional[str] = None) -> str:
+        """Store `text` under its hash (or under `key`) and return the hash/key."""
+        digest = key or content_hash(text)
+        with self._lock:
+            if digest in self._items:
+                self._items.move_to_end(digest)
+                return digest
+            self._items[digest] = text
+            self._chars += len(text)
+            # The newest item is always kept, even if it alone exceeds the bound
+            while len(self._items) > 1 and self._chars > self.max_chars:
+                _, dropped = self._items.popitem(last=False)
+                self._chars -= len(dropped)
+        return digest
+
+    def get(self, digest: str) -> Optional[str]:
+        with self._lock:
+            text = self._items.get(digest)
+            if text is not None:
+                self._items.move_to_end(digest)
+            return text
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,97 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+
+def build_date_filter(start_date: str = "", end_date: str = "") -> Dict[str, str]:
+    """
+    Turn optional YYYY-MM-DD bounds into the pipeline's date filter:
+    {"start": "YYYY-MM-DDT00:00:00Z", "end": "YYYY-MM-DDT23:59:59Z"}
+    Raises ValueError for a bound in any other format or a start after the
+    end, instead of a filter that parse_date would silently ignore.
+    """
+    for name, value in (("start_date", start_date), ("end_date", end_date)):
+        if value:
+            try:
+                # strptime alone would also take "2024-1-1", which parse_date can't read back
+                if len(value) != 10:
+                    raise ValueError
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                raise ValueError(f"{name} must be a YYYY-MM-DD date, got '{value}'") from None
+    if start_date and end_date and start_date > end_date:
+        raise ValueError(f"start_date {start_date} is after end_date {end_date}")
+
+    date_filter = {}
+    if start_date:
+        date_filter["start"] = start_date + "T00:00:00Z"
+    if end_date:
+        date_filter["end"] = end_date + "T23:59:59Z"
+    return date_filter
+
+
+def parse_date(value) -> Optional[datetime]:
+    """
+    Parse a publication date (ISO 8601, RFC 2822 or unix timestamp) into an
+    aware UTC datetime. Returns None when the value can't be understood.
+    """
+    if value is None or value == "":
+        return None
+
+    if isinstance(value, (int, float)):
+        # Accept both seconds and milliseconds since the epoch
+        seconds = value / 1000 if value > 1e11 else value
+        try:
+            return datetime.fromtimestamp(seconds, tz=timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None
+
+    text = str(value).strip()
+    if text.isdigit():
+        return parse_date(int(text))
+
+    parsed = None
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(text)
+        except (TypeError, ValueError):
+            # Last resort: a leading YYYY-MM-DD
+            try:
+                parsed = datetime.strptime(text[:10], "%Y-%m-%d")
+            except ValueError:
+                return None
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def in_date_range(published, date_filter: Optional[Dict[str, str]]) -> bool:
+    """
+    True if `published` falls inside `date_filter`.
+    Items without a known publication date are kept.
+    """
+    if not date_filter:
+        return True
+    published = published if isinstance(published, datetime) else parse_date(published)
+    if published is None:
+        return True
+
+    start = parse_date(date_filter.get("start"))
+    end = parse_date(date_filter.get("end"))
+    if start and published < start:
+        return False
+    if end and published > end:
+        return False
+    return True
+
+
+def date_bounds(date_filter: Optional[Dict[str, str]]):
+    """Return (start_date, end_date) as `date` objects (or None) for URL building."""
+    if not date_filter:
+        return None, None
+    start = parse_date(date_filter.get("start"))
+    end = parse_date(date_filter.get("end"))
+    return (start.date() if start else None), (end.date() if end else None)
@@ -0,0 +1,249 @@
+"""
+Local persistent document index.
+
+Every scraped document (URL, source category, fetch time, cleaned text) is
+stored in a SQLite database with an FTS5 inverted index, so later queries
+can retrieve fresh, relevant pages before going to the network. SQLite in
+WAL mode allows concurrent appends from several threads or processes.
+"""
+
+import array
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_INDEX_PATH = os.environ.get(
+    "DOC_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "research_index.db"),
+)
+DEFAULT_MAX_AGE = 24 * 3600  # seconds a document is considered fresh
+VECTOR_DIMS = 256
+# An any-term (OR) match must contain this share of the query's terms, so a
+# broad query doesn't fill every source slot with loosely related old pages
+MIN_TERM_OVERLAP = 0.5
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in",
+    "is", "it", "of", "on", "or", "that", "the", "this", "to", "was", "what",
+    "when", "where", "which", "who", "why", "with",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    published REAL,
+    text TEXT NOT NULL,
+    vector BLOB
+);
+CREATE INDEX IF NOT EXISTS documents_fetched_at ON documents(fetched_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    text, content='documents', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts(documents_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE OF text ON documents BEGIN
+    INSERT INTO documents_fts(documents_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    INSERT INTO documents_fts(rowid, text) VALUES (new.id, new.text);
+END;
+"""
+
+
+def source_category(url: str) -> str:
+    """Source category for a URL (Google Search, Wikipedia, Reddit, ...)."""
+    if "google.com/search" in url:
+        return "Google Search"
+    if "news.google.com" in url:
+        return "Google News"
+    if "wikipedia.org" in url:
+        return "Wikipedia"
+    if "reddit.com" in url:
+        return "Reddit"
+    if "medium.com" in url:
+        return "Medium"
+    if "bbc.com" in url or "cnn.com" in url:
+        return "News Site"
+    return "Other"
+
+
+def categorize_scraped_data(urls: List[str], scraped_texts: List[str], rapidai_content: str = "") -> Dict[str, List[str]]:
+    """Group non-empty scraped texts by source category ({source: [texts]}), RapidAI content first."""
+    categorized: Dict[str, List[str]] = {}
+    if rapidai_content.strip():
+        categorized["RapidAI"] = [rapidai_content]
+    for url, text in zip(urls, scraped_texts):
+        if not text.strip():
+            continue
+        categorized.setdefault(source_category(url), []).append(text)
+    return categorized
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in re.findall(r"\w+", text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def hashed_vector(text: str, dims: int = VECTOR_DIMS) -> bytes:
+    """L2-normalised signed feature-hashing vector, packed as float32."""
+    vec = [0.0] * dims
+    for token in tokenize(text):
+        digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dims
+        vec[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return array.array("f", (v / norm for v in vec)).tobytes()
+
+
+def _cosine(a: bytes, b: bytes) -> float:
+    va, vb = array.array("f", a), array.array("f", b)
+    return sum(x * y for x, y in zip(va, vb))
+
+
+class DocumentIndex:
+    def __init__(self, path: str = DEFAULT_INDEX_PATH, use_vectors: bool = False):
+        self.path = path
+        self.use_vectors = use_vectors
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers run alongside a writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------ #
+    #  WRITES                                                            #
+    # ------------------------------------------------------------------ #
+    def add(self, url: str, text: str, source: Optional[str] = None,
+            fetched_at: Optional[float] = None, published: Optional[float] = None):
+        """Insert or refresh a document."""
+        if not text.strip():
+            return
+        vector = hashed_vector(text) if self.use_vectors else None
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO documents (url, source, fetched_at, published, text, vector)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    source = excluded.source, fetched_at = excluded.fetched_at,
+                    published = excluded.published, text = excluded.text,
+                    vector = excluded.vector
+                """,
+                (url, source or source_category(url), fetched_at or time.time(),
+                 published, text, vector),
+            )
+
+    def prune(self, max_age: float):
+        """Delete documents older than `max_age` seconds."""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM documents WHERE fetched_at < ?", (time.time() - max_age,))
+
+    # ------------------------------------------------------------------ #
+    #  READS                                                             #
+    # ------------------------------------------------------------------ #
+    def get(self, url: str, max_age: Optional[float] = DEFAULT_MAX_AGE) -> Optional[Dict]:
+        """Return the stored document for `url` if it is fresh enough."""
+        min_fetched = time.time() - max_age if max_age else 0
+        row = self._conn().execute(
+            "SELECT url, source, fetched_at, published, text FROM documents "
+            "WHERE url = ? AND fetched_at >= ?",
+            (url, min_fetched),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def search(self, query: str, limit: int = 5, max_age: Optional[float] = DEFAULT_MAX_AGE) -> List[Dict]:
+        """
+        Retrieve fresh documents matching `query`, best first.
+        All query terms must match; falls back to any-term matching if that
+        finds fewer than `limit` documents, keeping only documents that contain
+        at least MIN_TERM_OVERLAP of the terms.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        min_fetched = time.time() - max_age if max_age else 0
+        quoted = ['"' + t.replace('"', '""') + '"' for t in terms]
+
+        results: List[Dict] = []
+        seen = set()
+        for match, min_overlap in ((" AND ".join(quoted), 0.0), (" OR ".join(quoted), MIN_TERM_OVERLAP)):
+            # Over-fetch when rows may be re-ranked or filtered out below
+            rows = self._match(match, min_fetched, limit * 4 if self.use_vectors or min_overlap else limit)
+            matched = self._matched_terms(quoted, [row["id"] for row in rows]) if min_overlap else {}
+            for row in rows:
+                if row["url"] in seen:
+                    continue
+                if min_overlap and matched[row["id"]] < min_overlap * len(terms):
+                    continue
+                seen.add(row["url"])
+                results.append(row)
+            if len(results) >= limit or len(terms) == 1:
+                break
+
+        if self.use_vectors and results:
+            qvec = hashed_vector(query)
+            for rank, row in enumerate(results):
+                similarity = _cosine(qvec, row.pop("vector")) if row.get("vector") else 0.0
+                row["score"] = similarity - rank / len(results)
+            results.sort(key=lambda r: r["score"], reverse=True)
+        else:
+            for row in results:
+                row.pop("vector", None)
+        for row in results:
+            del row["id"]
+
+        return results[:limit]
+
+    def _match(self, match: str, min_fetched: float, limit: int) -> List[Dict]:
+        rows = self._conn().execute(
+            """
+            SELECT d.id, d.url, d.source, d.fetched_at, d.published, d.text, d.vector
+            FROM documents_fts f JOIN documents d ON d.id = f.rowid
+            WHERE documents_fts MATCH ? AND d.fetched_at >= ?
+            ORDER BY f.rank
+            LIMIT ?
+            """,
+            (match, min_fetched, limit),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def _matched_terms(self, quoted: List[str], rowids: List[int]) -> Dict[int, int]:
+        """
+        How many of the quoted terms each row matches, asked of FTS5 itself so
+        terms are stemmed like the index ("battery" matches "batteries").
+        """
+        counts = dict.fromkeys(rowids, 0)
+        if not rowids:
+            return counts
+        marks = ",".join("?" * len(rowids))
+        for term in quoted:
+            for (rowid,) in self._conn().execute(
+                f"SELECT rowid FROM documents_fts WHERE documents_fts MATCH ? AND rowid IN ({marks})",
+                (term, *rowids),
+            ):
+                counts[rowid] += 1
+        return counts
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
@@ -0,0 +1,89 @@
+"""
+Simple load test for the research API servers.
+
+Fires concurrent requests at one or more running servers and reports
+throughput and latency percentiles, e.g. to compare the Flask apps with
+the async server:
+
+    python load_test.py --target flask=http://localhost:5000 \
+                        --target async=http://localhost:5001 \
+                        --requests 50 --concurrency 10
+"""
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[idx]
+
+
+def send_request(base_url: str, endpoint: str, payload: dict, timeout: int):
+    start = time.perf_counter()
+    try:
+        if endpoint == "/api/research":
+            resp = requests.post(base_url + endpoint, json=payload, timeout=timeout)
+        else:
+            resp = requests.get(base_url + endpoint, timeout=timeout)
+        ok = resp.status_code == 200
+    except requests.RequestException:
+        ok = False
+    return ok, time.perf_counter() - start
+
+
+def run_load(base_url: str, endpoint: str, payload: dict, total: int, concurrency: int, timeout: int) -> dict:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(
+            lambda _: send_request(base_url, endpoint, payload, timeout), range(total)
+        ))
+    elapsed = time.perf_counter() - started
+
+    latencies = [lat for ok, lat in results if ok]
+    return {
+        "requests": total,
+        "errors": sum(1 for ok, _ in results if not ok),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "mean_s": statistics.mean(latencies) if latencies else 0.0,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Deep Research API")
+    parser.add_argument("--target", action="append", required=True,
+                        help="name=base_url, may be given several times")
+    parser.add_argument("--endpoint", default="/api/research",
+                        choices=["/api/research", "/api/health", "/api/capabilities"])
+    parser.add_argument("--query", default="AI trends 2024")
+    parser.add_argument("--max-sources", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--timeout", type=int, default=900)
+    args = parser.parse_args()
+
+    payload = {"query": args.query, "max_sources": args.max_sources}
+
+    print(f"{'target':<12}{'ok/total':>10}{'req/s':>10}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for target in args.target:
+        name, _, base_url = target.partition("=")
+        stats = run_load(base_url.rstrip("/"), args.endpoint, payload,
+                         args.requests, args.concurrency, args.timeout)
+        ok = stats["requests"] - stats["errors"]
+        print(f"{name:<12}{ok:>5}/{stats['requests']:<4}{stats['throughput_rps']:>10.2f}"
+              f"{stats['mean_s']:>10.2f}{stats['p50_s']:>10.2f}{stats['p95_s']:>10.2f}{stats['p99_s']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
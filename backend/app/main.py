@@ -1,43 +1,14 @@
 from model import GGUFModel
-from scrapper import scrape_multiple_urls
+from scrapper import scrape_source
 from social_media import RapidAIAgent
 from url_generator import generate_urls
+from date_range import build_date_filter
+from doc_index import categorize_scraped_data
+from autotune import load_host_profile, model_settings
+from source_gain import SourceGain
 import contextlib
 import sys
 
-def categorize_scraped_data(urls, scraped_texts, rapidai_content=""):
-    """
-    Categorize content by source (Google, Wikipedia, News, RapidAI, etc.)
-    Returns a dict: {source: [texts]}
-    """
-    categorized = {}
-
-    if rapidai_content.strip():
-        categorized["RapidAI"] = [rapidai_content]
-
-    for url, text in zip(urls, scraped_texts):
-        if not text.strip():  # skip empty content
-            continue
-        if "google.com/search" in url:
-            source = "Google Search"
-        elif "news.google.com" in url:
-            source = "Google News"
-        elif "wikipedia.org" in url:
-            source = "Wikipedia"
-        elif "reddit.com" in url:
-            source = "Reddit"
-        elif "medium.com" in url:
-            source = "Medium"
-        elif "bbc.com" in url or "cnn.com" in url:
-            source = "News Site"
-        else:
-            source = "Other"
-
-        categorized.setdefault(source, []).append(text)
-
-    return categorized
-
-
 if __name__ == "__main__":
     user_query = input("Enter your query: ").strip()
     if not user_query:
@@ -45,11 +16,13 @@ if __name__ == "__main__":
 
     start_date = input("Start date (YYYY-MM-DD) or leave blank: ").strip()
     end_date = input("End date (YYYY-MM-DD) or leave blank: ").strip()
-    date_filter = {}
-    if start_date:
-        date_filter["start"] = start_date + "T00:00:00Z"
-    if end_date:
-        date_filter["end"] = end_date + "T23:59:59Z"
+    try:
+        date_filter = build_date_filter(start_date, end_date)
+    except ValueError as e:
+        print(e)
+        exit(1)
+    adaptive = input("Stop early once sources add nothing new? (y/N): ").strip().lower() == "y"
+    gain = SourceGain(user_query) if adaptive else None
 
     # Initialize LLM
     model_path = r"C:\Users\jashp\Downloads\Deep Research Agent\mistral-7b-instruct-v0.2.Q4_K_S.gguf"
@@ -57,10 +30,9 @@ if __name__ == "__main__":
     model = GGUFModel(
         model_path=model_path,
         llama_cli_path=llama_cli_bin,
-        threads=6,
-        max_tokens=256,
         temperature=0.7,
         timeout=600,
+        **model_settings(load_host_profile()),
     )
 
     # Suppress intermediate prints
@@ -70,22 +42,33 @@ if __name__ == "__main__":
         rapidai_api_key = "YOUR API KEY"
         rapid_agent = RapidAIAgent(rapidai_api_key)
         urls, aggregated_content = [], ""
+        dropped_by_date = 0
 
         try:
-            rapidai_data = rapid_agent.fetch_data(user_query, max_results=5)
+            rapidai_data = rapid_agent.fetch_data(user_query, date_range=date_filter, max_results=5)
             urls = rapidai_data.get("urls", [])
             aggregated_content = rapidai_data.get("content", "")
+            dropped_by_date += rapidai_data.get("dropped_by_date", 0)
         except:
             urls, aggregated_content = [], ""
 
         if not urls:
-            urls = generate_urls(user_query)
+            urls = generate_urls(user_query, date_filter)
 
-        scraped_texts = []
+        if gain is not None:
+            gain.plan(urls[:5])
+            gain.seed(aggregated_content)
+        used_urls, scraped_texts = [], []
         for url in urls[:5]:
-            scraped_texts.append(scrape_multiple_urls([url], max_urls=1))
+            scraped_text, dropped = scrape_source(url, date_filter)
+            dropped_by_date += dropped
+            if gain is None or gain.add(url, scraped_text):
+                used_urls.append(url)
+                scraped_texts.append(scraped_text)
+            if gain is not None and gain.saturated:
+                break  # later sources would add too little
 
-        categorized_data = categorize_scraped_data(urls, scraped_texts, aggregated_content)
+        categorized_data = categorize_scraped_data(used_urls, scraped_texts, aggregated_content)
 
         final_sections = []
         for source, texts in categorized_data.items():
@@ -105,4 +88,10 @@ if __name__ == "__main__":
     final_output = "\n\n".join(final_sections)
     print("\n================ FINAL CATEGORIZED SUMMARY ================\n")
     print(final_output)
+    if date_filter:
+        print(f"\n({dropped_by_date} item(s) outside the date range were dropped before summarization)")
+    if gain is not None:
+        report = gain.report()
+        print(f"(Adaptive: used {report['sources_used']} of {report['sources_planned']} source(s), "
+              f"{report['fetches_avoided']} fetch(es) and {report['generations_avoided']} summary generation(s) avoided)")
 
@@ -7,13 +7,28 @@ Allows other applications to interact with the research server
 import asyncio
 import json
 import logging
+from collections import OrderedDict
 from typing import Dict, List, Optional
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 
+from content_store import ContentStore
+from tracing import inject, span
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("deep-research-client")
 
+# Bounds for the client-side content-hash caches
+CACHE_MAX_CHARS = 20_000_000
+HASH_MEMORY = 10_000  # URL / query -> last content hash seen, for known_hashes
+
+
+def _remember(mapping: OrderedDict, key, digest: str):
+    mapping[key] = digest
+    mapping.move_to_end(key)
+    while len(mapping) > HASH_MEMORY:
+        mapping.popitem(last=False)
+
 class DeepResearchMCPClient:
     """Client wrapper for Deep Research Agent MCP server"""
 
@@ -21,6 +36,15 @@ class DeepResearchMCPClient:
         self.server_path = server_path
         self.session = None
         self.session_manager = None
+        # Content-hash caches for the fine-grained tools: the server leaves
+        # out texts and summaries we already hold. Both are LRU-bounded, and a
+        # call only sends the hashes last seen for its own URLs / query /
+        # categories, so requests don't grow with the client's lifetime.
+        self._documents = ContentStore(CACHE_MAX_CHARS)
+        self._summaries = ContentStore(CACHE_MAX_CHARS)  # summary_hash -> JSON
+        self._url_hashes: OrderedDict = OrderedDict()
+        self._rapidai_hashes: OrderedDict = OrderedDict()
+        self._summary_hashes: OrderedDict = OrderedDict()
 
     async def connect(self):
         """Connect to the MCP server"""
@@ -52,8 +76,22 @@ class DeepResearchMCPClient:
                 self.session = None
                 self.session_manager = None
 
+    async def _call_tool(self, name: str, args: dict, progress_callback=None):
+        """call_tool inside a client span; the trace context rides in the request's _meta."""
+        with span("mcp.call_tool", tool=name):
+            kwargs = {}
+            if progress_callback is not None:
+                kwargs["progress_callback"] = progress_callback
+            traceparent = inject()
+            if traceparent:
+                kwargs["meta"] = {"traceparent": traceparent}
+            return await self.session.call_tool(name, args, **kwargs)
+
     async def research(self, query: str, start_date: Optional[str] = None, 
-                      end_date: Optional[str] = None, max_sources: int = 5) -> str:
+                      end_date: Optional[str] = None, max_sources: int = 5,
+                      priority: Optional[str] = None,
+                      session_id: Optional[str] = None,
+                      force_refresh: bool = False) -> str:
         """Perform comprehensive research on a topic"""
         if not self.session:
             await self.connect()
@@ -68,8 +106,14 @@ class DeepResearchMCPClient:
                 args["start_date"] = start_date
             if end_date:
                 args["end_date"] = end_date
+            if priority:
+                args["priority"] = priority
+            if session_id:
+                args["session_id"] = session_id
+            if force_refresh:
+                args["force_refresh"] = True
 
-            result = await self.session.call_tool("deep_research", args)
+            result = await self._call_tool("deep_research", args)
 
             if result and result.content:
                 return result.content[0].text if result.content[0].text else "No results"
@@ -79,6 +123,187 @@ class DeepResearchMCPClient:
             logger.error(f"Research failed: {e}")
             return f"Research failed: {str(e)}"
 
+    async def structured_research(self, query: str, start_date: Optional[str] = None,
+                                  end_date: Optional[str] = None, max_sources: int = 5,
+                                  priority: Optional[str] = None,
+                                  session_id: Optional[str] = None,
+                                  force_refresh: bool = False) -> dict:
+        """Research with schema-constrained output: {"final_summary": str, "facts": {source: [...]}}"""
+        if not self.session:
+            await self.connect()
+
+        try:
+            args = {"query": query, "max_sources": max_sources, "structured": True}
+            if start_date:
+                args["start_date"] = start_date
+            if end_date:
+                args["end_date"] = end_date
+            if priority:
+                args["priority"] = priority
+            if session_id:
+                args["session_id"] = session_id
+            if force_refresh:
+                args["force_refresh"] = True
+
+            result = await self._call_tool("deep_research", args)
+            contents = result.content if result and result.content else []
+            facts = {}
+            if len(contents) > 1:
+                facts = json.loads(contents[1].text).get("facts", {})
+            return {
+                "final_summary": contents[0].text if contents else "No results returned",
+                "facts": facts,
+            }
+
+        except Exception as e:
+            logger.error(f"Structured research failed: {e}")
+            return {"final_summary": f"Research failed: {str(e)}", "facts": {}}
+
+    async def batch_research(self, queries: List[str], max_sources: int = 5) -> List[str]:
+        """Research many queries in one job; the last entry holds batch stats as JSON"""
+        if not self.session:
+            await self.connect()
+
+        try:
+            result = await self._call_tool(
+                "batch_research", {"queries": queries, "max_sources": max_sources}
+            )
+            return [c.text for c in result.content] if result and result.content else []
+
+        except Exception as e:
+            logger.error(f"Batch research failed: {e}")
+            return [f"Batch research failed: {str(e)}"]
+
+    async def _call_json(self, name: str, args: dict, progress_callback=None) -> dict:
+        if not self.session:
+            await self.connect()
+        result = await self._call_tool(name, args, progress_callback)
+        text = result.content[0].text if result and result.content else ""
+        try:
+            return json.loads(text)
+        except ValueError:
+            raise RuntimeError(text or f"{name} returned no result")
+
+    def _fill_text(self, item: dict) -> dict:
+        if "text" in item:
+            self._documents.put(item["text"], key=item["content_hash"])
+        else:
+            item["text"] = self._documents.get(item["content_hash"]) or ""
+        return item
+
+    def _held(self, cache: ContentStore, digests) -> List[str]:
+        """The hashes among `digests` still in `cache`, to send as known_hashes."""
+        return [d for d in dict.fromkeys(digests) if d and cache.get(d) is not None]
+
+    async def generate_urls(self, query: str, start_date: Optional[str] = None,
+                            end_date: Optional[str] = None, max_sources: int = 5) -> dict:
+        """Stage 1: {"urls": [...], "rapidai": {source, content_hash, text} or None, "dropped_by_date": n}"""
+        known = self._held(self._documents, [self._rapidai_hashes.get(query)])
+        args = {"query": query, "max_sources": max_sources, "known_hashes": known}
+        if start_date:
+            args["start_date"] = start_date
+        if end_date:
+            args["end_date"] = end_date
+        result = await self._call_json("generate_urls", args)
+        if result.get("rapidai"):
+            self._fill_text(result["rapidai"])
+            _remember(self._rapidai_hashes, query, result["rapidai"]["content_hash"])
+        return result
+
+    async def scrape(self, urls: List[str], start_date: Optional[str] = None,
+                     end_date: Optional[str] = None, progress_callback=None) -> List[dict]:
+        """Stage 2: [{"url", "content_hash", "text"}] in `urls` order; known texts come from the local cache"""
+        known = self._held(self._documents, [self._url_hashes.get(url) for url in urls])
+        args = {"urls": urls, "known_hashes": known}
+        if start_date:
+            args["start_date"] = start_date
+        if end_date:
+            args["end_date"] = end_date
+        result = await self._call_json("scrape", args, progress_callback)
+        for doc in result["documents"]:
+            _remember(self._url_hashes, doc["url"], doc["content_hash"])
+        return [self._fill_text(doc) for doc in result["documents"]]
+
+    async def categorize(self, documents: List[dict]) -> Dict[str, dict]:
+        """Stage 3: {source: {"urls": [...], "content_hashes": [...]}}; documents may be URL-only"""
+        documents = [{k: v for k, v in doc.items() if k in ("url", "source", "content_hash")} for doc in documents]
+        result = await self._call_json("categorize", {"documents": documents})
+        return result["categories"]
+
+    async def summarize(self, query: str, categories: Dict[str, List[str]], structured: bool = False,
+                        max_tokens: int = 400, priority: Optional[str] = None,
+                        progress_callback=None) -> Dict[str, dict]:
+        """Stage 4: {source: {"summary_hash", "summary", ["facts"]}} for {source: [content_hash, ...]}"""
+        request_keys = {source: (query, source, tuple(hashes), structured, max_tokens)
+                        for source, hashes in categories.items()}
+        known = self._held(self._summaries, [self._summary_hashes.get(k) for k in request_keys.values()])
+        args = {"query": query, "categories": categories, "structured": structured,
+                "max_tokens": max_tokens, "known_hashes": known}
+        if priority:
+            args["priority"] = priority
+        summaries = (await self._call_json("summarize", args, progress_callback))["summaries"]
+
+        # The server evicted some texts: resend just those categories with their text
+        missing = {source: categories[source] for source, s in summaries.items() if "missing_hashes" in s}
+        if missing:
+            resend = {}
+            for source, hashes in missing.items():
+                texts = [self._documents.get(h) for h in hashes]
+                resend[source] = [h if text is None else {"text": text} for h, text in zip(hashes, texts)]
+            args["categories"] = resend
+            summaries.update((await self._call_json("summarize", args, progress_callback))["summaries"])
+
+        # A summary we said we held was evicted meanwhile: ask for it again
+        lost = [source for source, s in summaries.items()
+                if s.get("known") and self._summaries.get(s["summary_hash"]) is None]
+        if lost:
+            args.update(categories={source: categories[source] for source in lost}, known_hashes=[])
+            summaries.update((await self._call_json("summarize", args, progress_callback))["summaries"])
+
+        for source, summary in summaries.items():
+            if summary.get("known"):
+                summaries[source] = json.loads(self._summaries.get(summary["summary_hash"]))
+            elif "summary_hash" in summary:
+                self._summaries.put(json.dumps(summary), key=summary["summary_hash"])
+                _remember(self._summary_hashes, request_keys[source], summary["summary_hash"])
+        return summaries
+
+    async def staged_research(self, query: str, start_date: Optional[str] = None,
+                              end_date: Optional[str] = None, max_sources: int = 5,
+                              structured: bool = False, priority: Optional[str] = None) -> dict:
+        """
+        deep_research built from the fine-grained tools. Each category is
+        scraped and summarized as its own pipeline, so summarizing one
+        category overlaps with fetching the others.
+        """
+        plan = await self.generate_urls(query, start_date, end_date, max_sources)
+        groups = await self.categorize([{"url": url} for url in plan["urls"]])
+
+        async def run_category(source, urls):
+            documents = await self.scrape(urls, start_date, end_date)
+            hashes = [doc["content_hash"] for doc in documents if doc["text"].strip()]
+            if not hashes:
+                return source, None
+            summaries = await self.summarize(query, {source: hashes}, structured, priority=priority)
+            return source, summaries.get(source)
+
+        tasks = [run_category(source, group["urls"]) for source, group in groups.items()]
+        rapidai = plan.get("rapidai")
+        if rapidai:
+            async def run_rapidai():
+                summaries = await self.summarize(query, {"RapidAI": [rapidai["content_hash"]]}, structured,
+                                                 priority=priority)
+                return "RapidAI", summaries.get("RapidAI")
+            tasks.insert(0, run_rapidai())
+
+        results = [(source, summary) for source, summary in await asyncio.gather(*tasks)
+                   if summary and "summary" in summary]
+        return {
+            "final_summary": "\n\n".join(f"### {source} Summary\n{summary['summary']}" for source, summary in results),
+            "summaries": dict(results),
+            "urls": plan["urls"],
+        }
+
     async def get_capabilities(self) -> str:
         """Get server capabilities"""
         if not self.session:
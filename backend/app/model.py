@@ -1,6 +1,75 @@
+import asyncio
 import subprocess
+import codecs
+import json
+import os
 import re
-from typing import Optional
+import threading
+import weakref
+from typing import List, Optional
+
+from tracing import NOOP_SPAN, span
+
+# Markers llama.cpp / Mistral emit at end of generation, plus the start of a
+# new instruction turn, which means the answer is over.
+DEFAULT_STOP = ["[end of text]", "</s>", "[INST]"]
+NOT_ENOUGH_INFO = "Not enough explicit information found."
+
+# One llama-cli spawn at a time per event loop: a burst of concurrent
+# create_subprocess_exec calls runs back to back and stalls the loop
+_spawn_locks = weakref.WeakKeyDictionary()
+
+
+def _find_stop(text: str, start: int, stop: List[str], stop_after: List[str]):
+    """Return (cut_index, matched) for the earliest stop string in text[start:]."""
+    best = (None, None)
+    for s in stop:
+        i = text.find(s, start)
+        if i != -1 and (best[0] is None or i < best[0]):
+            best = (i, s)
+    for s in stop_after:
+        i = text.find(s, start)
+        if i != -1 and (best[0] is None or i + len(s) <= best[0]):
+            best = (i + len(s), s)
+    return best
+
+
+def parse_perf(stderr: str) -> dict:
+    """
+    Pull timing / speculative-decoding counters out of llama.cpp's stderr.
+    Handles both llama-cli (llama_perf_context_print) and llama-speculative output.
+    """
+    perf = {}
+    m = re.search(r"prompt eval time =\s*([\d.]+) ms /\s*(\d+) tokens", stderr)
+    if m:
+        perf["prompt_tokens"] = int(m.group(2))
+        perf["prompt_seconds"] = float(m.group(1)) / 1000
+    m = re.search(r"\beval time =\s*([\d.]+) ms /\s*(\d+) runs", stderr)
+    if m:
+        perf["decoded_tokens"] = int(m.group(2))
+        perf["decode_seconds"] = float(m.group(1)) / 1000
+    # llama-speculative reports its own decode timing and acceptance
+    m = re.search(r"decoded\s+(\d+) tokens in\s+([\d.]+) seconds", stderr)
+    if m:
+        perf["decoded_tokens"] = int(m.group(1))
+        perf["decode_seconds"] = float(m.group(2))
+    m = re.search(r"n_drafted\s*=\s*(\d+)", stderr)
+    if m:
+        perf["drafted_tokens"] = int(m.group(1))
+    m = re.search(r"n_accept\s*=\s*(\d+)", stderr)
+    if m:
+        perf["accepted_tokens"] = int(m.group(1))
+    return perf
+
+
+def summarize_stats(stats: dict) -> dict:
+    """Add derived tokens/sec and acceptance rate to accumulated stats."""
+    summary = dict(stats)
+    if stats.get("decode_seconds"):
+        summary["tokens_per_second"] = round(stats["decoded_tokens"] / stats["decode_seconds"], 2)
+    if stats.get("drafted_tokens"):
+        summary["acceptance_rate"] = round(stats.get("accepted_tokens", 0) / stats["drafted_tokens"], 3)
+    return summary
 
 
 class GGUFModel:
@@ -12,6 +81,13 @@ class GGUFModel:
         max_tokens: int = 256,
         temperature: float = 0.7,
         timeout: int = 600,
+        draft_model_path: Optional[str] = None,
+        speculative_cli_path: Optional[str] = None,
+        draft_tokens: int = 16,
+        ctx_size: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        ubatch_size: Optional[int] = None,
+        use_mmap: bool = False,
     ):
         self.model_path = model_path
         self.llama_cli_path = llama_cli_path
@@ -20,52 +96,309 @@ class GGUFModel:
         self.temperature = temperature
         self.timeout = timeout
 
+        # Runtime tuning (see autotune.py); None keeps llama.cpp's defaults
+        self.ctx_size = ctx_size
+        self.batch_size = batch_size
+        self.ubatch_size = ubatch_size
+        self.use_mmap = use_mmap
+
+        # Optional speculative decoding: a small draft model (same tokenizer)
+        # proposes `draft_tokens` at a time and the main model verifies them.
+        self.draft_model_path = draft_model_path
+        self.draft_tokens = draft_tokens
+        if speculative_cli_path is None and draft_model_path:
+            # llama-speculative ships next to llama-cli in llama.cpp builds
+            cli_dir, cli_name = os.path.split(llama_cli_path)
+            speculative_cli_path = os.path.join(cli_dir, cli_name.replace("llama-cli", "llama-speculative"))
+        self.speculative_cli_path = speculative_cli_path
+
+    def _runtime_args(self) -> list:
+        """Thread / context / batch / mmap flags shared by every invocation."""
+        args = ["-t", str(self.threads)]
+        if self.ctx_size:
+            args += ["-c", str(self.ctx_size)]
+        if self.batch_size:
+            args += ["-b", str(self.batch_size)]
+        if self.ubatch_size:
+            args += ["-ub", str(self.ubatch_size)]
+        if not self.use_mmap:
+            args.append("--no-mmap")
+        return args
+
     # ------------------------------------------------------------------ #
     #  BASIC GENERATION (single chunk)                                   #
     # ------------------------------------------------------------------ #
-    def generate_text(self, prompt: str, timeout: Optional[int] = None) -> str:
-        """Run llama-cli once and return raw output (one chunk)."""
-        if timeout is None:
-            timeout = self.timeout
+    # Generation parameters are passed per call and nothing per-request is
+    # stored on the instance, so one GGUFModel can serve concurrent calls
+    # from threads and asyncio tasks. The constructor's max_tokens /
+    # temperature are only defaults.
+    def _build_cmd(
+        self,
+        prompt: str,
+        stop: List[str],
+        json_schema: Optional[dict] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+    ) -> list:
+        n_predict = str(max_tokens or self.max_tokens)
+        temp = str(self.temperature if temperature is None else temperature)
+        if self.draft_model_path:
+            cmd = [
+                self.speculative_cli_path,
+                "-m", self.model_path,
+                "-md", self.draft_model_path,
+                "--draft", str(self.draft_tokens),
+                "-p", prompt,
+                "-n", n_predict,
+                "--temp", temp,
+            ]
+        else:
+            cmd = [
+                self.llama_cli_path,
+                "-m", self.model_path,
+                "-no-cnv",
+                "-p", prompt,
+                "-n", n_predict,
+                "--temp", temp,
+                "--simple-io",
+                "--no-display-prompt",
+            ]
+            # Reverse prompts let llama-cli halt on its own where supported
+            for s in stop:
+                cmd += ["-r", s]
+        if json_schema is not None:
+            # llama.cpp compiles the schema to a GBNF grammar and constrains sampling
+            cmd += ["--json-schema", json.dumps(json_schema)]
+        return cmd + self._runtime_args()
 
-        cmd = [
-            self.llama_cli_path,
-            "-m", self.model_path,
-            "-no-cnv",
-            "-p", prompt,
-            "-n", str(self.max_tokens),
-            "-t", str(self.threads),
-            "--temp", str(self.temperature),
-            "--simple-io",
-            "--no-mmap",
-        ]
+    def _span(self, prompt: str, json_schema: Optional[dict], max_tokens: int):
+        return span("generate", prompt_chars=len(prompt), max_tokens=max_tokens,
+                    structured=json_schema is not None, speculative=bool(self.draft_model_path))
+
+    def _run(
+        self,
+        prompt: str,
+        timeout: int,
+        stats: Optional[dict] = None,
+        stop: Optional[List[str]] = None,
+        stop_after: Optional[List[str]] = None,
+        json_schema: Optional[dict] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+    ) -> dict:
+        """
+        Stream one llama-cli run and end it as soon as a stop condition is met.
+
+        `stop` strings are cut from the output, `stop_after` strings are kept;
+        EOS markers always end generation. Returns
+        {"text": str, "finished": bool, "tokens": int} where `finished` means the
+        model is done (EOS or stop string) rather than out of budget.
+        """
+        max_tokens = max_tokens or self.max_tokens
+        with self._span(prompt, json_schema, max_tokens) as trace:
+            result = self._run_llama(prompt, timeout, stats, stop, stop_after, json_schema,
+                                     max_tokens, temperature, trace)
+            trace.set(tokens=result["tokens"], finished=result["finished"])
+            return result
+
+    async def _arun(
+        self,
+        prompt: str,
+        timeout: int,
+        stats: Optional[dict] = None,
+        stop: Optional[List[str]] = None,
+        stop_after: Optional[List[str]] = None,
+        json_schema: Optional[dict] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+    ) -> dict:
+        """_run with the llama-cli process driven by asyncio instead of a blocked thread."""
+        max_tokens = max_tokens or self.max_tokens
+        with self._span(prompt, json_schema, max_tokens) as trace:
+            result = await self._arun_llama(prompt, timeout, stats, stop, stop_after, json_schema,
+                                            max_tokens, temperature, trace)
+            trace.set(tokens=result["tokens"], finished=result["finished"])
+            return result
+
+    def _run_llama(self, prompt, timeout, stats, stop, stop_after, json_schema, max_tokens,
+                   temperature, trace=NOOP_SPAN) -> dict:
+        stop = list(dict.fromkeys(DEFAULT_STOP + (stop or [])))
+        stop_after = stop_after or []
+        cmd = self._build_cmd(prompt, stop, json_schema, max_tokens, temperature)
 
         print("Running command:", " ".join(f'"{c}"' if " " in c else c for c in cmd))
 
+        proc = subprocess.Popen(
+            cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        # Drain stderr in the background so a chatty process can't block on it
+        stderr_chunks = []
+        stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True)
+        stderr_thread.start()
+        timed_out = threading.Event()
+
+        def on_timeout():
+            timed_out.set()
+            proc.kill()
+
+        timer = threading.Timer(timeout, on_timeout)
+        timer.start()
+
+        # llama-speculative has no --no-display-prompt, so skip its echo
+        search_from = len(prompt) if self.draft_model_path else 0
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        text, cut, matched = "", None, None
         try:
-            proc = subprocess.Popen(
-                cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+            while True:
+                data = proc.stdout.read1(4096)
+                if not data:
+                    break
+                text += decoder.decode(data)
+                cut, matched = _find_stop(text, search_from, stop, stop_after)
+                if matched is not None:
+                    proc.kill()
+                    break
+            proc.wait()
+        finally:
+            timer.cancel()
+        stderr_thread.join(timeout=5)
+        stderr = b"".join(stderr_chunks).decode("utf-8", errors="replace")
+
+        return self._finish(prompt, text, cut, matched, stderr, proc.returncode, timed_out.is_set(),
+                            timeout, max_tokens, search_from, stats, trace,
+                            structured=json_schema is not None)
+
+    async def _arun_llama(self, prompt, timeout, stats, stop, stop_after, json_schema, max_tokens,
+                          temperature, trace=NOOP_SPAN) -> dict:
+        stop = list(dict.fromkeys(DEFAULT_STOP + (stop or [])))
+        stop_after = stop_after or []
+        cmd = self._build_cmd(prompt, stop, json_schema, max_tokens, temperature)
+
+        print("Running command:", " ".join(f'"{c}"' if " " in c else c for c in cmd))
+
+        async with _spawn_lock():
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
             )
-            stdout, stderr = proc.communicate(timeout=timeout)
+        stderr_task = asyncio.ensure_future(proc.stderr.read())
 
-            if proc.returncode != 0:
-                print(f"llama-cli error:\n{stderr}")
-                return ""
+        search_from = len(prompt) if self.draft_model_path else 0
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        text, cut, matched = "", None, None
 
-            output = stdout.strip()
-            # Remove any token-formatting artefacts
-            output = re.sub(r"\[/?INST\]", "", output)
-            output = re.sub(r"<[^>]+>", "", output)
+        async def read_until_stop():
+            nonlocal text, cut, matched
+            while True:
+                data = await proc.stdout.read(4096)
+                if not data:
+                    break
+                text += decoder.decode(data)
+                cut, matched = _find_stop(text, search_from, stop, stop_after)
+                if matched is not None:
+                    _kill(proc)
+                    break
 
-            # In case model echoes the prompt, drop it
-            if prompt in output:
-                output = output.split(prompt, 1)[-1].strip()
+        timed_out = False
+        try:
+            await asyncio.wait_for(read_until_stop(), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            _kill(proc)
+        except BaseException:
+            # Cancelled (e.g. the client went away): don't leave llama-cli running
+            _kill(proc)
+            raise
+        await proc.wait()
+        try:
+            stderr = (await asyncio.wait_for(stderr_task, 5)).decode("utf-8", errors="replace")
+        except asyncio.TimeoutError:
+            stderr = ""
 
-            return output
-        except subprocess.TimeoutExpired:
-            proc.kill()
+        return self._finish(prompt, text, cut, matched, stderr, proc.returncode, timed_out,
+                            timeout, max_tokens, search_from, stats, trace,
+                            structured=json_schema is not None)
+
+    def _finish(self, prompt, text, cut, matched, stderr, returncode, timed_out, timeout,
+                max_tokens, search_from, stats, trace, structured=False) -> dict:
+        """
+        Turn a finished llama-cli run into {"text", "finished", "tokens"}.
+        Schema-constrained (`structured`) output is returned as generated: the
+        cleanup below would rewrite facts such as "costs <5% and >3%".
+        """
+        if timed_out:
+            trace.set(timed_out=True)
             print(f"Generation timed-out after {timeout} s")
-            return ""
+            return {"text": "", "finished": False, "tokens": 0}
+        if matched is None and returncode != 0:
+            print(f"llama-cli error:\n{stderr}")
+            return {"text": "", "finished": False, "tokens": 0}
+
+        perf = parse_perf(stderr)
+        trace.set(**perf)
+        if matched is not None:
+            text = text[:cut]
+            # Killed mid-run: no timings printed, so estimate (~4 chars/token)
+            tokens = perf.get("decoded_tokens", max(1, len(text[search_from:]) // 4))
+        else:
+            tokens = perf.get("decoded_tokens", max_tokens)
+        # EOS may be reported on stderr depending on the llama.cpp build
+        finished = matched is not None or "[end of text]" in stderr
+
+        if stats is not None:
+            stats["calls"] = stats.get("calls", 0) + 1
+            for key, value in perf.items():
+                stats[key] = stats.get(key, 0) + value
+            if matched is not None:
+                stats["stop_sequence_hits"] = stats.get("stop_sequence_hits", 0) + 1
+
+        output = text.strip()
+        if structured:
+            return {"text": output, "finished": finished, "tokens": tokens}
+
+        # Remove any token-formatting artefacts
+        output = re.sub(r"\[/?INST\]", "", output)
+        output = re.sub(r"<[^>]+>", "", output)
+
+        # In case model echoes the prompt, drop it
+        if prompt in output:
+            output = output.split(prompt, 1)[-1].strip()
+
+        return {"text": output, "finished": finished, "tokens": tokens}
+
+    def generate_text(
+        self,
+        prompt: str,
+        timeout: Optional[int] = None,
+        stats: Optional[dict] = None,
+        stop: Optional[List[str]] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+    ) -> str:
+        """
+        Run llama-cli once and return raw output (one chunk).
+        Generation ends early on EOS or any of the `stop` strings.
+        If `stats` is given, token counts and timings are accumulated into it.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        return self._run(prompt, timeout, stats=stats, stop=stop, max_tokens=max_tokens,
+                         temperature=temperature)["text"]
+
+    async def agenerate_text(
+        self,
+        prompt: str,
+        timeout: Optional[int] = None,
+        stats: Optional[dict] = None,
+        stop: Optional[List[str]] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+    ) -> str:
+        """generate_text for asyncio callers; the event loop is not blocked while llama-cli runs."""
+        if timeout is None:
+            timeout = self.timeout
+        result = await self._arun(prompt, timeout, stats=stats, stop=stop, max_tokens=max_tokens,
+                                  temperature=temperature)
+        return result["text"]
 
     # ------------------------------------------------------------------ #
     #  ITERATIVE GENERATION (multi-chunk, merged)                        #
@@ -76,10 +409,15 @@ class GGUFModel:
         max_total_tokens: int = 1024,
         chunk_size: int = 256,
         timeout: Optional[int] = None,
+        stats: Optional[dict] = None,
+        stop: Optional[List[str]] = None,
+        stop_after: Optional[List[str]] = None,
+        temperature: Optional[float] = None,
     ) -> str:
         """
         Keep calling llama-cli in chunks until `max_total_tokens`
-        is reached or generation stalls.
+        is reached, generation stalls, or a stop condition is met.
+        Budget left unused by an early stop is counted in stats["tokens_saved"].
         """
         if timeout is None:
             timeout = self.timeout
@@ -89,16 +427,43 @@ class GGUFModel:
         current_prompt = prompt
 
         while tokens_left > 0:
-            self.max_tokens = min(chunk_size, tokens_left)
-            chunk = self.generate_text(current_prompt, timeout=timeout)
-
-            # Model returned nothing → stop
-            if not chunk.strip():
+            chunk_tokens = min(chunk_size, tokens_left)
+            result = self._run(current_prompt, timeout, stats=stats, stop=stop, stop_after=stop_after,
+                               max_tokens=chunk_tokens, temperature=temperature)
+            merged, current_prompt, done = _merge_chunk(merged, current_prompt, result, tokens_left, stats)
+            if done:
                 break
+            tokens_left -= chunk_tokens
 
-            merged += chunk
-            current_prompt += chunk
-            tokens_left -= self.max_tokens
+        return merged.strip()
+
+    async def aiterative_generate(
+        self,
+        prompt: str,
+        max_total_tokens: int = 1024,
+        chunk_size: int = 256,
+        timeout: Optional[int] = None,
+        stats: Optional[dict] = None,
+        stop: Optional[List[str]] = None,
+        stop_after: Optional[List[str]] = None,
+        temperature: Optional[float] = None,
+    ) -> str:
+        """iterative_generate for asyncio callers."""
+        if timeout is None:
+            timeout = self.timeout
+
+        merged = ""
+        tokens_left = max_total_tokens
+        current_prompt = prompt
+
+        while tokens_left > 0:
+            chunk_tokens = min(chunk_size, tokens_left)
+            result = await self._arun(current_prompt, timeout, stats=stats, stop=stop, stop_after=stop_after,
+                                      max_tokens=chunk_tokens, temperature=temperature)
+            merged, current_prompt, done = _merge_chunk(merged, current_prompt, result, tokens_left, stats)
+            if done:
+                break
+            tokens_left -= chunk_tokens
 
         return merged.strip()
 
@@ -113,39 +478,218 @@ class GGUFModel:
         max_total_tokens: int = 1024,
         chunk_size: int = 256,
         timeout: Optional[int] = None,
+        stats: Optional[dict] = None,
+        temperature: Optional[float] = None,
     ) -> str:
         """
         Generate a SINGLE merged summary that contains only facts found in `web_data`.
         No prompt scaffolding or model reasoning should appear in the final answer.
         """
-        if timeout is None:
-            timeout = self.timeout
-
-        # -- Clean, self-contained prompt --------------------------------
-        enhanced_prompt = (
-            f"{original_prompt}\n\n"
-            f"=== Source Text Start ===\n{web_data}\n=== Source Text End ===\n\n"
-            "Write a concise, structured summary **using ONLY facts that appear "
-            "verbatim in the Source Text**. "
-            "Do NOT invent, guess, or paraphrase unseen information. "
-            "If the Source Text lacks enough information, output exactly: "
-            "\"Not enough explicit information found.\""
-        )
-
         # -- Generate (handles chunking & merges) ------------------------
         merged = self.iterative_generate(
-            enhanced_prompt,
+            _enhanced_prompt(original_prompt, web_data),
             max_total_tokens=max_total_tokens,
             chunk_size=chunk_size,
             timeout=timeout,
+            stats=stats,
+            stop=["=== Source Text Start ==="],
+            stop_after=[NOT_ENOUGH_INFO],
+            temperature=temperature,
         )
+        return _strip_source_text(merged)
+
+    async def aenhanced_generation(
+        self,
+        original_prompt: str,
+        initial_output: str,
+        web_data: str,
+        max_total_tokens: int = 1024,
+        chunk_size: int = 256,
+        timeout: Optional[int] = None,
+        stats: Optional[dict] = None,
+        temperature: Optional[float] = None,
+    ) -> str:
+        """enhanced_generation for asyncio callers."""
+        merged = await self.aiterative_generate(
+            _enhanced_prompt(original_prompt, web_data),
+            max_total_tokens=max_total_tokens,
+            chunk_size=chunk_size,
+            timeout=timeout,
+            stats=stats,
+            stop=["=== Source Text Start ==="],
+            stop_after=[NOT_ENOUGH_INFO],
+            temperature=temperature,
+        )
+        return _strip_source_text(merged)
+
+    # ------------------------------------------------------------------ #
+    #  STRUCTURED GENERATION (grammar-constrained facts)                 #
+    # ------------------------------------------------------------------ #
+    def structured_generation(
+        self,
+        original_prompt: str,
+        web_data: str,
+        source_urls: Optional[List[str]] = None,
+        max_facts: int = 8,
+        max_fact_chars: int = 300,
+        max_tokens: int = 400,
+        timeout: Optional[int] = None,
+        stats: Optional[dict] = None,
+        temperature: Optional[float] = None,
+    ) -> List[dict]:
+        """
+        Extract facts from `web_data` as [{"fact": str, "source_url": str}, ...].
+        Output is constrained by a JSON schema, so there is nothing to clean up
+        and its length is bounded by `max_facts` x `max_fact_chars`.
+        `source_urls` defaults to the "--- Content from <url> ---" headers in `web_data`;
+        pass it for text without them (RapidAI content), or any URL is accepted.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        prompt, schema = _structured_request(original_prompt, web_data, source_urls, max_facts, max_fact_chars)
+        output = self._run(prompt, timeout, stats=stats, json_schema=schema, max_tokens=max_tokens,
+                           temperature=temperature)["text"]
+        return parse_facts(output)
+
+    async def astructured_generation(
+        self,
+        original_prompt: str,
+        web_data: str,
+        source_urls: Optional[List[str]] = None,
+        max_facts: int = 8,
+        max_fact_chars: int = 300,
+        max_tokens: int = 400,
+        timeout: Optional[int] = None,
+        stats: Optional[dict] = None,
+        temperature: Optional[float] = None,
+    ) -> List[dict]:
+        """structured_generation for asyncio callers."""
+        if timeout is None:
+            timeout = self.timeout
+        prompt, schema = _structured_request(original_prompt, web_data, source_urls, max_facts, max_fact_chars)
+        result = await self._arun(prompt, timeout, stats=stats, json_schema=schema, max_tokens=max_tokens,
+                                  temperature=temperature)
+        return parse_facts(result["text"])
+
+
+def _spawn_lock() -> asyncio.Lock:
+    loop = asyncio.get_running_loop()
+    lock = _spawn_locks.get(loop)
+    if lock is None:
+        lock = _spawn_locks[loop] = asyncio.Lock()
+    return lock
+
+
+def _kill(proc):
+    try:
+        proc.kill()
+    except ProcessLookupError:
+        pass  # already exited
+
+
+def _merge_chunk(merged: str, current_prompt: str, result: dict, tokens_left: int, stats: Optional[dict]):
+    """Append one iterative_generate chunk; returns (merged, next_prompt, done)."""
+    chunk = result["text"]
+
+    # Model returned nothing → stop
+    if not chunk.strip():
+        return merged, current_prompt, True
+
+    merged += chunk
+    current_prompt += chunk
+
+    # Model is done → don't pay for further chunks
+    if result["finished"]:
+        if stats is not None:
+            saved = max(0, tokens_left - result["tokens"])
+            stats["tokens_saved"] = stats.get("tokens_saved", 0) + saved
+        return merged, current_prompt, True
+    return merged, current_prompt, False
+
+
+def _enhanced_prompt(original_prompt: str, web_data: str) -> str:
+    # -- Clean, self-contained prompt --------------------------------
+    return (
+        f"{original_prompt}\n\n"
+        f"=== Source Text Start ===\n{web_data}\n=== Source Text End ===\n\n"
+        "Write a concise, structured summary **using ONLY facts that appear "
+        "verbatim in the Source Text**. "
+        "Do NOT invent, guess, or paraphrase unseen information. "
+        "If the Source Text lacks enough information, output exactly: "
+        f"\"{NOT_ENOUGH_INFO}\""
+    )
+
+
+def _strip_source_text(merged: str) -> str:
+    # -- Final clean-up: strip any echoed prompt / markers -----------
+    return re.sub(
+        r"=== Source Text Start ===.*?=== Source Text End ===",
+        "",
+        merged,
+        flags=re.S,
+    ).strip()
+
+
+def _structured_request(original_prompt: str, web_data: str, source_urls: Optional[List[str]],
+                        max_facts: int, max_fact_chars: int):
+    """Prompt and JSON schema for structured_generation."""
+    if source_urls is None:
+        source_urls = re.findall(r"--- Content from (\S+) ---", web_data)
+
+    url_schema = {"type": "string"}
+    if source_urls:
+        url_schema["enum"] = list(dict.fromkeys(source_urls))
+    schema = {
+        "type": "object",
+        "properties": {
+            "facts": {
+                "type": "array",
+                "maxItems": max_facts,
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "fact": {"type": "string", "maxLength": max_fact_chars},
+                        "source_url": url_schema,
+                    },
+                    "required": ["fact", "source_url"],
+                },
+            }
+        },
+        "required": ["facts"],
+    }
+
+    prompt = (
+        f"{original_prompt}\n\n"
+        f"=== Source Text Start ===\n{web_data}\n=== Source Text End ===\n\n"
+        "Return JSON with a \"facts\" list. Each item is one fact that appears "
+        "verbatim in the Source Text and the URL of the source it came from. "
+        "If the Source Text lacks enough information, return an empty list."
+    )
+    return prompt, schema
+
+
+def parse_facts(output: str) -> List[dict]:
+    """Parse structured output; if the token budget cut it short, keep the complete facts."""
+    try:
+        data = json.loads(output)
+        facts = data.get("facts", []) if isinstance(data, dict) else []
+    except ValueError:
+        facts = [
+            json.loads(m.group(0))
+            for m in re.finditer(r'\{\s*"fact"\s*:\s*"(?:[^"\\]|\\.)*"\s*,\s*"source_url"\s*:\s*"(?:[^"\\]|\\.)*"\s*\}', output)
+        ]
+    return [
+        {"fact": f["fact"].strip(), "source_url": f.get("source_url", "")}
+        for f in facts
+        if isinstance(f, dict) and str(f.get("fact", "")).strip()
+    ]
 
-        # -- Final clean-up: strip any echoed prompt / markers -----------
-        merged = re.sub(
-            r"=== Source Text Start ===.*?=== Source Text End ===",
-            "",
-            merged,
-            flags=re.S,
-        ).strip()
 
-        return merged
+def render_facts(facts: List[dict]) -> str:
+    """Render structured facts as the markdown the frontend already displays."""
+    if not facts:
+        return NOT_ENOUGH_INFO
+    return "\n".join(
+        f"- {f['fact']} ([source]({f['source_url']}))" if f.get("source_url") else f"- {f['fact']}"
+        for f in facts
+    )
@@ -0,0 +1,227 @@
+"""
+Model lifecycle: warm-up, readiness and zero-downtime hot swap.
+
+Every GGUFModel call starts a llama.cpp process, so the first real request
+after startup pays for reading the GGUF file from disk. ModelManager runs a
+short warm-up generation before reporting ready. It also swaps in a new model
+file or quantization while serving: the new model is warmed up next to the
+old one, new requests go to it, and the old one is retired once the requests
+still using it have finished. With several API worker processes, a
+SharedModelTarget file tells every worker which model to serve.
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+WARMUP_PROMPT = "Reply with the single word: ready"
+
+NOT_LOADED, LOADING, READY, FAILED = "not_loaded", "loading", "ready", "failed"
+
+
+def warm_up(model, prompt: str = WARMUP_PROMPT, timeout: int = 300) -> float:
+    """Run one short generation so the model file is loaded; returns seconds taken."""
+    started = time.perf_counter()
+    # Stop at the first line break: only the load and a few tokens are paid for
+    model.generate_text(prompt, timeout=timeout, stop=["\n"])
+    return round(time.perf_counter() - started, 2)
+
+
+class _Slot:
+    def __init__(self, model, name: str):
+        self.model = model
+        self.name = name
+        self.in_flight = 0
+        self.loaded_at = time.time()
+        self.warmup_s = 0.0
+        self.retired_at: Optional[float] = None
+
+    def info(self) -> Dict:
+        info = {"name": self.name, "in_flight": self.in_flight, "warmup_s": self.warmup_s,
+                "loaded_at": round(self.loaded_at, 1)}
+        if self.retired_at is not None:
+            info["retired_at"] = round(self.retired_at, 1)
+        return info
+
+
+class ModelLease:
+    """The model a request started with; it keeps using it even if a swap happens."""
+
+    def __init__(self, manager: "ModelManager", slot: _Slot):
+        self._manager = manager
+        self._slot = slot
+        self.model = slot.model
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._manager._release(self._slot)
+
+    def __enter__(self):
+        return self.model
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class ModelManager:
+    def __init__(self, warmup_prompt: str = WARMUP_PROMPT):
+        self.warmup_prompt = warmup_prompt
+        self.state = NOT_LOADED
+        self.error: Optional[str] = None
+        self._current: Optional[_Slot] = None
+        self._draining: List[_Slot] = []
+        self._cond = threading.Condition()
+        self._swap_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY and self._current is not None
+
+    @property
+    def current(self):
+        return self._current.model if self._current else None
+
+    def _prepare(self, model, name: str, warm: bool) -> _Slot:
+        slot = _Slot(model, name)
+        if warm:
+            slot.warmup_s = warm_up(model, self.warmup_prompt)
+        return slot
+
+    def load(self, model, name: str = "", warm: bool = True) -> Dict:
+        """Warm up `model` and make it the serving model (startup path)."""
+        with self._swap_lock:
+            self.state, self.error = LOADING, None
+            try:
+                slot = self._prepare(model, name, warm)
+            except Exception as e:
+                self.state, self.error = FAILED, str(e)
+                raise
+            with self._cond:
+                self._current = slot
+                self.state = READY
+            return slot.info()
+
+    def swap(self, model, name: str = "", warm: bool = True) -> Dict:
+        """
+        Warm up `model` while the current one keeps serving, then route new
+        requests to it. The previous model drains in the background: requests
+        already using it finish on it. If warm-up fails, nothing changes.
+        """
+        with self._swap_lock:
+            slot = self._prepare(model, name, warm)
+            with self._cond:
+                previous = self._current
+                self._current = slot
+                self.state, self.error = READY, None
+                if previous is not None:
+                    previous.retired_at = time.time()
+                    if previous.in_flight:
+                        self._draining.append(previous)
+            return {"current": slot.info(), "previous": previous.info() if previous else None}
+
+    def acquire(self) -> ModelLease:
+        """Lease the serving model for one request; raises RuntimeError if not ready."""
+        with self._cond:
+            if not self.ready:
+                raise RuntimeError(f"Model is not ready (state: {self.state})")
+            self._current.in_flight += 1
+            return ModelLease(self, self._current)
+
+    def _release(self, slot: _Slot):
+        with self._cond:
+            slot.in_flight -= 1
+            if slot.in_flight == 0 and slot in self._draining:
+                self._draining.remove(slot)
+            self._cond.notify_all()
+
+    def wait_drained(self, timeout: Optional[float] = None) -> bool:
+        """Block until no retired model has requests in flight."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._draining, timeout)
+
+    def status(self) -> Dict:
+        with self._cond:
+            return {
+                "state": self.state,
+                "ready": self.ready,
+                "error": self.error,
+                "current": self._current.info() if self._current else None,
+                "draining": [slot.info() for slot in self._draining],
+            }
+
+
+class SharedModelTarget:
+    """
+    The model every API worker process should serve, kept in a small JSON
+    file so that a hot swap posted to one uvicorn worker reaches all of them.
+    Each worker polls the target, swaps when its version changes, and writes
+    its own state next to it (one file per process) for the admin endpoint.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.status_dir = path + ".workers"
+
+    def read(self) -> Optional[Dict]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write(self, model_path: str, draft_model_path: Optional[str] = None) -> Dict:
+        target = {"version": uuid.uuid4().hex, "model_path": model_path,
+                  "draft_model_path": draft_model_path, "requested_at": round(time.time(), 1)}
+        self._store(target)
+        return target
+
+    def _store(self, target: Dict):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(target, f)
+        os.replace(tmp, self.path)  # readers never see a half-written target
+
+    def restore(self, target: Optional[Dict]):
+        """
+        Put back an earlier target after a failed swap (None: no target). Its
+        version is kept, so only workers that already moved on swap back.
+        """
+        if target is None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            return
+        self._store(target)
+
+    def report(self, status: Dict):
+        os.makedirs(self.status_dir, exist_ok=True)
+        path = os.path.join(self.status_dir, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({**status, "pid": os.getpid(), "updated": round(time.time(), 1)}, f)
+        os.replace(path + ".tmp", path)
+
+    def workers(self, max_age: float) -> List[Dict]:
+        """States reported by worker processes within the last `max_age` seconds."""
+        states = []
+        for path in glob.glob(os.path.join(self.status_dir, "*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if time.time() - state.get("updated", 0) <= max_age:
+                states.append(state)
+            else:
+                # A worker that stopped reporting has exited
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return sorted(states, key=lambda state: state["pid"])
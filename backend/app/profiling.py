@@ -0,0 +1,202 @@
+"""
+On-demand CPU and memory profiling for single research requests.
+
+Nothing runs unless a request asks for it, so there is no overhead when
+profiling is off. A profiled request gets:
+
+- a sampled stack profile: a background thread reads the request thread's
+  stack every few milliseconds (sys._current_frames), aggregated as
+  collapsed stacks ("frame;frame;frame count"), the input format of
+  flamegraph.pl, speedscope and inferno. Sampling is wall-clock, so time
+  spent waiting on llama.cpp or the network shows up as well.
+- a tracemalloc snapshot taken when the request ends: the top allocation
+  sites still holding memory, plus the peak traced during the request.
+
+tracemalloc is process-wide, so only one request is profiled at a time.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+DEFAULT_INTERVAL = 0.005  # seconds between stack samples
+TOP_ALLOCATIONS = 25
+TOP_FUNCTIONS = 15
+TRACEMALLOC_FRAMES = 1
+
+# Leaf frames of threads that are parked, skipped when sampling every thread
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+_profiling = threading.Lock()
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> List[str]:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_LEAVES
+
+
+class RequestProfiler:
+    """
+    Profile one request. `thread_id` limits sampling to that thread (the
+    request thread in the Flask app); None samples every busy thread, for
+    async servers where a request hops between the event loop and workers.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = DEFAULT_INTERVAL, label: str = ""):
+        self.id = uuid.uuid4().hex[:12]
+        self.thread_id = thread_id
+        self.interval = interval
+        self.label = label
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._started_tracing = False
+        self._started = 0.0
+        self.result: Optional[Dict] = None
+
+    def start(self) -> bool:
+        """Start profiling; False if another request is being profiled."""
+        if not _profiling.acquire(blocking=False):
+            return False
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracing = True
+        if hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+            tracemalloc.reset_peak()
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._sampler.start()
+        return True
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == own or (self.thread_id is not None and tid != self.thread_id):
+                    continue
+                if self.thread_id is None:
+                    if _is_idle(frame):
+                        continue
+                    if tid not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    stack = [names.get(tid, str(tid))] + _collapse(frame)
+                else:
+                    stack = _collapse(frame)
+                self.stacks[";".join(stack)] += 1
+            self.samples += 1
+
+    def stop(self) -> Dict:
+        if self.result is not None:
+            return self.result
+        self._stop.set()
+        self._sampler.join()
+        duration = time.perf_counter() - self._started
+        try:
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ])
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            if self._started_tracing:
+                tracemalloc.stop()
+            _profiling.release()
+
+        self_time = Counter()
+        for stack, count in self.stacks.items():
+            self_time[stack.rsplit(";", 1)[-1]] += count
+        self.result = {
+            "id": self.id,
+            "label": self.label,
+            "started": round(time.time() - duration, 3),
+            "duration_s": round(duration, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "top_functions": [
+                {"function": name, "samples": count, "share": round(count / max(1, self.samples), 3)}
+                for name, count in self_time.most_common(TOP_FUNCTIONS)
+            ],
+            "collapsed": "\n".join(f"{stack} {count}" for stack, count in sorted(self.stacks.items())),
+            "memory": {
+                "peak_kb": round(peak / 1024, 1),
+                "top_allocations": [
+                    {"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                     "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+                    for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+                ],
+            },
+        }
+        return self.result
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._sampler is not None:
+            self.stop()
+
+
+class ProfileStore:
+    """Recent profiles for the admin endpoint, and how many upcoming requests to profile."""
+
+    def __init__(self, keep: int = 20):
+        self._profiles: deque = deque(maxlen=keep)
+        self._armed = 0
+        self._lock = threading.Lock()
+
+    def arm(self, requests: int = 1) -> int:
+        with self._lock:
+            self._armed = max(0, requests)
+            return self._armed
+
+    def take_armed(self) -> bool:
+        """True (and one fewer armed) if the next request should be profiled."""
+        with self._lock:
+            if self._armed <= 0:
+                return False
+            self._armed -= 1
+            return True
+
+    def add(self, profile: Dict):
+        with self._lock:
+            self._profiles.append(profile)
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        with self._lock:
+            return next((p for p in self._profiles if p["id"] == profile_id), None)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                "armed": self._armed,
+                "profiles": [
+                    {**{k: p[k] for k in ("id", "label", "started", "duration_s", "samples")},
+                     "peak_kb": p["memory"]["peak_kb"]}
+                    for p in reversed(self._profiles)
+                ],
+            }
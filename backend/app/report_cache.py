@@ -0,0 +1,202 @@
+"""
+Full research report cache.
+
+Many users ask the same thing in slightly different words or casing. Reports
+are cached under a normalized query (lowercased, stopwords dropped, tokens
+sorted) plus everything else that shapes the report (date range,
+max_sources, output mode), so "AI trends 2024" and "trends in AI 2024" share
+one entry. Near misses can also be served: a character-trigram index finds
+cached queries whose Jaccard similarity clears a threshold, and a fuzzy hit
+still needs the same terms up to spelling variants ("trend"/"trends"), with
+numbers and years matching exactly. Entries expire after a freshness TTL and
+are pruned as new reports are stored. Stored in SQLite (WAL) so all API
+workers share it.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from doc_index import tokenize
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "REPORT_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "report_cache.db"),
+)
+DEFAULT_TTL = float(os.environ.get("REPORT_CACHE_TTL", 6 * 3600))
+DEFAULT_FUZZY_THRESHOLD = 0.8
+PRUNE_INTERVAL = 600  # seconds between deletes of expired reports
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    key TEXT PRIMARY KEY,
+    scope TEXT NOT NULL,
+    normalized TEXT NOT NULL,
+    query TEXT NOT NULL,
+    created REAL NOT NULL,
+    report TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_scope ON reports(scope, created);
+CREATE TABLE IF NOT EXISTS report_ngrams (
+    gram TEXT NOT NULL,
+    key TEXT NOT NULL REFERENCES reports(key) ON DELETE CASCADE,
+    PRIMARY KEY (gram, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS report_ngrams_key ON report_ngrams(key);
+"""
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace, stopword and word-order insensitive form of a query."""
+    tokens = sorted(set(tokenize(query)))
+    if tokens:
+        return " ".join(tokens)
+    # Nothing but stopwords: fall back to collapsing case and whitespace
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+
+def ngrams(text: str, n: int = 3) -> List[str]:
+    padded = f"  {text} "
+    return sorted({padded[i:i + n] for i in range(len(padded) - n + 1)})
+
+
+def _variant(a: str, b: str) -> bool:
+    """Spelling variants of one word: a shared prefix and at most two other characters."""
+    common = len(os.path.commonprefix([a, b]))
+    return common >= 3 and max(len(a), len(b)) - common <= 2
+
+
+def same_terms(a: str, b: str) -> bool:
+    """
+    True if two normalized queries ask about the same terms: tokens that
+    differ must pair up as spelling variants, and tokens with digits
+    (years, versions, amounts) must match exactly.
+    """
+    ta, tb = set(a.split()), set(b.split())
+    only_a, only_b = ta - tb, tb - ta
+    if len(only_a) != len(only_b):
+        return False
+    if any(any(c.isdigit() for c in t) for t in only_a | only_b):
+        return False
+    return all(any(_variant(x, y) for y in only_b) for x in only_a)
+
+
+def similarity(a: str, b: str) -> float:
+    """Jaccard similarity of two normalized queries' trigram sets."""
+    ga, gb = set(ngrams(a)), set(ngrams(b))
+    return len(ga & gb) / len(ga | gb) if ga and gb else 0.0
+
+
+def _scope(date_filter: Optional[dict], max_sources: int, options: dict) -> str:
+    return json.dumps({"date": date_filter or {}, "max_sources": max_sources, **options}, sort_keys=True)
+
+
+class ReportCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: float = DEFAULT_TTL,
+                 fuzzy_threshold: Optional[float] = DEFAULT_FUZZY_THRESHOLD):
+        """`fuzzy_threshold=None` disables fuzzy matching."""
+        self.path = path
+        self.ttl = ttl
+        self.fuzzy_threshold = fuzzy_threshold
+        self._local = threading.local()
+        self._last_prune = 0.0
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, query: str, date_filter: Optional[dict] = None, max_sources: int = 5,
+               max_age: Optional[float] = None, **options) -> Optional[Dict]:
+        """
+        Return {"report", "match", "similarity", "cached_query", "age_s"} for a
+        fresh cached report, or None. `options` are extra parameters that
+        change the report (e.g. structured=True) and must match exactly.
+        """
+        normalized = normalize_query(query)
+        scope = _scope(date_filter, max_sources, options)
+        min_created = time.time() - (self.ttl if max_age is None else max_age)
+        conn = self._conn()
+
+        row = conn.execute(
+            "SELECT query, normalized, created, report FROM reports WHERE key = ? AND created >= ?",
+            (self._key(scope, normalized), min_created),
+        ).fetchone()
+        match, score = "exact", 1.0
+
+        if row is None and self.fuzzy_threshold is not None:
+            grams = ngrams(normalized)
+            # Candidates sharing the most trigrams, then exact Jaccard on those
+            candidates = conn.execute(
+                f"""
+                SELECT r.query, r.normalized, r.created, r.report, COUNT(*) AS shared
+                FROM report_ngrams g JOIN reports r ON r.key = g.key
+                WHERE g.gram IN ({",".join("?" * len(grams))}) AND r.scope = ? AND r.created >= ?
+                GROUP BY r.key ORDER BY shared DESC LIMIT 20
+                """,
+                (*grams, scope, min_created),
+            ).fetchall()
+            scored = [(similarity(normalized, c["normalized"]), c) for c in candidates
+                      if same_terms(normalized, c["normalized"])]
+            scored = [(s, c) for s, c in scored if s >= self.fuzzy_threshold]
+            if scored:
+                score, row = max(scored, key=lambda sc: sc[0])
+                match = "fuzzy"
+
+        if row is None:
+            return None
+        return {
+            "report": json.loads(row["report"]),
+            "match": match,
+            "similarity": round(score, 3),
+            "cached_query": row["query"],
+            "age_s": round(time.time() - row["created"], 1),
+        }
+
+    def store(self, query: str, report: dict, date_filter: Optional[dict] = None,
+              max_sources: int = 5, **options):
+        if time.time() - self._last_prune > PRUNE_INTERVAL:
+            self._last_prune = time.time()
+            self.prune()
+        normalized = normalize_query(query)
+        scope = _scope(date_filter, max_sources, options)
+        key = self._key(scope, normalized)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO reports (key, scope, normalized, query, created, report) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, scope, normalized, query, time.time(), json.dumps(report)),
+            )
+            conn.execute("DELETE FROM report_ngrams WHERE key = ?", (key,))
+            conn.executemany(
+                "INSERT INTO report_ngrams (gram, key) VALUES (?, ?)",
+                [(gram, key) for gram in ngrams(normalized)],
+            )
+
+    def prune(self):
+        """Delete reports older than the TTL."""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM reports WHERE created < ?", (time.time() - self.ttl,))
+
+    @staticmethod
+    def _key(scope: str, normalized: str) -> str:
+        return hashlib.sha1(f"{scope}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM reports").fetchone()[0]
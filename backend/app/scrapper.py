@@ -1,71 +1,136 @@
 import requests
 from bs4 import BeautifulSoup
+import json
 import time
+import urllib.parse
+
+from date_range import in_date_range, parse_date
+from tracing import span
 
 SCRAPERAPI_KEY = "YOUR_API_KEY"  # Your ScraperAPI key
 MAX_CHARS_PER_SOURCE = 2000  # Limit text to avoid LLM max token issues
+RAW_MAX_AGE = 24 * 3600  # Reuse stored raw HTML fetched within this window
+
+# <meta> tags that commonly carry an article's publication date
+DATE_META_KEYS = (
+    "article:published_time", "og:published_time", "datepublished",
+    "pubdate", "publishdate", "date", "dc.date", "dc.date.issued", "sailthru.date",
+)
+
+def extract_published_date(soup: BeautifulSoup):
+    """
+    Best-effort publication date of a page (meta tags, JSON-LD, <time>).
+    Returns an aware datetime or None.
+    """
+    for meta in soup.find_all("meta"):
+        key = (meta.get("property") or meta.get("name") or meta.get("itemprop") or "").lower()
+        if key in DATE_META_KEYS:
+            published = parse_date(meta.get("content"))
+            if published:
+                return published
+
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads(script.string or "")
+        except ValueError:
+            continue
+        for item in data if isinstance(data, list) else [data]:
+            if isinstance(item, dict):
+                published = parse_date(item.get("datePublished") or item.get("dateCreated"))
+                if published:
+                    return published
+
+    time_tag = soup.find("time", attrs={"datetime": True})
+    if time_tag:
+        return parse_date(time_tag["datetime"])
+    return None
 
-def scrape_url(url: str, retries: int = 3, backoff: int = 5) -> str:
+def scrape_url(url: str, retries: int = 3, backoff: int = 5, store=None) -> str:
     """
     Scrapes a single URL using ScraperAPI and returns cleaned text.
     Removes headers, footers, navs, buttons, scripts.
+    If a SegmentStore is given, raw HTML is written to it and a recent stored
+    copy is parsed instead of fetching again.
+    """
+    return scrape_page(url, retries=retries, backoff=backoff, store=store)["text"]
+
+def scrape_page(url: str, retries: int = 3, backoff: int = 5, store=None) -> dict:
+    """
+    Like scrape_url, but also returns the page's publication date:
+    {"text": str, "published": datetime | None}
     """
-    api_url = f"https://api.scraperapi.com?api_key={SCRAPERAPI_KEY}&url={url}&render=true"
+    api_url = (
+        f"https://api.scraperapi.com?api_key={SCRAPERAPI_KEY}"
+        f"&url={urllib.parse.quote(url, safe='')}&render=true"
+    )
+
+    html = store.get(url, max_age=RAW_MAX_AGE) if store is not None else None
 
     for attempt in range(1, retries + 1):
         try:
-            response = requests.get(api_url, timeout=60)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            # Remove unwanted elements
-            for tag in soup(['script', 'style', 'header', 'footer', 'nav', 'aside', 'button', 'form']):
-                tag.decompose()
-
-            text = ""
-
-            # --- Site-specific parsing ---
-            if "wikipedia.org" in url:
-                content_div = soup.find("div", id="mw-content-text")
-                if content_div:
-                    paragraphs = content_div.find_all("p")
-                    text = "\n".join(p.get_text(strip=True) for p in paragraphs[:10])
-
-            elif "news.google.com" in url:
-                headlines = soup.find_all("h3")
-                text = "\n".join(h.get_text(strip=True) for h in headlines[:10])
-
-            elif "reddit.com" in url:
-                posts = soup.find_all("h3")
-                if not posts:
-                    posts = soup.find_all("p")
-                text = "\n".join(p.get_text(strip=True) for p in posts[:15])
-
-            elif "bbc.com" in url or "cnn.com" in url:
-                paragraphs = soup.find_all("p")
-                text = "\n".join(p.get_text(strip=True) for p in paragraphs[:15])
-
-            elif "twitter.com" in url or "x.com" in url:
-                tweets = soup.find_all("div", {"data-testid": "tweetText"})
-                if tweets:
-                    text = "\n".join(t.get_text(strip=True) for t in tweets[:10])
-                else:
-                    text = soup.get_text("\n", strip=True)
-
-            # Generic fallback
-            if not text:
-                body = soup.body
-                if body:
-                    text = body.get_text("\n", strip=True)
-
-            # Return limited length
-            return text.strip()[:MAX_CHARS_PER_SOURCE]
+            if html is None:
+                with span("fetch", url=url, attempt=attempt) as fetch:
+                    response = requests.get(api_url, timeout=60)
+                    fetch.set(status=response.status_code, bytes=len(response.text))
+                    response.raise_for_status()
+                html = response.text
+                if store is not None:
+                    store.put(url, html, meta={"fetched_via": "scraperapi", "status": response.status_code})
+            # Ended on every path, so a parsing error doesn't leave the span unexported
+            with span("parse", url=url, html_chars=len(html)) as parse:
+                soup = BeautifulSoup(html, "html.parser")
+                # Read dates before <script> (JSON-LD) tags are stripped
+                published = extract_published_date(soup)
+
+                # Remove unwanted elements
+                for tag in soup(['script', 'style', 'header', 'footer', 'nav', 'aside', 'button', 'form']):
+                    tag.decompose()
+
+                text = ""
+
+                # --- Site-specific parsing ---
+                if "wikipedia.org" in url:
+                    content_div = soup.find("div", id="mw-content-text")
+                    if content_div:
+                        paragraphs = content_div.find_all("p")
+                        text = "\n".join(p.get_text(strip=True) for p in paragraphs[:10])
+
+                elif "news.google.com" in url:
+                    headlines = soup.find_all("h3")
+                    text = "\n".join(h.get_text(strip=True) for h in headlines[:10])
+
+                elif "reddit.com" in url:
+                    posts = soup.find_all("h3")
+                    if not posts:
+                        posts = soup.find_all("p")
+                    text = "\n".join(p.get_text(strip=True) for p in posts[:15])
+
+                elif "bbc.com" in url or "cnn.com" in url:
+                    paragraphs = soup.find_all("p")
+                    text = "\n".join(p.get_text(strip=True) for p in paragraphs[:15])
+
+                elif "twitter.com" in url or "x.com" in url:
+                    tweets = soup.find_all("div", {"data-testid": "tweetText"})
+                    if tweets:
+                        text = "\n".join(t.get_text(strip=True) for t in tweets[:10])
+                    else:
+                        text = soup.get_text("\n", strip=True)
+
+                # Generic fallback
+                if not text:
+                    body = soup.body
+                    if body:
+                        text = body.get_text("\n", strip=True)
+
+                # Return limited length
+                parse.set(text_chars=len(text))
+                return {"text": text.strip()[:MAX_CHARS_PER_SOURCE], "published": published}
 
         except requests.RequestException:
             if attempt < retries:
                 time.sleep(backoff)
             else:
-                return ""
+                return {"text": "", "published": None}
 
 def scrape_multiple_urls(urls: list, max_urls: int = 5) -> str:
     """
@@ -80,3 +145,30 @@ def scrape_multiple_urls(urls: list, max_urls: int = 5) -> str:
             scraped_texts.append(f"--- Content from {url} ---\n{text}")
     return "\n\n---\n\n".join(scraped_texts)
 
+def scrape_source(url: str, date_filter: dict = None, index=None, store=None) -> tuple:
+    """
+    Scrape one URL for the research pipeline, formatted like scrape_multiple_urls.
+    If a DocumentIndex is given, a fresh stored copy is used instead of fetching,
+    and newly fetched pages are added to it.
+    Pages with a publication date outside `date_filter` are dropped before any
+    LLM work. Returns (text, dropped_by_date).
+    """
+    with span("scrape", url=url) as trace:
+        cached = index.get(url) if index is not None else None
+        trace.set(indexed=bool(cached))
+        if cached:
+            page = {"text": cached["text"], "published": parse_date(cached["published"])}
+        else:
+            page = scrape_page(url, store=store)
+            if index is not None and page["text"]:
+                published = page["published"].timestamp() if page["published"] else None
+                index.add(url, page["text"], published=published)
+
+        trace.set(chars=len(page["text"]))
+        if not page["text"]:
+            return "", False
+        if not in_date_range(page["published"], date_filter):
+            trace.set(dropped_by_date=True)
+            print(f"Dropping {url}: published {page['published'].date()} is outside the date range")
+            return "", True
+        return f"--- Content from {url} ---\n{page['text']}", False
@@ -0,0 +1,515 @@
+"""
+Compressed append-only segment store for raw scraped data.
+
+Layout of a store directory:
+
+    segment-000001.seg   append-only data files; every document is its own
+    segment-000002.seg   compressed frame, so any one can be read back
+    ...                  without decompressing the rest of the segment
+    index-000001.bin     append-only fixed-size records (key hash, segment,
+                         offset, length, timestamps, codec), memory-mapped
+    LOCK                 cross-process lock for the index
+
+The latest record for a key wins; deletes are tombstone records. Expired,
+deleted and overwritten documents are dropped by compaction, which copies
+live frames (still compressed) into fresh segments and writes the next
+index generation; the old index gets a "moved" record so other processes
+switch over.
+
+Several processes (API workers, worker.py) can share one store directory.
+Each process appends only to segments it created, and every operation
+holds the LOCK file (flock, or msvcrt on Windows) and first reads the
+index records other processes appended since. Frames are read with seek() +
+read() under the lock, so it runs on Windows as well (no os.pread there):
+
+    python segment_store.py --self-test
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Optional
+
+try:
+    import zstandard
+except ImportError:  # optional: fall back to zlib
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: lock the LOCK file with msvcrt instead
+    fcntl = None
+    import msvcrt
+
+DEFAULT_STORE_DIR = os.environ.get(
+    "RAW_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "raw_store"),
+)
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL = 7 * 24 * 3600
+
+CODEC_NONE, CODEC_ZSTD, CODEC_ZLIB = 0, 1, 2
+
+# key hash, segment id, frame offset, frame length, created, expires (0 = never), codec, kind
+RECORD = struct.Struct("<16sIQIddBB2x")
+LIVE, TOMBSTONE, MOVED = 0, 1, 2  # MOVED: compaction wrote a newer index generation
+LEGACY_INDEX_FILE = "index.bin"
+INDEX_RE = re.compile(r"index-(\d{6})\.bin$")
+SEGMENT_RE = re.compile(r"segment-(\d{6})\.seg$")
+
+
+def _key_hash(key: str) -> bytes:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+class SegmentStore:
+    def __init__(self, root: str = DEFAULT_STORE_DIR, default_ttl: Optional[float] = DEFAULT_TTL,
+                 segment_max_bytes: int = SEGMENT_MAX_BYTES, level: int = 3):
+        self.root = root
+        self.default_ttl = default_ttl
+        self.segment_max_bytes = segment_max_bytes
+        self._lock = threading.RLock()
+        self._compactor = None
+        self._stop = threading.Event()
+
+        if zstandard is not None:
+            self.codec = CODEC_ZSTD
+            self._zc = zstandard.ZstdCompressor(level=level)
+        else:
+            self.codec = CODEC_ZLIB
+
+        os.makedirs(root, exist_ok=True)
+        self._lock_file = open(os.path.join(root, "LOCK"), "a+b")
+        self._writer = None  # this process's segment, created on the first put
+        self._readers: Dict[int, BinaryIO] = {}
+        self._index_file = None
+        self._mmap = None
+        with self._locked(sync=False):
+            self._open_index()
+
+    # ------------------------------------------------------------------ #
+    #  LOCKING                                                           #
+    # ------------------------------------------------------------------ #
+    @contextmanager
+    def _locked(self, sync: bool = True):
+        """Hold the thread lock and the LOCK file, caught up with other processes' records."""
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                self._lock_file.seek(0)
+                msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                if sync:
+                    self._sync()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    self._lock_file.seek(0)
+                    msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    # ------------------------------------------------------------------ #
+    #  OPEN / INDEX                                                      #
+    # ------------------------------------------------------------------ #
+    def _generations(self):
+        return sorted(int(m.group(1)) for m in (INDEX_RE.match(n) for n in os.listdir(self.root)) if m)
+
+    def _segments(self):
+        return sorted(int(m.group(1)) for m in (SEGMENT_RE.match(n) for n in os.listdir(self.root)) if m)
+
+    def _index_path(self, generation: int) -> str:
+        return os.path.join(self.root, f"index-{generation:06d}.bin")
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.root, f"segment-{segment_id:06d}.seg")
+
+    def _open_index(self):
+        """Open the newest index generation and load its slots. Called with the LOCK file held."""
+        generations = self._generations()
+        if not generations:
+            legacy = os.path.join(self.root, LEGACY_INDEX_FILE)
+            if os.path.exists(legacy):
+                os.replace(legacy, self._index_path(1))
+            generations = [1]
+        self._generation = generations[-1]
+        self._index_file = open(self._index_path(self._generation), "a+b")
+        # Drop a torn trailing record left by an interrupted write
+        size = os.fstat(self._index_file.fileno()).st_size
+        if size % RECORD.size:
+            self._index_file.truncate(size - size % RECORD.size)
+        self._slots: Dict[bytes, int] = {}
+        self._count = self._mapped = 0
+        self._load_slots()
+
+    def _close_index(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+        for reader in self._readers.values():
+            reader.close()
+        self._readers = {}
+
+    def _load_slots(self) -> bool:
+        """Read records appended since the last call; False if the index was moved."""
+        end = os.fstat(self._index_file.fileno()).st_size // RECORD.size
+        for slot in range(self._count, end):
+            record = self._record(slot)
+            if record[7] == MOVED:
+                return False
+            self._slots[record[0]] = slot
+        self._count = end
+        return True
+
+    def _sync(self):
+        """Catch up with records other processes appended; follow a compaction to the new index."""
+        if self._load_slots():
+            return
+        self._close_index()
+        self._open_index()
+        # Our segment was copied and dropped by that compaction
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _remap(self):
+        self._mapped = os.fstat(self._index_file.fileno()).st_size // RECORD.size
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._mapped:
+            self._mmap = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _record(self, slot: int):
+        if slot >= self._mapped:
+            self._remap()
+        return RECORD.unpack_from(self._mmap, slot * RECORD.size)
+
+    def _read_frame(self, segment_id: int, offset: int, length: int) -> bytes:
+        """Read one frame; callers hold the lock, which also guards the reader's position."""
+        reader = self._readers.get(segment_id)
+        if reader is None:
+            reader = open(self._segment_path(segment_id), "rb")
+            self._readers[segment_id] = reader
+        reader.seek(offset)
+        return reader.read(length)
+
+    def _append_record(self, key_hash: bytes, segment_id: int, offset: int, length: int,
+                       created: float, expires: float, codec: int, kind: int):
+        self._index_file.seek(0, os.SEEK_END)
+        self._index_file.write(RECORD.pack(key_hash, segment_id, offset, length,
+                                           created, expires, codec, kind))
+        self._index_file.flush()
+        self._slots[key_hash] = self._count
+        self._count += 1
+
+    # ------------------------------------------------------------------ #
+    #  COMPRESSION                                                       #
+    # ------------------------------------------------------------------ #
+    def _compress(self, raw: bytes) -> bytes:
+        if self.codec == CODEC_ZSTD:
+            return self._zc.compress(raw)
+        return zlib.compress(raw, 6)
+
+    def _decompress(self, frame: bytes, codec: int) -> bytes:
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read this store")
+            return zstandard.ZstdDecompressor().decompress(frame)
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(frame)
+        return frame
+
+    # ------------------------------------------------------------------ #
+    #  PUBLIC API                                                        #
+    # ------------------------------------------------------------------ #
+    def put(self, key: str, data, meta: Optional[dict] = None, ttl: Optional[float] = None):
+        """Append a document. `data` may be str or bytes; `meta` is stored alongside it."""
+        body = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+        header = json.dumps({"key": key, "meta": meta or {}, "text": isinstance(data, str)}).encode("utf-8")
+        frame = self._compress(struct.pack("<I", len(header)) + header + body)
+
+        created = time.time()
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = created + ttl if ttl else 0.0
+
+        with self._locked():
+            if self._writer is None or (self._writer.tell() + len(frame) > self.segment_max_bytes
+                                        and self._writer.tell() > 0):
+                self._new_segment()
+            offset = self._writer.tell()
+            self._writer.write(frame)
+            self._writer.flush()
+            self._append_record(_key_hash(key), self._segment_id, offset, len(frame),
+                                created, expires, self.codec, LIVE)
+
+    def delete(self, key: str):
+        with self._locked():
+            if self._live_record(_key_hash(key)) is not None:
+                self._append_record(_key_hash(key), 0, 0, 0, time.time(), 0.0, CODEC_NONE, TOMBSTONE)
+
+    def get_document(self, key: str, max_age: Optional[float] = None) -> Optional[dict]:
+        """
+        Return {"key", "meta", "data", "created"} for `key`, or None if missing,
+        expired or older than `max_age` seconds.
+        """
+        with self._locked():
+            record = self._live_record(_key_hash(key))
+            if record is None:
+                return None
+            _, segment_id, offset, length, created, _, codec, _ = record
+            if max_age is not None and time.time() - created > max_age:
+                return None
+            frame = self._read_frame(segment_id, offset, length)
+
+        raw = self._decompress(frame, codec)
+        (header_len,) = struct.unpack_from("<I", raw)
+        header = json.loads(raw[4:4 + header_len])
+        if header["key"] != key:
+            return None  # another key with the same hash
+        body = raw[4 + header_len:]
+        return {
+            "key": header["key"],
+            "meta": header["meta"],
+            "data": body.decode("utf-8") if header["text"] else body,
+            "created": created,
+        }
+
+    def get(self, key: str, max_age: Optional[float] = None):
+        """Return the stored data for `key` (str or bytes), or None."""
+        doc = self.get_document(key, max_age=max_age)
+        return doc["data"] if doc else None
+
+    def _live_record(self, key_hash: bytes):
+        slot = self._slots.get(key_hash)
+        if slot is None:
+            return None
+        record = self._record(slot)
+        expires, kind = record[5], record[7]
+        if kind != LIVE or (expires and expires < time.time()):
+            return None
+        return record
+
+    def __len__(self):
+        with self._locked():
+            return sum(1 for h in self._slots if self._live_record(h) is not None)
+
+    # ------------------------------------------------------------------ #
+    #  SEGMENTS & COMPACTION                                             #
+    # ------------------------------------------------------------------ #
+    def _new_segment(self):
+        """Start a segment only this process appends to, numbered after every existing one."""
+        if self._writer is not None:
+            self._writer.close()
+        segments = self._segments()
+        self._segment_id = (segments[-1] if segments else 0) + 1
+        self._writer = open(self._segment_path(self._segment_id), "xb")
+
+    def compact(self, unless_compacted_since: Optional[int] = None):
+        """
+        Rewrite live documents into new segments and drop expired, deleted and
+        overwritten ones. Frames are copied as-is, without recompression. With
+        `unless_compacted_since` (an index generation), skip if another process
+        has compacted since.
+        """
+        with self._locked():
+            if unless_compacted_since is not None and self._generation != unless_compacted_since:
+                return
+            live = [(h, self._record(slot)) for h, slot in self._slots.items()]
+            live = [(h, r) for h, r in live if self._live_record(h) is not None]
+            old_segments = self._segments()
+            old_index = self._index_path(self._generation)
+            new_index = self._index_path(self._generation + 1)
+
+            self._new_segment()
+            with open(new_index, "wb") as index_out:
+                for key_hash, (_, segment_id, offset, length, created, expires, codec, _) in live:
+                    frame = self._read_frame(segment_id, offset, length)
+                    if self._writer.tell() + length > self.segment_max_bytes and self._writer.tell() > 0:
+                        self._new_segment()
+                    new_offset = self._writer.tell()
+                    self._writer.write(frame)
+                    index_out.write(RECORD.pack(key_hash, self._segment_id, new_offset, length,
+                                                created, expires, codec, LIVE))
+                self._writer.flush()
+                os.fsync(self._writer.fileno())
+                index_out.flush()
+                os.fsync(index_out.fileno())
+
+            # Point other processes at the new generation, then drop the old files
+            self._append_record(b"\0" * 16, 0, 0, 0, time.time(), 0.0, CODEC_NONE, MOVED)
+            self._close_index()
+            self._open_index()
+            stale = [self._segment_path(s) for s in old_segments]
+            stale += [self._index_path(g) for g in self._generations() if g < self._generation]
+            for path in stale:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # Windows: still open in another process; removed by a later compaction
+
+    def start_compaction(self, interval: float = 3600):
+        """
+        Run compact() every `interval` seconds on a daemon thread. With several
+        processes on one store, an interval in which another process compacted
+        is skipped.
+        """
+        if self._compactor is not None:
+            return
+
+        def loop():
+            generation = self._generation
+            while not self._stop.wait(interval):
+                try:
+                    self.compact(unless_compacted_since=generation)
+                except Exception as e:
+                    print(f"Segment store compaction failed: {e}")
+                generation = self._generation
+
+        self._compactor = threading.Thread(target=loop, name="segment-compactor", daemon=True)
+        self._compactor.start()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            self._close_index()
+            self._lock_file.close()
+
+
+def open_store(root: str = DEFAULT_STORE_DIR, compact_interval: float = 3600) -> SegmentStore:
+    """Open the raw store with background compaction; every process on the host may share it."""
+    store = SegmentStore(root)
+    store.start_compaction(compact_interval)
+    return store
+
+
+# ---------------------------------------------------------------------- #
+#  SELF-TEST                                                             #
+# ---------------------------------------------------------------------- #
+def _document(name: str, n: int) -> str:
+    return f"{name} document {n} " * (n % 50 + 1)
+
+
+def _child(root: str, name: str, documents: int) -> int:
+    """--child: write `documents` documents, compacting now and then, reading another child's as we go."""
+    store = SegmentStore(root, segment_max_bytes=4096)
+    other = "w1" if name == "w0" else "w0"
+    seen = 0
+    for n in range(documents):
+        store.put(f"{name}-{n}", _document(name, n))
+        if n % 25 == 24:
+            store.compact()
+        doc = store.get(f"{other}-{n // 2}")
+        if doc is not None:
+            if doc != _document(other, n // 2):
+                print(f"{name}: {other}-{n // 2} wrong")
+                return 1
+            seen += 1
+    missing = [n for n in range(documents) if store.get(f"{name}-{n}") != _document(name, n)]
+    store.close()
+    print(f"{name}: read {seen} documents written by {other}, {len(missing)} of its own missing")
+    return 1 if missing else 0
+
+
+def self_test(documents: int = 200, processes: int = 3) -> bool:
+    """
+    Put, overwrite, delete, compact and reopen a store in a temporary
+    directory, with os.pread hidden to stand in for Windows; then share one
+    store between several processes that all write and compact.
+    """
+    pread = getattr(os, "pread", None)
+    if pread is not None:
+        del os.pread
+    failures = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SegmentStore(tmp, segment_max_bytes=4096)
+            for n in range(documents):
+                store.put(f"doc-{n}", f"document {n} " * (n % 50 + 1), meta={"n": n})
+            store.put("doc-0", b"overwritten")
+            store.delete("doc-1")
+            store.put("short-lived", "gone", ttl=0.01)
+            time.sleep(0.02)
+
+            def check(stage):
+                if store.get("doc-0") != b"overwritten":
+                    failures.append(f"{stage}: overwrite lost")
+                if store.get("doc-1") is not None or store.get("short-lived") is not None:
+                    failures.append(f"{stage}: deleted or expired document returned")
+                for n in range(2, documents):
+                    doc = store.get_document(f"doc-{n}")
+                    if doc is None or doc["data"] != f"document {n} " * (n % 50 + 1) or doc["meta"] != {"n": n}:
+                        failures.append(f"{stage}: doc-{n} wrong")
+                        break
+
+            check("before compaction")
+            store.compact()
+            check("after compaction")
+            store.close()
+            store = SegmentStore(tmp)
+            check("after reopen")
+            # A hash collision must not return the other key's document
+            store._slots[_key_hash("collides")] = store._slots[_key_hash("doc-2")]
+            if store.get("collides") is not None:
+                failures.append("document returned for a colliding key")
+            store.close()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            children = [
+                subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", tmp, f"w{i}",
+                                  "--documents", str(documents)])
+                for i in range(processes)
+            ]
+            if any(child.wait(timeout=120) for child in children):
+                failures.append("a writer process failed")
+            store = SegmentStore(tmp)
+            for i in range(processes):
+                missing = [n for n in range(documents) if store.get(f"w{i}-{n}") != _document(f"w{i}", n)]
+                if missing:
+                    failures.append(f"{len(missing)} documents of w{i} missing after all processes exited")
+            store.close()
+    finally:
+        if pread is not None:
+            os.pread = pread
+
+    for failure in failures:
+        print(f"  {failure}")
+    print("SELF-TEST PASSED" if not failures else "SELF-TEST FAILED")
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw segment store")
+    parser.add_argument("--self-test", action="store_true",
+                        help="Run the store self-test without os.pread, then with several processes")
+    parser.add_argument("--documents", type=int, default=200, help="Documents per store / process for --self-test")
+    parser.add_argument("--processes", type=int, default=3, help="Processes sharing the store in --self-test")
+    parser.add_argument("--child", nargs=2, metavar=("ROOT", "NAME"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        raise SystemExit(_child(args.child[0], args.child[1], args.documents))
+    if args.self_test:
+        raise SystemExit(0 if self_test(args.documents, args.processes) else 1)
+    parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
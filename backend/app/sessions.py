@@ -0,0 +1,143 @@
+"""
+Research sessions.
+
+Users usually refine a query several times ("AI trends 2024" -> "AI trends
+2024 in healthcare"). A session keeps the documents fetched and the
+per-category summaries produced so far, so a follow-up query only fetches
+URLs the session hasn't seen. Summaries answer one question, so they are
+reused only when the query and a category's input text are both unchanged
+(e.g. the same query re-run with other sources). Failed fetches are not kept,
+so a follow-up retries them; pages dropped by the date filter are. Sessions
+live in memory, bounded by count, idle time and total stored text, and are
+evicted least-recently-used first.
+"""
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+DEFAULT_MAX_SESSIONS = 200
+DEFAULT_TTL = 3600  # seconds a session survives without being used
+DEFAULT_MAX_CHARS = 50_000_000  # stored text across all sessions
+
+
+def summary_key(source: str, texts: List[str], *params) -> str:
+    """Digest of everything a category summary depends on besides the model; pass the query in `params`."""
+    h = hashlib.sha1(source.encode("utf-8"))
+    for text in texts:
+        h.update(b"\0" + text.encode("utf-8"))
+    h.update(json.dumps(params, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _document_key(url: str, date_filter: Optional[dict]) -> str:
+    # Documents are date-filtered when scraped, so a new range is a new document
+    return f"{json.dumps(date_filter or {}, sort_keys=True)} {url}"
+
+
+class ResearchSession:
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.created = self.last_used = time.time()
+        self.queries: List[str] = []
+        self.documents: Dict[str, str] = {}
+        self.dropped_by_date: Set[str] = set()
+        self.summaries: Dict[str, tuple] = {}  # source -> (summary_key, summary)
+
+    def document(self, url: str, date_filter: Optional[dict] = None) -> Optional[str]:
+        """The fetched text, "" if the page was dropped by the date filter, None if not fetched yet."""
+        key = _document_key(url, date_filter)
+        if key in self.dropped_by_date:
+            return ""
+        return self.documents.get(key)
+
+    def add_document(self, url: str, date_filter: Optional[dict], text: str, dropped_by_date: bool = False):
+        """Keep a scrape_source result; an empty text that wasn't dropped by date is a failed fetch, not kept."""
+        key = _document_key(url, date_filter)
+        if dropped_by_date:
+            self.dropped_by_date.add(key)
+        elif text:
+            self.documents[key] = text
+
+    def summary(self, source: str, key: str):
+        """The stored summary for `source` if its inputs are unchanged, else None."""
+        stored = self.summaries.get(source)
+        return stored[1] if stored is not None and stored[0] == key else None
+
+    def add_summary(self, source: str, key: str, summary):
+        self.summaries[source] = (key, summary)
+
+    def size(self) -> int:
+        return sum(len(t) for t in self.documents.values()) + sum(
+            len(json.dumps(s, default=str)) for _, s in self.summaries.values()
+        )
+
+    def info(self) -> dict:
+        return {
+            "session_id": self.id,
+            "queries": len(self.queries),
+            "documents": len(self.documents),
+        }
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS, ttl: float = DEFAULT_TTL,
+                 max_chars: int = DEFAULT_MAX_CHARS):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_chars = max_chars
+        self._sessions: "OrderedDict[str, ResearchSession]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: Optional[str]) -> Optional[ResearchSession]:
+        with self._lock:
+            session = self._sessions.get(session_id or "")
+            if session is None:
+                return None
+            if time.time() - session.last_used > self.ttl:
+                self._drop(session.id)
+                return None
+            self._sessions.move_to_end(session.id)
+            session.last_used = time.time()
+            return session
+
+    def get_or_create(self, session_id: Optional[str] = None) -> ResearchSession:
+        """Continue `session_id`, or start a new session if it is unknown or expired."""
+        session = self.get(session_id)
+        if session is not None:
+            return session
+        session = ResearchSession(uuid.uuid4().hex)
+        with self._lock:
+            self._sessions[session.id] = session
+            self._sizes[session.id] = 0
+            self._evict()
+        return session
+
+    def save(self, session: ResearchSession):
+        """Record the session's new size after a request and evict to stay within bounds."""
+        with self._lock:
+            if session.id in self._sessions:
+                self._sizes[session.id] = session.size()
+                self._evict()
+
+    def _drop(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        self._sizes.pop(session_id, None)
+
+    def _evict(self):
+        now = time.time()
+        for session_id in [s.id for s in self._sessions.values() if now - s.last_used > self.ttl]:
+            self._drop(session_id)
+        # Least recently used first; the most recent session is always kept
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or sum(self._sizes.values()) > self.max_chars
+        ):
+            self._drop(next(iter(self._sessions)))
+
+    def __len__(self):
+        return len(self._sessions)
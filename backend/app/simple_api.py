@@ -1,16 +1,33 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+import functools
+import json
 import logging
 import sys
 import os
+import threading
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from model import GGUFModel
-    from scrapper import scrape_multiple_urls
+    from model import GGUFModel, render_facts, summarize_stats
+    from scrapper import scrape_source
     from social_media import RapidAIAgent
     from url_generator import generate_urls
+    from batch_research import run_batch
+    from date_range import build_date_filter
+    from doc_index import DocumentIndex, categorize_scraped_data
+    from segment_store import open_store
+    from autotune import load_host_profile, model_settings
+    from admission import BATCH, INTERACTIVE, Overloaded, from_environment, parse_priority
+    from sessions import SessionStore, summary_key
+    from source_gain import adaptive_gain
+    from report_cache import ReportCache
+    from broker import Broker, RemoteModel, remote_scrape_source
+    from model_manager import LOADING, ModelManager
+    from traffic import instrument_http, instrument_model, traffic_from_environment
+    from profiling import ProfileStore, RequestProfiler
+    from tracing import configure as configure_tracing, remote_parent, span
 except ImportError as e:
     print(f"Error importing modules: {e}")
     sys.exit(1)
@@ -23,139 +40,483 @@ logger = logging.getLogger("deep-research-api")
 
 MODEL_PATH = r"C:\Users\jashp\Downloads\Deep Research Agent\mistral-7b-instruct-v0.2.Q4_K_S.gguf"
 LLAMA_CLI_BIN = r"C:\Users\jashp\Downloads\Deep Research Agent\llama.cpp\build\bin\Release\llama-cli.exe"
+DRAFT_MODEL_PATH = os.environ.get("DRAFT_MODEL_PATH")  # optional draft model for speculative decoding
+RESEARCH_BROKER = os.environ.get("RESEARCH_BROKER")  # set to run generation and scraping on worker.py nodes
 RAPIDAI_API_KEY = "YOUR API KEY"
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")  # /api/admin/* is refused unless this is set
 
-model = None
+models = ModelManager()  # serving model: warm-up, readiness, hot swap
 rapid_agent = None
+doc_index = None
+raw_store = None
+admission = None
+report_cache = None
+broker = None
+sessions = SessionStore()
+profiles = ProfileStore()  # opt-in request profiles, see /api/admin/profile
+configure_tracing("simple-api")  # TRACE_FILE / OTLP_ENDPOINT, see tracing.py
+traffic = traffic_from_environment()  # TRAFFIC_RECORD / TRAFFIC_REPLAY, see traffic.py
+if traffic is not None:
+    instrument_http(traffic)
 
-def categorize_scraped_data(urls, scraped_texts, rapidai_content=""):
-    categorized = {}
-    if rapidai_content.strip():
-        categorized["RapidAI"] = [rapidai_content]
-    for url, text in zip(urls, scraped_texts):
-        if not text.strip():
-            continue
-        if "google.com/search" in url:
-            source = "Google Search"
-        elif "news.google.com" in url:
-            source = "Google News"
-        elif "wikipedia.org" in url:
-            source = "Wikipedia"
-        elif "reddit.com" in url:
-            source = "Reddit"
-        elif "medium.com" in url:
-            source = "Medium"
-        elif "bbc.com" in url or "cnn.com" in url:
-            source = "News Site"
-        else:
-            source = "Other"
-        categorized.setdefault(source, []).append(text)
-    return categorized
-
-def initialize_components():
-    global model, rapid_agent
-    try:
-        model = GGUFModel(
-            model_path=MODEL_PATH,
-            llama_cli_path=LLAMA_CLI_BIN,
-            threads=6,
-            max_tokens=256,
-            temperature=0.7,
-            timeout=600,
-        )
-        rapid_agent = RapidAIAgent(RAPIDAI_API_KEY)
-        logger.info("Components initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize components: {e}")
-        raise
+def scrape(url, date_filter):
+    """scrape_source() locally, or on a worker node in distributed mode."""
+    if broker is not None:
+        return remote_scrape_source(broker, url, date_filter)
+    return scrape_source(url, date_filter, doc_index, raw_store)
+
+_init_lock = threading.Lock()
+
+def build_model(model_path, draft_model_path=None):
+    # threads / max_tokens / ctx / batch / mmap come from `python autotune.py`
+    model = GGUFModel(
+        model_path=model_path,
+        llama_cli_path=LLAMA_CLI_BIN,
+        temperature=0.7,
+        timeout=600,
+        draft_model_path=draft_model_path,
+        **model_settings(load_host_profile()),
+    )
+    if traffic is not None:
+        instrument_model(model, traffic)
+    return model
+
+def load_model(candidate, name):
+    """Warm up `candidate` and start serving it; /api/ready reports progress."""
+    logger.info(f"Warming up model {name}...")
+    # Remote models are warmed by their workers
+    info = models.load(candidate, name=name, warm=broker is None)
+    logger.info(f"Model ready ({info['warmup_s']}s warm-up)")
+
+def initialize_components(background_warmup=False):
+    global rapid_agent, doc_index, raw_store, admission, report_cache, broker
+    with _init_lock:
+        if rapid_agent is not None:
+            return
+        try:
+            profile = load_host_profile()
+            settings = model_settings(profile)
+            if RESEARCH_BROKER:
+                # Distributed mode: this node only orchestrates, workers run the model
+                broker = Broker(RESEARCH_BROKER)
+                candidate, name = RemoteModel(broker), f"broker:{RESEARCH_BROKER}"
+                logger.info(f"Distributed mode: jobs go through broker {RESEARCH_BROKER}")
+            else:
+                candidate, name = build_model(MODEL_PATH, DRAFT_MODEL_PATH), MODEL_PATH
+            if profile:
+                logger.info(f"Loaded host profile for {profile.get('host')}: {profile.get('settings')}")
+            if admission is None:
+                admission = from_environment(profile, settings["threads"])
+                logger.info(f"Admission control: {admission.capacity} concurrent research request(s)")
+            if raw_store is None:
+                raw_store = open_store()
+            doc_index = DocumentIndex()
+            report_cache = ReportCache()
+            rapid_agent = RapidAIAgent(RAPIDAI_API_KEY, store=raw_store)
+            logger.info("Components initialized successfully")
+        except Exception as e:
+            logger.error(f"Failed to initialize components: {e}")
+            raise
+
+    if background_warmup:
+        def warm():
+            try:
+                load_model(candidate, name)
+            except Exception as e:
+                logger.error(f"Model warm-up failed: {e}")
+        threading.Thread(target=warm, name="model-warmup", daemon=True).start()
+    else:
+        load_model(candidate, name)
+
+def is_admin():
+    # No token configured: admin endpoints are off, since the server listens on all interfaces
+    return bool(ADMIN_TOKEN) and request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+
+def admin_forbidden():
+    message = 'Forbidden' if ADMIN_TOKEN else 'Admin endpoints are disabled: set ADMIN_TOKEN'
+    return jsonify({'error': message}), 403
+
+@app.before_request
+def start_profile():
+    """Profile a research request that sends {"profile": true} or was armed via /api/admin/profile."""
+    if request.endpoint != 'research_query':
+        return
+    data = request.get_json(silent=True) or {}
+    inline = bool(data.get('profile')) and is_admin()
+    if not (inline or profiles.take_armed()):
+        return
+    profiler = RequestProfiler(threading.get_ident(), label=str(data.get('query', '')))
+    if profiler.start():
+        g.profiler, g.profile_inline = profiler, inline
+    else:
+        logger.warning("Profiling skipped: another request is being profiled")
+
+@app.after_request
+def finish_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profile = profiler.stop()
+    profiles.add(profile)
+    logger.info(f"Profiled request {profile['id']}: {profile['duration_s']}s, {profile['samples']} samples, "
+                f"peak {profile['memory']['peak_kb']} KB")
+    if g.profile_inline and response.is_json:
+        body = response.get_json()
+        body['profile'] = profile
+        response.set_data(json.dumps(body))
+    return response
+
+@app.teardown_request
+def abandon_profile(exc):
+    # after_request is skipped when a request dies with an unhandled error
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiles.add(profiler.stop())
+
+def traced(view):
+    """Run a view as the root span of its trace, or under the caller's traceparent header."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with remote_parent(request.headers.get('traceparent')), span(f"api.{view.__name__}"):
+            return view(*args, **kwargs)
+    return wrapper
+
+def model_unavailable():
+    status = models.status()
+    message = 'Model is warming up' if status['state'] == LOADING else f"Model is not available: {status['error']}"
+    return jsonify({'error': message, 'model': status}), 503, {'Retry-After': '10'}
 
 @app.route('/api/research', methods=['POST'])
+@traced
 def research_query():
+    ticket = lease = None
     try:
         data = request.get_json()
+        if traffic is not None:
+            traffic.record_request('/api/research', data)
         user_query = data.get('query', '').strip()
         start_date = data.get('start_date', '').strip()
         end_date = data.get('end_date', '').strip()
         max_sources = data.get('max_sources', 5)
+        structured = bool(data.get('structured', False))
+        force_refresh = bool(data.get('force_refresh', False))
+        # Adaptive mode stops collecting sources once they add little new
+        gain = adaptive_gain(user_query, data)
+        cache_options = {'structured': structured}
+        if gain is not None:
+            cache_options['min_gain'] = gain.min_gain
 
         logger.info(f"Received research request: '{user_query}'")
 
         if not user_query:
             return jsonify({'error': 'Query cannot be empty'}), 400
+        try:
+            date_filter = build_date_filter(start_date, end_date)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-        global model, rapid_agent
-        if model is None or rapid_agent is None:
+        if rapid_agent is None:
             initialize_components()
 
-        date_filter = {}
-        if start_date:
-            date_filter["start"] = start_date + "T00:00:00Z"
-        if end_date:
-            date_filter["end"] = end_date + "T23:59:59Z"
+        # The same question in other words, casing or order is served from the report cache
+        if not force_refresh:
+            hit = report_cache.lookup(user_query, date_filter, max_sources, **cache_options)
+            if hit:
+                logger.info(f"Serving cached report ({hit['match']} match for '{hit['cached_query']}')")
+                cache_info = {k: v for k, v in hit.items() if k != 'report'}
+                return jsonify({**hit['report'], 'query': user_query, 'cached': True, 'cache': cache_info})
+
+        if not models.ready:
+            return model_unavailable()
+
+        # Interactive UI requests are queued ahead of batch work; under
+        # overload the request is degraded or rejected instead of slowing everyone
+        try:
+            ticket = admission.acquire(parse_priority(data.get('priority'), INTERACTIVE))
+        except Overloaded as e:
+            logger.warning(f"Rejected research request: {e}")
+            return jsonify({'error': str(e), 'admission': admission.stats()}), 503, {'Retry-After': str(e.retry_after)}
+        max_sources, summary_tokens = ticket.limits(max_sources, 400)
+        if ticket.degraded:
+            logger.info(f"Degraded request under load: max_sources={max_sources}, max_total_tokens={summary_tokens}")
+
+        # The request finishes on this model even if a hot swap happens meanwhile
+        lease = models.acquire()
+        model = lease.model
+
+        # Follow-up queries in a session reuse its documents and summaries
+        session = sessions.get_or_create(data.get('session_id'))
+        session.queries.append(user_query)
+        reused_documents = reused_summaries = 0
 
         logger.info("Starting initial LLM generation...")
         initial_output = model.generate_text(user_query)
 
         logger.info("Fetching RapidAI data...")
+        # Fresh documents already in the local index are used first; the
+        # network only fills the remaining source slots.
+        indexed = doc_index.search(user_query, limit=max_sources)
+        logger.info(f"Retrieved {len(indexed)} fresh documents from the local index")
+
         urls, aggregated_content = [], ""
+        dropped_by_date = 0
         try:
-            rapidai_data = rapid_agent.fetch_data(user_query, max_results=max_sources)
+            rapidai_data = rapid_agent.fetch_data(user_query, date_range=date_filter, max_results=max_sources)
             urls = rapidai_data.get("urls", [])
             aggregated_content = rapidai_data.get("content", "")
+            dropped_by_date += rapidai_data.get("dropped_by_date", 0)
             logger.info(f"Retrieved {len(urls)} URLs from RapidAI")
         except Exception as e:
             logger.warning(f"RapidAI fetch failed: {e}")
 
         if not urls:
             logger.info("Generating URLs using url_generator...")
-            urls = generate_urls(user_query)
+            urls = generate_urls(user_query, date_filter)
+
+        source_urls = [doc["url"] for doc in indexed]
+        for url in urls:
+            if len(source_urls) >= max_sources:
+                break
+            if url not in source_urls:
+                source_urls.append(url)
 
         logger.info("Scraping URLs...")
-        scraped_texts = []
-        for url in urls[:max_sources]:
-            scraped_text = scrape_multiple_urls([url], max_urls=1)
-            scraped_texts.append(scraped_text)
+        if gain is not None:
+            gain.plan(source_urls)
+            gain.seed(aggregated_content)
+        used_urls, scraped_texts = [], []
+        for url in source_urls:
+            scraped_text = session.document(url, date_filter)
+            if scraped_text is not None:
+                reused_documents += 1
+            else:
+                scraped_text, dropped = scrape(url, date_filter)
+                session.add_document(url, date_filter, scraped_text, dropped)
+                dropped_by_date += dropped
+            if gain is None or gain.add(url, scraped_text):
+                used_urls.append(url)
+                scraped_texts.append(scraped_text)
+            if gain is not None and gain.saturated:
+                logger.info(f"Sources saturated after {len(gain.scores)} of {len(source_urls)}, skipping the rest")
+                break
+        logger.info(f"Reused {reused_documents} documents from session {session.id}")
+        if date_filter:
+            logger.info(f"Dropped {dropped_by_date} items outside the date range before summarization")
 
         logger.info("Categorizing scraped data...")
-        categorized_data = categorize_scraped_data(urls, scraped_texts, aggregated_content)
+        categorized_data = categorize_scraped_data(used_urls, scraped_texts, aggregated_content)
 
         logger.info("Generating category summaries with fact check prompt...")
         final_sections = []
+        facts = {}
+        generation_stats = {}
         for source, texts in categorized_data.items():
             combined_text = "\n\n".join(texts)
+            key = summary_key(source, texts, user_query, structured, summary_tokens)
+            cached = session.summary(source, key)
+            if cached is not None:
+                reused_summaries += 1
+                if structured:
+                    facts[source] = cached
+                    cached = render_facts(cached)
+                final_sections.append(f"### {source} Summary\n{cached}")
+                continue
+            if structured:
+                # Schema-constrained: no echo cleanup needed, output length is bounded
+                facts[source] = model.structured_generation(
+                    f"Extract ONLY facts present in the following text from {source} for the query: {user_query}. "
+                    f"Do not invent or hallucinate.",
+                    combined_text,
+                    # RapidAI text has no "--- Content from" header to take URLs from
+                    source_urls=["RapidAI"] if source == "RapidAI" else None,
+                    max_tokens=summary_tokens,
+                    timeout=600,
+                    stats=generation_stats,
+                )
+                session.add_summary(source, key, facts[source])
+                final_sections.append(f"### {source} Summary\n{render_facts(facts[source])}")
+                continue
             summary = model.enhanced_generation(
                 f"Summarize ONLY facts present in the following text from {source} for the query: {user_query}. "
                 f"Do not invent or hallucinate. Return only structured headlines or facts that exactly appear in the input text. "
                 f"If there is not enough relevant information, say \"Not enough explicit information found.\"",
                 initial_output,
                 combined_text,
-                max_total_tokens=400,
+                max_total_tokens=summary_tokens,
                 chunk_size=200,
                 timeout=600,
+                stats=generation_stats,
             )
+            session.add_summary(source, key, summary)
             final_sections.append(f"### {source} Summary\n{summary}")
 
         final_output = "\n\n".join(final_sections)
+        sessions.save(session)
+        generation_stats = summarize_stats(generation_stats)
+        logger.info(f"Generation stats: {generation_stats}")
         logger.info("Research completed successfully")
 
-        return jsonify({
+        response = {
             'success': True,
             'final_summary': final_output,
             'query': user_query,
             'sources_processed': len(categorized_data),
-            'urls_scraped': len(urls)
-        })
+            # Sources actually looked at: adaptive mode may stop before the end of the list
+            'urls_scraped': len(source_urls) if gain is None else len(gain.scores) + gain.fetched_unscored,
+            'items_dropped_by_date': dropped_by_date,
+            'indexed_documents': len(indexed),
+            'generation_stats': generation_stats,
+            'admission': ticket.info(),
+            'session_id': session.id,
+            'session': {**session.info(), 'reused_documents': reused_documents, 'reused_summaries': reused_summaries}
+        }
+        if structured:
+            response['facts'] = facts
+        if gain is not None:
+            response['adaptive'] = gain.report()
+            logger.info(f"Adaptive mode avoided {response['adaptive']['fetches_avoided']} fetches, "
+                        f"{response['adaptive']['generations_avoided']} generations")
+        if not ticket.degraded:
+            # Per-request fields are not part of the cached report
+            report = {k: v for k, v in response.items() if k not in ('admission', 'session_id', 'session')}
+            report_cache.store(user_query, report, date_filter, max_sources, **cache_options)
+        response['cached'] = False
+        return jsonify(response)
 
     except Exception as e:
         logger.error(f"Research failed with exception: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
+    finally:
+        if lease is not None:
+            lease.release()
+        if ticket is not None:
+            ticket.release()
+
+@app.route('/api/research/batch', methods=['POST'])
+def batch_research_query():
+    """Run many queries at once, streaming one JSON line per finished query."""
+    data = request.get_json() or {}
+    if traffic is not None:
+        traffic.record_request('/api/research/batch', data)
+    queries = [str(q) for q in data.get('queries', []) if str(q).strip()]
+    max_sources = data.get('max_sources', 5)
+
+    if not queries:
+        return jsonify({'error': 'queries must be a non-empty list'}), 400
+
+    logger.info(f"Received batch research request: {len(queries)} queries")
+
+    if rapid_agent is None:
+        initialize_components()
+    if not models.ready:
+        return model_unavailable()
+
+    try:
+        ticket = admission.acquire(BATCH)
+    except Overloaded as e:
+        logger.warning(f"Rejected batch research request: {e}")
+        return jsonify({'error': str(e), 'admission': admission.stats()}), 503, {'Retry-After': str(e.retry_after)}
+    max_sources, _ = ticket.limits(max_sources, 400)
+    try:
+        lease = models.acquire()
+    except RuntimeError:
+        ticket.release()
+        return model_unavailable()
+
+    def stream():
+        # The slot and the model are held until the last result has been streamed
+        with ticket, lease as model:
+            for result in run_batch(queries, model, rapid_agent, max_sources=max_sources, scrape=scrape):
+                yield json.dumps(result) + "\n"
+
+    response = Response(stream_with_context(stream()), mimetype='application/x-ndjson')
+    # A client that disconnects before the first line closes a generator that
+    # never started, so its `with` never runs: release from the close hook too
+    response.call_on_close(lease.release)
+    response.call_on_close(ticket.release)
+    return response
+
+@app.route('/api/admission', methods=['GET'])
+def admission_status():
+    """Capacity, queue depth and wait times of the admission controller."""
+    if admission is None:
+        return jsonify({'error': 'Components not initialized'}), 503
+    return jsonify(admission.stats())
+
+@app.route('/api/cluster', methods=['GET'])
+def cluster_status():
+    """Broker queue and live workers in distributed mode."""
+    if broker is None:
+        return jsonify({'distributed': False})
+    return jsonify({'distributed': True, **broker.stats()})
+
+@app.route('/api/admin/model', methods=['GET', 'POST'])
+def admin_model():
+    """
+    GET: serving model and any models still draining.
+    POST {"model_path", "draft_model_path"}: warm up a new model next to the
+    current one, move new requests to it and let the old one drain.
+    """
+    if not is_admin():
+        return admin_forbidden()
+    if request.method == 'GET':
+        return jsonify(models.status())
+    if broker is not None:
+        return jsonify({'error': 'Distributed mode: restart worker.py nodes with the new model instead'}), 400
+
+    data = request.get_json() or {}
+    model_path = data.get('model_path', '').strip()
+    if not model_path:
+        return jsonify({'error': 'model_path is required'}), 400
+
+    logger.info(f"Hot swap requested: {model_path}")
+    try:
+        result = models.swap(build_model(model_path, data.get('draft_model_path')), name=model_path)
+    except Exception as e:
+        logger.error(f"Hot swap failed, still serving the previous model: {e}")
+        return jsonify({'error': str(e), 'model': models.status()}), 500
+    logger.info(f"Now serving {model_path} ({result['current']['warmup_s']}s warm-up)")
+    return jsonify({'success': True, **result, 'model': models.status()})
+
+@app.route('/api/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """
+    GET: recent request profiles.
+    POST {"requests": n}: profile the next n research requests (0 disarms).
+    """
+    if not is_admin():
+        return admin_forbidden()
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        return jsonify({'armed': profiles.arm(int(data.get('requests', 1)))})
+    return jsonify(profiles.summary())
+
+@app.route('/api/admin/profile/<profile_id>', methods=['GET'])
+def admin_profile_detail(profile_id):
+    """One profile; ?format=collapsed returns its stacks as text for flamegraph.pl / speedscope."""
+    if not is_admin():
+        return admin_forbidden()
+    profile = profiles.get(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Unknown profile'}), 404
+    if request.args.get('format') == 'collapsed':
+        return Response(profile['collapsed'] + "\n", mimetype='text/plain')
+    return jsonify(profile)
+
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """200 once the model is warmed up and serving, 503 before that."""
+    status = models.status()
+    return jsonify(status), 200 if status['ready'] else 503
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'healthy', 
         'message': 'Deep Research Agent API is running (Main.py Logic)',
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'ready': models.ready,
+        'model_state': models.state
     })
 
 if __name__ == '__main__':
@@ -165,7 +526,8 @@ if __name__ == '__main__':
     print("📝 Using categorized summary format from main.py")
 
     try:
-        initialize_components()
+        # Serve /api/health and /api/ready while the model warms up
+        initialize_components(background_warmup=True)
     except Exception as e:
         print(f"❌ Failed to initialize: {e}")
         print("Make sure your model files and paths are correct")
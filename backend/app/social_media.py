@@ -1,9 +1,13 @@
+import json
 import requests
 from typing import Dict, Any, List
 
+from date_range import in_date_range
+
 class RapidAIAgent:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, store=None):
         self.api_key = api_key
+        self.store = store  # optional SegmentStore for raw API responses
         self.base_url = "https://social-media-master.p.rapidapi.com"
         self.headers = {
             "x-rapidapi-host": "social-media-master.p.rapidapi.com",
@@ -22,8 +26,16 @@ class RapidAIAgent:
             "includeProfile": str(include_profile).lower(),
         }
 
+        key = f"rapidai:{user_id}:{post_id}:{params['includeProfile']}"
+        if self.store is not None:
+            cached = self.store.get(key)
+            if cached is not None:
+                return json.loads(cached)
+
         resp = requests.get(url, headers=self.headers, params=params)
         resp.raise_for_status()
+        if self.store is not None:
+            self.store.put(key, resp.text, meta={"url": url, "params": params})
         return resp.json()
 
     def fetch_data(self, query: str, date_range: Dict[str, str] = None, max_results: int = 5) -> Dict[str, Any]:
@@ -34,6 +46,7 @@ class RapidAIAgent:
         """
         urls: List[str] = []
         aggregated_content: List[str] = []
+        dropped_by_date = 0
 
         # Check if query contains post pairs (user_id:post_id format)
         if ":" in query and any("," in query or len(query.split(":")) == 2):
@@ -49,6 +62,13 @@ class RapidAIAgent:
                     if "post" in data and len(data["post"]) > 0:
                         post_data = data["post"][0]["postDetails"]
 
+                        # Skip posts published outside the requested range
+                        published = (post_data.get("date") or post_data.get("createdAt")
+                                     or post_data.get("timestamp"))
+                        if not in_date_range(published, date_range):
+                            dropped_by_date += 1
+                            continue
+
                         # Get URL
                         post_url = post_data.get("postUrl")
                         if post_url:
@@ -69,6 +89,7 @@ class RapidAIAgent:
         return {
             "urls": urls,
             "content": "\n\n".join(aggregated_content),
+            "dropped_by_date": dropped_by_date,
         }
 
 if __name__ == "__main__":
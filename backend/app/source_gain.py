@@ -0,0 +1,119 @@
+"""
+Adaptive source collection: stop fetching once sources stop adding anything.
+
+`max_sources` is a fixed budget, but often the first couple of sources
+already cover the query and later ones repeat them. SourceGain scores each
+source as it arrives by term overlap (doc_index.tokenize):
+
+- coverage gain: share of the query's terms it covers that no earlier
+  source did
+- novelty: share of its own terms not seen in the text collected so far,
+  weighted by how much of the query it touches, so new but off-topic text
+  scores low
+
+The marginal gain is the larger of the two. A source below the threshold is
+left out of categorization (no summary is generated for it), and once
+`patience` sources in a row fall below it the pipeline stops fetching. The
+report counts the fetches and generations that were avoided.
+"""
+
+from typing import Dict, List, Optional
+
+from doc_index import source_category, tokenize
+
+DEFAULT_MIN_GAIN = 0.1
+DEFAULT_PATIENCE = 1
+DEFAULT_MIN_SOURCES = 1
+
+
+class SourceGain:
+    def __init__(self, query: str, min_gain: float = DEFAULT_MIN_GAIN, patience: int = DEFAULT_PATIENCE,
+                 min_sources: int = DEFAULT_MIN_SOURCES):
+        self.query_terms = set(tokenize(query))
+        self.min_gain = min_gain
+        self.patience = patience
+        self.min_sources = min_sources
+        self.seen_terms = set()
+        self.covered = set()
+        self.planned: List[str] = []
+        self.kept: List[str] = []
+        self.empty: List[str] = []
+        self.scores: List[Dict] = []
+        # Fetches started ahead of scoring (async prefetch) that were no longer needed
+        self.fetched_unscored = 0
+        self._low_streak = 0
+
+    def plan(self, urls: List[str]):
+        """The sources the fixed-budget pipeline would have fetched, in order."""
+        self.planned = list(urls)
+
+    def seed(self, text: str):
+        """Count text collected outside the source loop (e.g. RapidAI content) as already seen."""
+        terms = set(tokenize(text))
+        self.seen_terms |= terms
+        self.covered |= terms & self.query_terms
+
+    def score(self, text: str) -> Dict:
+        """Marginal gain of `text` over what has been kept so far, without keeping it."""
+        terms = set(tokenize(text))
+        if not terms:
+            return {"coverage_gain": 0.0, "novelty": 0.0, "gain": 0.0}
+        query = self.query_terms or terms
+        coverage_gain = len((terms & query) - self.covered) / len(query)
+        relevance = len(terms & query) / len(query)
+        novelty = len(terms - self.seen_terms) / len(terms)
+        return {
+            "coverage_gain": round(coverage_gain, 3),
+            "novelty": round(novelty, 3),
+            "gain": round(max(coverage_gain, novelty * relevance), 3),
+        }
+
+    def add(self, url: str, text: str) -> bool:
+        """Score a fetched source; True if it should be summarized."""
+        scored = self.score(text)
+        if not text.strip():
+            # A failed or empty fetch says nothing about saturation
+            keep = False
+            self.empty.append(url)
+        else:
+            keep = scored["gain"] >= self.min_gain or len(self.kept) < self.min_sources
+            self._low_streak = 0 if keep else self._low_streak + 1
+        if keep:
+            terms = set(tokenize(text))
+            self.seen_terms |= terms
+            self.covered |= terms & self.query_terms
+            self.kept.append(url)
+        self.scores.append({"url": url, **scored, "kept": keep})
+        return keep
+
+    @property
+    def saturated(self) -> bool:
+        """True once `patience` sources in a row added too little: stop fetching."""
+        return self._low_streak >= self.patience
+
+    def report(self) -> Dict:
+        """
+        What adaptive mode saved. Summaries are generated per source category,
+        so generations avoided are the categories of the planned sources that
+        no kept source falls into (sources that came back empty excepted).
+        """
+        planned_categories = {source_category(url) for url in self.planned if url not in self.empty}
+        kept_categories = {source_category(url) for url in self.kept}
+        return {
+            "min_gain": self.min_gain,
+            "sources_planned": len(self.planned),
+            "sources_scored": len(self.scores),
+            "sources_used": len(self.kept),
+            "fetches_avoided": max(0, len(self.planned) - len(self.scores) - self.fetched_unscored),
+            "generations_avoided": max(0, len(planned_categories) - len(kept_categories)),
+            "query_coverage": round(len(self.covered) / len(self.query_terms), 3) if self.query_terms else 1.0,
+            "stopped_early": self.saturated and len(self.scores) < len(self.planned),
+            "scores": self.scores,
+        }
+
+
+def adaptive_gain(query: str, options: dict) -> Optional[SourceGain]:
+    """A SourceGain if the request asked for "adaptive": true (optional "min_gain"), else None."""
+    if not options.get("adaptive"):
+        return None
+    return SourceGain(query, min_gain=float(options.get("min_gain", DEFAULT_MIN_GAIN)))
@@ -0,0 +1,154 @@
+"""
+Concurrency stress check for GGUFModel.
+
+Runs many generations at once against one shared GGUFModel, each with its
+own prompt and token budget, from worker threads (generate_text,
+iterative_generate) and from asyncio tasks (agenerate_text,
+aenhanced_generation). A stub llama-cli stands in for llama.cpp: it echoes
+a marker taken from the prompt followed by exactly `-n` tokens, so any
+output that carries another call's marker or the wrong token count means
+per-request state leaked between calls. The asyncio calls must overlap
+(a loop blocked on each llama-cli run would take calls x delay), and the
+worst event-loop lag while they run must stay under --max-lag:
+
+    python stress_model.py --calls 64 --workers 16 --delay 0.2 --max-lag 0.1
+
+Exits non-zero on any mismatch.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import stat
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from model import GGUFModel
+
+STUB_LLAMA_CLI = '''#!{python}
+import sys, time
+args = sys.argv[1:]
+prompt = args[args.index("-p") + 1]
+n = int(args[args.index("-n") + 1])
+marker = prompt.split("MARKER:", 1)[1].split()[0]
+time.sleep({delay})
+sys.stdout.write("out-" + marker + " " + " ".join("tok" for _ in range(n)) + "\\n")
+sys.stdout.flush()
+sys.stderr.write("llama_perf_context_print:        eval time =     100.00 ms / %d runs\\n" % n)
+'''
+
+
+def write_stub(directory: str, delay: float) -> str:
+    path = os.path.join(directory, "llama-cli")
+    with open(path, "w") as f:
+        f.write(STUB_LLAMA_CLI.format(python=sys.executable, delay=delay))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def check(marker: str, tokens: int, output: str) -> str:
+    """Empty string if `output` is this call's, else what is wrong with it."""
+    words = output.split()
+    if not words or words[0] != f"out-{marker}":
+        return f"expected marker out-{marker}, got {words[:1]}"
+    markers = [w for w in words if w.startswith("out-")]
+    if len(markers) != len(set(markers)) or any(m != f"out-{marker}" for m in markers):
+        return f"foreign markers {sorted(set(markers))}"
+    if words.count("tok") != tokens:
+        return f"expected {tokens} tokens, got {words.count('tok')}"
+    return ""
+
+
+def sync_call(model: GGUFModel, i: int):
+    tokens = random.randint(1, 64)
+    marker = f"t{i}"
+    if i % 2:
+        output = model.generate_text(f"MARKER:{marker} thread call", max_tokens=tokens)
+    else:
+        # One chunk of exactly `tokens`, so the count is still checkable
+        output = model.iterative_generate(f"MARKER:{marker} thread call", max_total_tokens=tokens,
+                                          chunk_size=tokens)
+    return marker, tokens, output
+
+
+async def async_call(model: GGUFModel, i: int):
+    tokens = random.randint(1, 64)
+    marker = f"a{i}"
+    if i % 2:
+        output = await model.agenerate_text(f"MARKER:{marker} task call", max_tokens=tokens)
+    else:
+        output = await model.aenhanced_generation(f"MARKER:{marker} task call", "", "",
+                                                  max_total_tokens=tokens, chunk_size=tokens)
+    return marker, tokens, output
+
+
+async def loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Worst delay of a timer on the event loop while `stop` is unset."""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run_async(model: GGUFModel, calls: int):
+    stop = asyncio.Event()
+    lag = asyncio.ensure_future(loop_lag(stop))
+    started = time.perf_counter()
+    results = await asyncio.gather(*(async_call(model, i) for i in range(calls)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return results, elapsed, await lag
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress one shared GGUFModel with concurrent calls")
+    parser.add_argument("--calls", type=int, default=64, help="Calls per mode (threads and asyncio)")
+    parser.add_argument("--workers", type=int, default=16, help="Threads for the synchronous calls")
+    parser.add_argument("--delay", type=float, default=0.2, help="Seconds the stub takes per run")
+    parser.add_argument("--max-lag", type=float, default=0.1, help="Worst event-loop lag allowed, in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model = GGUFModel("stub.gguf", write_stub(tmp, args.delay), max_tokens=999, timeout=60)
+        failures = []
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            sync_results = list(pool.map(lambda i: sync_call(model, i), range(args.calls)))
+        sync_elapsed = time.perf_counter() - started
+
+        async_results, async_elapsed, lag = asyncio.run(run_async(model, args.calls))
+
+        for marker, tokens, output in sync_results + async_results:
+            problem = check(marker, tokens, output)
+            if problem:
+                failures.append(f"{marker}: {problem}")
+        if model.max_tokens != 999:
+            failures.append(f"model.max_tokens changed to {model.max_tokens}")
+
+    serial = args.calls * args.delay
+    print(f"threads: {args.calls} calls in {sync_elapsed:.2f}s (serial would be {serial:.1f}s)")
+    print(f"asyncio: {args.calls} calls in {async_elapsed:.2f}s, worst event-loop lag {lag * 1000:.1f} ms")
+    # Blocking on each run (or serializing calls) would take the serial time
+    if sync_elapsed >= serial / 2:
+        failures.append(f"thread calls did not overlap ({sync_elapsed:.2f}s)")
+    if async_elapsed >= serial / 2:
+        failures.append(f"asyncio calls did not overlap ({async_elapsed:.2f}s)")
+    if lag > args.max_lag:
+        failures.append(f"event loop blocked for {lag * 1000:.1f} ms (max {args.max_lag * 1000:.0f} ms)")
+
+    for failure in failures[:20]:
+        print(f"  {failure}")
+    print("FAILED" if failures else "PASSED")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
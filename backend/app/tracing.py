@@ -0,0 +1,338 @@
+"""
+Distributed tracing for the research pipeline.
+
+A trace starts at the API (backend_api.py / simple_api.py), follows the
+request through DeepResearchMCPClient, across stdio into mcp_server.py (the
+W3C traceparent rides in the tool call's `_meta`), and ends in spans around
+each fetch, parse, categorize and llama.cpp generation (with token counts).
+
+Off unless a process calls configure() and an exporter is set:
+
+    TRACE_FILE=traces.jsonl                 # append finished spans as JSON lines
+    OTLP_ENDPOINT=http://localhost:4318     # OpenTelemetry collector, OTLP/HTTP JSON
+
+While off, span() hands out one shared no-op span. Several processes can
+append to the same TRACE_FILE; `python tracing.py traces.jsonl` prints the
+slowest traces as trees with their critical path marked.
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("deep-research-tracing")
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class SpanContext:
+    """A parent that lives in another process (from a traceparent)."""
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "ok"
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def error(self, exc: BaseException):
+        self.status = "error"
+        self.attributes["error"] = f"{type(exc).__name__}: {exc}"
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        for exporter in _exporters:
+            exporter.export(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": _service,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    traceparent = None
+
+    def set(self, **attributes):
+        pass
+
+    def error(self, exc):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current: ContextVar = ContextVar("trace_span", default=None)
+_exporters: List = []
+_service = "deep-research"
+
+
+# ---------------------------------------------------------------------- #
+#  EXPORTERS                                                             #
+# ---------------------------------------------------------------------- #
+class JsonlExporter:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpExporter:
+    """Batches spans and POSTs them to an OTLP/HTTP collector as JSON from a background thread."""
+
+    def __init__(self, endpoint: str, batch_size: int = 256, interval: float = 2.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=10_000)
+        threading.Thread(target=self._loop, name="otlp-exporter", daemon=True).start()
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass  # collector is down or slow: drop rather than block requests
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size and time.monotonic() < deadline:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._post(batch)
+            except Exception as e:
+                logger.warning(f"OTLP export of {len(batch)} spans failed: {e}")
+
+    def _post(self, spans: List[Span]):
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": _service}}]},
+            "scopeSpans": [{
+                "scope": {"name": "deep-research"},
+                "spans": [{
+                    "traceId": s.trace_id,
+                    "spanId": s.span_id,
+                    **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                    "name": s.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(s.start_ns),
+                    "endTimeUnixNano": str(s.end_ns),
+                    "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+                    "status": {"code": 2 if s.status == "error" else 1},
+                } for s in spans],
+            }],
+        }]}
+        req = urllib.request.Request(self.url, data=json.dumps(body).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+        urllib.request.urlopen(req, timeout=10).close()
+
+
+def configure(service: str, trace_file: Optional[str] = None, otlp_endpoint: Optional[str] = None) -> bool:
+    """Set up exporters from the arguments or TRACE_FILE / OTLP_ENDPOINT; True if tracing is on."""
+    global _service
+    _service = os.environ.get("TRACE_SERVICE", service)
+    trace_file = trace_file or os.environ.get("TRACE_FILE")
+    otlp_endpoint = otlp_endpoint or os.environ.get("OTLP_ENDPOINT")
+    _exporters.clear()
+    if trace_file:
+        _exporters.append(JsonlExporter(trace_file))
+    if otlp_endpoint:
+        _exporters.append(OtlpExporter(otlp_endpoint))
+    return bool(_exporters)
+
+
+def enabled() -> bool:
+    return bool(_exporters)
+
+
+# ---------------------------------------------------------------------- #
+#  SPANS AND CONTEXT                                                     #
+# ---------------------------------------------------------------------- #
+def start_span(name: str, parent=None, **attributes):
+    """Start a span under `parent` (default: the current span); the caller ends it."""
+    if not _exporters:
+        return NOOP_SPAN
+    parent = parent or _current.get()
+    if parent is None:
+        return Span(name, os.urandom(16).hex(), None, attributes)
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Run a block as a child span of the current one."""
+    s = start_span(name, **attributes)
+    if s is NOOP_SPAN:
+        yield s
+        return
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error(e)
+        raise
+    finally:
+        _current.reset(token)
+        s.end()
+
+
+@contextmanager
+def use_span(s):
+    """Make an already started span current (e.g. from a before_request hook)."""
+    token = _current.set(s) if s is not NOOP_SPAN else None
+    try:
+        yield s
+    finally:
+        if token is not None:
+            _current.reset(token)
+
+
+def inject() -> Optional[str]:
+    """W3C traceparent of the current span, to send to another process."""
+    current = _current.get()
+    return current.traceparent if isinstance(current, Span) else None
+
+
+def extract(traceparent: Optional[str]) -> Optional[SpanContext]:
+    m = TRACEPARENT_RE.match(traceparent or "")
+    return SpanContext(m.group(1), m.group(2)) if m else None
+
+
+@contextmanager
+def remote_parent(traceparent: Optional[str]):
+    """Continue the trace of an incoming traceparent for the duration of the block."""
+    parent = extract(traceparent) if _exporters else None
+    token = _current.set(parent) if parent is not None else None
+    try:
+        yield
+    finally:
+        if token is not None:
+            _current.reset(token)
+
+
+# ---------------------------------------------------------------------- #
+#  TRACE VIEWER                                                          #
+# ---------------------------------------------------------------------- #
+def load_traces(path: str) -> Dict[str, List[Dict]]:
+    traces: Dict[str, List[Dict]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                s = json.loads(line)
+            except ValueError:
+                continue
+            traces.setdefault(s["trace_id"], []).append(s)
+    return traces
+
+
+def critical_path(spans: List[Dict]) -> List[Dict]:
+    """From the root, follow the child that finished last: the chain that set the trace's latency."""
+    by_id = {s["span_id"]: s for s in spans}
+    children: Dict[Optional[str], List[Dict]] = {}
+    for s in spans:
+        parent = s["parent_id"] if s["parent_id"] in by_id else None
+        children.setdefault(parent, []).append(s)
+    end = lambda s: s["start_ns"] + s["duration_ms"] * 1e6
+    path, level = [], children.get(None, [])
+    while level:
+        node = max(level, key=end)
+        path.append(node)
+        level = children.get(node["span_id"], [])
+    return path
+
+
+def print_trace(spans: List[Dict]):
+    by_id = {s["span_id"]: s for s in spans}
+    children: Dict[Optional[str], List[Dict]] = {}
+    for s in sorted(spans, key=lambda s: s["start_ns"]):
+        children.setdefault(s["parent_id"] if s["parent_id"] in by_id else None, []).append(s)
+    on_path = {s["span_id"] for s in critical_path(spans)}
+    t0 = min(s["start_ns"] for s in spans)
+
+    def walk(parent, depth):
+        for s in children.get(parent, []):
+            attrs = " ".join(f"{k}={v}" for k, v in s["attributes"].items() if k not in ("query",))
+            mark = "*" if s["span_id"] in on_path else " "
+            print(f"{mark} {(s['start_ns'] - t0) / 1e6:>9.1f}ms {s['duration_ms']:>10.1f}ms  "
+                  f"{'  ' * depth}{s['service']}:{s['name']}{' [error]' if s['status'] == 'error' else ''}  {attrs[:120]}")
+            walk(s["span_id"], depth + 1)
+
+    walk(None, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show traces from a TRACE_FILE (critical path marked *)")
+    parser.add_argument("trace_file")
+    parser.add_argument("--trace", help="Trace id to show (default: the slowest ones)")
+    parser.add_argument("--top", type=int, default=3, help="How many of the slowest traces to show")
+    args = parser.parse_args()
+
+    traces = load_traces(args.trace_file)
+    if args.trace:
+        selected = [args.trace]
+    else:
+        span_of = lambda spans: max(s["start_ns"] + s["duration_ms"] * 1e6 for s in spans) - min(s["start_ns"] for s in spans)
+        selected = sorted(traces, key=lambda t: span_of(traces[t]), reverse=True)[:args.top]
+    for trace_id in selected:
+        print(f"\nTrace {trace_id} ({len(traces.get(trace_id, []))} spans)")
+        if traces.get(trace_id):
+            print_trace(traces[trace_id])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+"""
+Traffic record / replay for capacity testing.
+
+Recording: start the API server with TRAFFIC_RECORD set
+
+    TRAFFIC_RECORD=traffic.jsonl.gz python simple_api.py
+
+and every research request (with its arrival time), every external HTTP
+response fetched by the scraper and RapidAIAgent (ScraperAPI / RapidAPI)
+and every model prompt and output is written, with timings, to a gzipped
+JSONL archive. Response bodies are stored once per content hash and API
+keys are redacted. Recording again to the same path appends a new session;
+at replay, idle time between sessions is cut out, so their requests follow
+one another instead of interleaving.
+
+Replay: start the build under test with TRAFFIC_REPLAY pointing at the
+archive, so external services are answered from the recording (after the
+recorded latency, scaled by TRAFFIC_REPLAY_LATENCY; 0 = instant), then
+re-issue the recorded requests at the original or a scaled arrival rate:
+
+    TRAFFIC_REPLAY=traffic.jsonl.gz python simple_api.py
+    python traffic.py replay traffic.jsonl.gz --target http://localhost:5000 --speed 2 --save build-a.json
+    python traffic.py compare build-a.json build-b.json
+
+The model still runs for real during replay; TRAFFIC_REPLAY_MODEL=1 serves
+recorded model outputs too, to measure the pipeline without it. Start the
+replay server with empty caches (REPORT_CACHE_PATH, document index, raw
+store) so it sees the same misses as the recording did.
+"""
+
+import argparse
+import asyncio
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+
+from load_test import percentile
+
+
+def _redact(url: str) -> str:
+    return re.sub(r"(api_key=)[^&]+", r"\1REDACTED", url)
+
+
+def http_key(url: str, params: Optional[dict] = None) -> str:
+    return f"GET {_redact(url)} {json.dumps(params or {}, sort_keys=True, default=str)}"
+
+
+def model_key(model, prompt: str, options: dict) -> str:
+    h = hashlib.sha1(prompt.encode("utf-8"))
+    h.update(json.dumps(
+        [options.get("max_tokens") or model.max_tokens, options.get("stop"), options.get("stop_after"),
+         options.get("json_schema"), options.get("temperature")],
+        sort_keys=True, default=str,
+    ).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _lines(f):
+    try:
+        yield from f
+    except EOFError:
+        pass  # server killed before the archive was closed
+
+
+def read_archive(path: str) -> Dict:
+    """{"requests": [...], "http": {key: [event, ...]}, "model": {key: [event, ...]}}"""
+    bodies, archive = {}, {"requests": [], "http": {}, "model": {}}
+    requests_ = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in _lines(f):
+            try:
+                event = json.loads(line)
+            except ValueError:
+                break  # recording cut off mid-line
+            kind = event.pop("type")
+            if kind == "body":
+                bodies[event["hash"]] = event["text"]
+            elif kind == "request":
+                requests_.append(event)
+            elif kind == "http":
+                event["text"] = bodies.get(event.pop("body", None), "")
+                archive["http"].setdefault(event["key"], []).append(event)
+            elif kind == "model":
+                archive["model"].setdefault(event["key"], []).append(event)
+    archive["requests"] = _session_offsets(requests_)
+    return archive
+
+
+def _session_offsets(events: List[Dict]) -> List[Dict]:
+    """
+    Turn absolute arrival times into offsets on one timeline, sorted. Each
+    recording session is shifted to start when the previous ones ended, so
+    downtime between sessions is not replayed; sessions that overlapped in
+    time (several processes recording at once) keep their relative timing.
+    """
+    sessions: Dict = {}
+    for event in events:
+        sessions.setdefault(event.pop("session", 0), []).append(event)
+    timeline, shift, last_end = [], None, None
+    for started in sorted(sessions):
+        group = sessions[started]
+        end = max(e["t"] for e in group)
+        if shift is None:
+            shift, last_end = started, started
+        elif started > last_end:
+            shift += started - last_end  # cut the idle gap
+        for event in group:
+            event["t"] = round(event["t"] - shift, 3)
+        timeline.extend(group)
+        last_end = max(last_end, end)
+    timeline.sort(key=lambda e: e["t"])
+    return timeline
+
+
+class RecordedResponse:
+    """The parts of requests.Response the scraper and RapidAIAgent use."""
+
+    def __init__(self, url: str, status_code: int, text: str):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} (recorded) for {self.url}", response=self)
+
+
+class _RequestsProxy:
+    """Stands in for the `requests` module inside scrapper / social_media."""
+
+    def __init__(self, traffic):
+        self._traffic = traffic
+
+    def get(self, url, params=None, **kwargs):
+        return self._traffic.http_get(url, params, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+
+class TrafficRecorder:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._bodies = set()
+        # Arrival times are absolute and tagged with this session's start, so
+        # a second recording appended to the archive doesn't restart at zero
+        self._session = round(time.time(), 3)
+        atexit.register(self.close)
+
+    def _write(self, event: dict, flush: bool = False):
+        with self._lock:
+            self._file.write(json.dumps(event) + "\n")
+            if flush:
+                self._file.flush()
+
+    def record_request(self, endpoint: str, payload: dict):
+        # Flushed so an archive is usable even if the server is killed
+        self._write({"type": "request", "t": round(time.time(), 3), "session": self._session,
+                     "endpoint": endpoint, "payload": payload}, flush=True)
+
+    def http_get(self, url, params=None, **kwargs):
+        started = time.perf_counter()
+        event = {"type": "http", "key": http_key(url, params), "url": _redact(url)}
+        try:
+            resp = requests.get(url, params=params, **kwargs)
+        except requests.RequestException as e:
+            event.update(error=f"{type(e).__name__}: {e}", elapsed=round(time.perf_counter() - started, 3))
+            self._write(event)
+            raise
+        body = hashlib.sha1(resp.content).hexdigest()
+        event.update(status=resp.status_code, body=body, elapsed=round(time.perf_counter() - started, 3))
+        with self._lock:
+            # The body goes first so readers never see a reference to an unwritten body
+            if body not in self._bodies:
+                self._bodies.add(body)
+                self._file.write(json.dumps({"type": "body", "hash": body, "text": resp.text}) + "\n")
+            self._file.write(json.dumps(event) + "\n")
+        return resp
+
+    def model_run(self, run, model, prompt, timeout, stats=None, **options):
+        started = time.perf_counter()
+        result = run(prompt, timeout, stats=stats, **options)
+        self._record_model(model, prompt, options, result, time.perf_counter() - started)
+        return result
+
+    async def amodel_run(self, arun, model, prompt, timeout, stats=None, **options):
+        started = time.perf_counter()
+        result = await arun(prompt, timeout, stats=stats, **options)
+        self._record_model(model, prompt, options, result, time.perf_counter() - started)
+        return result
+
+    def _record_model(self, model, prompt, options, result, elapsed):
+        self._write({"type": "model", "key": model_key(model, prompt, options),
+                     "prompt": prompt, "max_tokens": options.get("max_tokens") or model.max_tokens, "result": result,
+                     "elapsed": round(elapsed, 3)})
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class TrafficPlayer:
+    def __init__(self, path: str, latency_scale: float = 1.0, replay_model: bool = False):
+        self.path = path
+        self.latency_scale = latency_scale
+        self.replay_model = replay_model
+        self.archive = read_archive(path)
+        self._cursor: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.misses = {"http": 0, "model": 0}
+
+    def _next(self, kind: str, key: str) -> Optional[dict]:
+        # Repeated calls walk through the recorded responses, then stay on the last one
+        events = self.archive[kind].get(key)
+        if not events:
+            with self._lock:
+                self.misses[kind] += 1
+            return None
+        with self._lock:
+            n = self._cursor.get(f"{kind} {key}", 0)
+            self._cursor[f"{kind} {key}"] = n + 1
+        return events[min(n, len(events) - 1)]
+
+    def record_request(self, endpoint: str, payload: dict):
+        pass
+
+    def http_get(self, url, params=None, **kwargs):
+        event = self._next("http", http_key(url, params))
+        if event is None:
+            print(f"Replay: no recorded response for {_redact(url)}")
+            return RecordedResponse(url, 200, "")
+        time.sleep(event["elapsed"] * self.latency_scale)
+        if "error" in event:
+            raise requests.ConnectionError(f"{event['error']} (recorded)")
+        return RecordedResponse(url, event["status"], event["text"])
+
+    def _model_event(self, model, prompt, stats, options) -> Optional[dict]:
+        if not self.replay_model:
+            return None
+        event = self._next("model", model_key(model, prompt, options))
+        if event is not None and stats is not None:
+            stats["calls"] = stats.get("calls", 0) + 1
+        return event
+
+    def model_run(self, run, model, prompt, timeout, stats=None, **options):
+        event = self._model_event(model, prompt, stats, options)
+        if event is None:
+            return run(prompt, timeout, stats=stats, **options)
+        time.sleep(event["elapsed"] * self.latency_scale)
+        return dict(event["result"])
+
+    async def amodel_run(self, arun, model, prompt, timeout, stats=None, **options):
+        event = self._model_event(model, prompt, stats, options)
+        if event is None:
+            return await arun(prompt, timeout, stats=stats, **options)
+        await asyncio.sleep(event["elapsed"] * self.latency_scale)
+        return dict(event["result"])
+
+    def close(self):
+        pass
+
+
+def traffic_from_environment():
+    """TrafficRecorder / TrafficPlayer from TRAFFIC_RECORD / TRAFFIC_REPLAY, or None."""
+    if os.environ.get("TRAFFIC_RECORD"):
+        return TrafficRecorder(os.environ["TRAFFIC_RECORD"])
+    if os.environ.get("TRAFFIC_REPLAY"):
+        return TrafficPlayer(
+            os.environ["TRAFFIC_REPLAY"],
+            latency_scale=float(os.environ.get("TRAFFIC_REPLAY_LATENCY", 1.0)),
+            replay_model=os.environ.get("TRAFFIC_REPLAY_MODEL") == "1",
+        )
+    return None
+
+
+def instrument_http(traffic):
+    """Route the scraper's and RapidAIAgent's HTTP calls through `traffic`."""
+    import scrapper
+    import social_media
+
+    scrapper.requests = social_media.requests = _RequestsProxy(traffic)
+
+
+def instrument_model(model, traffic):
+    """
+    Route a GGUFModel's llama.cpp runs, threaded (_run) and asyncio (_arun),
+    through `traffic`; other models are left alone.
+    """
+    run = getattr(model, "_run", None)
+    if run is None:
+        return model
+
+    def traced_run(prompt, timeout, stats=None, **options):
+        return traffic.model_run(run, model, prompt, timeout, stats=stats, **options)
+
+    model._run = traced_run
+
+    arun = getattr(model, "_arun", None)
+    if arun is not None:
+        async def traced_arun(prompt, timeout, stats=None, **options):
+            return await traffic.amodel_run(arun, model, prompt, timeout, stats=stats, **options)
+
+        model._arun = traced_arun
+    return model
+
+
+# ---------------------------------------------------------------------- #
+#  REPLAY CLIENT                                                         #
+# ---------------------------------------------------------------------- #
+def latency_report(latencies: List[float], errors: int, elapsed: float) -> dict:
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "mean_s": round(statistics.mean(latencies), 3) if latencies else 0.0,
+        "p50_s": round(percentile(latencies, 50), 3),
+        "p90_s": round(percentile(latencies, 90), 3),
+        "p95_s": round(percentile(latencies, 95), 3),
+        "p99_s": round(percentile(latencies, 99), 3),
+        "max_s": round(max(latencies), 3) if latencies else 0.0,
+    }
+
+
+def replay(path: str, target: str, speed: float = 1.0, limit: Optional[int] = None,
+           timeout: int = 900) -> dict:
+    """
+    Re-issue the recorded requests against `target`, open loop: each one is
+    sent at its recorded arrival offset divided by `speed`, whether or not
+    earlier ones have finished.
+    """
+    events = read_archive(path)["requests"][:limit]
+    if not events:
+        raise ValueError(f"No requests recorded in {path}")
+    t0 = events[0]["t"]
+
+    def send(event):
+        start = time.perf_counter()
+        try:
+            resp = requests.post(target + event["endpoint"], json=event["payload"], timeout=timeout, stream=True)
+            for _ in resp.iter_content(chunk_size=None):
+                pass  # batch responses stream; latency is until the last line
+            ok = resp.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return event["endpoint"], ok, time.perf_counter() - start
+
+    started = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(max_workers=max(1, len(events))) as pool:
+        for event in events:
+            delay = (event["t"] - t0) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(send, event))
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - started
+
+    report = latency_report([lat for _, ok, lat in results if ok], sum(1 for _, ok, _ in results if not ok), elapsed)
+    report["speed"] = speed
+    report["by_endpoint"] = {}
+    for endpoint in sorted({e for e, _, _ in results}):
+        subset = [(ok, lat) for e, ok, lat in results if e == endpoint]
+        report["by_endpoint"][endpoint] = latency_report(
+            [lat for ok, lat in subset if ok], sum(1 for ok, _ in subset if not ok), elapsed
+        )
+    return report
+
+
+COLUMNS = ["requests", "errors", "throughput_rps", "mean_s", "p50_s", "p90_s", "p95_s", "p99_s", "max_s"]
+
+
+def print_reports(reports: Dict[str, dict]):
+    print(f"{'':<16}" + "".join(f"{c:>15}" for c in COLUMNS))
+    for name, report in reports.items():
+        print(f"{name:<16}" + "".join(f"{report[c]:>15}" for c in COLUMNS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded research traffic")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("replay", help="Re-issue recorded requests against a server")
+    p.add_argument("archive")
+    p.add_argument("--target", default="http://localhost:5000")
+    p.add_argument("--speed", type=float, default=1.0, help="Arrival rate multiplier (2 = twice as fast)")
+    p.add_argument("--limit", type=int, help="Only replay the first N requests")
+    p.add_argument("--timeout", type=int, default=900)
+    p.add_argument("--save", help="Write the latency report as JSON, for `compare`")
+
+    p = sub.add_parser("compare", help="Compare saved replay reports")
+    p.add_argument("reports", nargs="+")
+
+    p = sub.add_parser("info", help="Summarize an archive")
+    p.add_argument("archive")
+
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        report = replay(args.archive, args.target.rstrip("/"), args.speed, args.limit, args.timeout)
+        print_reports({"all": report, **report["by_endpoint"]})
+        if args.save:
+            with open(args.save, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"Saved report to {args.save}")
+    elif args.command == "compare":
+        reports = {}
+        for path in args.reports:
+            with open(path, encoding="utf-8") as f:
+                reports[os.path.splitext(os.path.basename(path))[0]] = json.load(f)
+        print_reports(reports)
+    else:
+        archive = read_archive(args.archive)
+        span = archive["requests"][-1]["t"] - archive["requests"][0]["t"] if archive["requests"] else 0
+        print(f"{len(archive['requests'])} requests over {span:.0f}s, "
+              f"{sum(map(len, archive['http'].values()))} HTTP responses ({len(archive['http'])} unique), "
+              f"{sum(map(len, archive['model'].values()))} model calls")
+
+
+if __name__ == "__main__":
+    main()
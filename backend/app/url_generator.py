@@ -1,18 +1,52 @@
 # url_generator.py
+import calendar
+import time
 import urllib.parse
+from datetime import timedelta
 
-def generate_urls(query: str) -> list:
+from date_range import date_bounds
+
+def generate_urls(query: str, date_filter: dict = None) -> list:
     """
     Generates a list of real and scrapable URLs based on the query.
+    If `date_filter` is given, the range is encoded into the search URLs
+    for engines that support it (Google, Google News, HN Algolia).
     """
     encoded_query = urllib.parse.quote_plus(query)
+    start, end = date_bounds(date_filter)
+
+    google_url = f"https://www.google.com/search?q={encoded_query}"
+    news_query = query
+    hn_url = f"https://hn.algolia.com/?q={encoded_query}"
+
+    if start or end:
+        # Google: custom date range (M/D/YYYY, both ends inclusive)
+        tbs = "cdr:1"
+        if start:
+            tbs += f",cd_min:{start.month}/{start.day}/{start.year}"
+        if end:
+            tbs += f",cd_max:{end.month}/{end.day}/{end.year}"
+        google_url += "&tbs=" + urllib.parse.quote(tbs)
+
+        # Google News: search operators (`before:` is exclusive)
+        if start:
+            news_query += f" after:{start.isoformat()}"
+        if end:
+            news_query += f" before:{(end + timedelta(days=1)).isoformat()}"
+
+        # HN Algolia: custom range as unix timestamps
+        date_start = calendar.timegm(start.timetuple()) if start else 0
+        date_end = calendar.timegm((end + timedelta(days=1)).timetuple()) - 1 if end else int(time.time())
+        hn_url += f"&dateRange=custom&dateStart={date_start}&dateEnd={date_end}"
 
+    # Reddit and Medium search have no absolute date range; their results
+    # are filtered after scraping using the extracted publication date.
     urls = [
-        f"https://www.google.com/search?q={encoded_query}",
-        f"https://news.google.com/search?q={encoded_query}",
+        google_url,
+        f"https://news.google.com/search?q={urllib.parse.quote_plus(news_query)}",
         f"https://www.reddit.com/search/?q={encoded_query}",
         f"https://medium.com/search?q={encoded_query}",
-        f"https://hn.algolia.com/?q={encoded_query}"
+        hn_url,
     ]
 
     print("\nURLs to be scraped:")
@@ -0,0 +1,217 @@
+"""
+Distributed research worker.
+
+Claims jobs from the broker, runs them with a local GGUFModel / scraper,
+heartbeats while they run and posts the results:
+
+    python worker.py --broker /shared/broker.db
+    python worker.py --kinds scrape            # scrape-only node
+
+Start as many workers as the host has capacity for (see the autotuned
+`max_concurrent_generations`). API nodes use the same broker file by
+setting RESEARCH_BROKER.
+
+    python worker.py --self-test
+
+runs a local broker with several worker processes, kills one mid-job and
+checks that every job still completes.
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from broker import DEFAULT_BROKER_PATH, DEFAULT_LEASE, Broker, JobFailed
+
+MODEL_PATH = r"C:\Users\jashp\Downloads\Deep Research Agent\mistral-7b-instruct-v0.2.Q4_K_S.gguf"
+LLAMA_CLI_BIN = r"C:\Users\jashp\Downloads\Deep Research Agent\llama.cpp\build\bin\Release\llama-cli.exe"
+DRAFT_MODEL_PATH = os.environ.get("DRAFT_MODEL_PATH")
+
+ALL_KINDS = ["generate", "scrape"]
+GENERATE_METHODS = {"generate_text", "enhanced_generation", "structured_generation"}
+
+
+def load_handlers(kinds):
+    """Build the handler for each job kind; heavy imports only for kinds this worker serves."""
+    handlers = {}
+
+    if "generate" in kinds:
+        from model import GGUFModel
+        from autotune import load_host_profile, model_settings
+
+        model = GGUFModel(
+            model_path=os.environ.get("MODEL_PATH", MODEL_PATH),
+            llama_cli_path=os.environ.get("LLAMA_CLI_PATH", LLAMA_CLI_BIN),
+            temperature=0.7,
+            timeout=600,
+            draft_model_path=DRAFT_MODEL_PATH,
+            **model_settings(load_host_profile()),
+        )
+
+        def generate(payload):
+            method = payload["method"]
+            if method not in GENERATE_METHODS:
+                raise ValueError(f"Unsupported model method: {method}")
+            stats = {}
+            output = getattr(model, method)(*payload.get("args", []), stats=stats, **payload.get("kwargs", {}))
+            return {"output": output, "stats": stats}
+
+        handlers["generate"] = generate
+
+    if "scrape" in kinds:
+        from scrapper import scrape_source
+        from doc_index import DocumentIndex
+        from segment_store import open_store
+
+        doc_index = DocumentIndex()
+        raw_store = open_store()  # shared with the API and the other workers on this host
+
+        def scrape(payload):
+            text, dropped = scrape_source(payload["url"], payload.get("date_filter"), doc_index, raw_store)
+            return {"text": text, "dropped": dropped}
+
+        handlers["scrape"] = scrape
+
+    if "echo" in kinds:
+        # Used by --self-test: sleep, then return the payload
+        def echo(payload):
+            time.sleep(payload.get("sleep", 0))
+            return {"echo": payload, "pid": os.getpid()}
+
+        handlers["echo"] = echo
+
+    return handlers
+
+
+def run_worker(broker: Broker, kinds, idle_sleep: float = 0.2):
+    handlers = load_handlers(kinds)
+    worker_id = broker.register_worker(kinds)
+    print(f"Worker {worker_id} serving {', '.join(kinds)}")
+
+    stopping = threading.Event()
+    current = {"job": None}
+
+    def heartbeat_loop():
+        # Keeps the lease on the running job alive; a worker that dies stops this too
+        while not stopping.wait(broker.lease / 3):
+            try:
+                if not broker.heartbeat(worker_id, current["job"]):
+                    print(f"Lost lease on job {current['job']}")
+            except Exception as e:
+                print(f"Heartbeat failed: {e}")
+
+    threading.Thread(target=heartbeat_loop, name="heartbeat", daemon=True).start()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+
+    try:
+        while not stopping.is_set():
+            job = broker.claim(worker_id, list(handlers))
+            if job is None:
+                stopping.wait(idle_sleep)
+                continue
+            current["job"] = job["id"]
+            try:
+                result = handlers[job["kind"]](job["payload"])
+                broker.complete(job["id"], worker_id, result)
+            except Exception as e:
+                traceback.print_exc()
+                broker.fail(job["id"], worker_id, f"{type(e).__name__}: {e}")
+            finally:
+                current["job"] = None
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stopping.set()
+        broker.unregister_worker(worker_id)
+        print(f"Worker {worker_id} stopped")
+
+
+# ---------------------------------------------------------------------- #
+#  SELF-TEST                                                             #
+# ---------------------------------------------------------------------- #
+def self_test(workers: int = 3, jobs: int = 30, job_seconds: float = 0.3, lease: float = 2.0) -> bool:
+    """Local broker + worker processes; kill one mid-job and check every job completes."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "broker.db")
+        broker = Broker(path, lease=lease)
+        procs = [
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--broker", path,
+                 "--kinds", "echo", "--lease", str(lease)],
+                stdout=subprocess.DEVNULL,
+            )
+            for _ in range(workers)
+        ]
+        try:
+            started = time.perf_counter()
+            job_ids = [broker.submit("echo", {"n": n, "sleep": job_seconds}) for n in range(jobs)]
+
+            # Kill a worker while it holds a job
+            victim = None
+            while victim is None and time.perf_counter() - started < 30:
+                running = [w for w in broker.stats()["workers"] if w["current_job"]]
+                if running:
+                    victim = next((p for p in procs if f"-{p.pid}-" in running[0]["id"]), None)
+                time.sleep(0.05)
+            if victim is not None:
+                victim.kill()  # SIGKILL on POSIX, TerminateProcess on Windows
+                print(f"Killed worker pid {victim.pid} mid-job")
+
+            results, failures = [], 0
+            for job_id in job_ids:
+                try:
+                    results.append(broker.wait(job_id, timeout=60))
+                except (JobFailed, TimeoutError) as e:
+                    failures += 1
+                    print(f"Job {job_id} failed: {e}")
+            elapsed = time.perf_counter() - started
+
+            stats = broker.stats()
+            ok = (
+                victim is not None
+                and failures == 0
+                and sorted(r["echo"]["n"] for r in results) == list(range(jobs))
+                and stats["retried"] >= 1
+            )
+            per_pid = {}
+            for r in results:
+                per_pid[r["pid"]] = per_pid.get(r["pid"], 0) + 1
+            print(f"{len(results)}/{jobs} jobs done in {elapsed:.1f}s, {stats['retried']} retried "
+                  f"after the kill, per worker: {per_pid}")
+            print("SELF-TEST PASSED" if ok else "SELF-TEST FAILED")
+            return ok
+        finally:
+            for p in procs:
+                if p.poll() is None:
+                    p.terminate()
+            for p in procs:
+                p.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deep Research distributed worker")
+    parser.add_argument("--broker", default=DEFAULT_BROKER_PATH, help="Broker database path")
+    parser.add_argument("--kinds", default=",".join(ALL_KINDS), help="Comma-separated job kinds to serve")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE, help="Seconds without heartbeat before a job is retried")
+    parser.add_argument("--self-test", action="store_true", help="Run the local multi-process self-test")
+    parser.add_argument("--workers", type=int, default=3, help="Worker processes for --self-test")
+    parser.add_argument("--jobs", type=int, default=30, help="Jobs for --self-test")
+    args = parser.parse_args()
+
+    if args.self_test:
+        sys.exit(0 if self_test(workers=args.workers, jobs=args.jobs) else 1)
+
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()]
+    run_worker(Broker(args.broker, lease=args.lease), kinds)
+
+
+if __name__ == "__main__":
+    main()
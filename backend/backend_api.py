@@ -1,7 +1,9 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import asyncio
+import atexit
 import logging
+import threading
 from typing import Dict, Any
 import sys
 import os
@@ -9,6 +11,7 @@ import os
 # Add the MCP client (fix import path)
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from mcp_client import DeepResearchMCPClient
+from tracing import configure, remote_parent, span
 
 app = Flask(__name__)
 CORS(app)
@@ -17,14 +20,31 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("deep-research-api")
 
+# Traces start here (TRACE_FILE / OTLP_ENDPOINT, see tracing.py)
+configure("backend-api")
+
+# One event loop for the process, on its own thread. The MCP client's stdio
+# connection lives on it; request threads submit coroutines to it instead of
+# building and closing a loop per request.
+loop = asyncio.new_event_loop()
+threading.Thread(target=loop.run_forever, name="mcp-client-loop", daemon=True).start()
+
+def run_async(coro, timeout=None):
+    """Run a coroutine on the shared loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
 # Global MCP client
 mcp_client = None
+mcp_client_lock = threading.Lock()
 
 def get_mcp_client():
-    """Get or create MCP client instance"""
+    """Get or create the MCP client instance, connected once on the shared loop"""
     global mcp_client
-    if mcp_client is None:
-        mcp_client = DeepResearchMCPClient()
+    with mcp_client_lock:
+        if mcp_client is None:
+            client = DeepResearchMCPClient()
+            run_async(client.connect())
+            mcp_client = client
     return mcp_client
 
 @app.route('/api/research', methods=['POST'])
@@ -36,39 +56,46 @@ def research_query():
         start_date = data.get('start_date', '').strip()
         end_date = data.get('end_date', '').strip()
         max_sources = data.get('max_sources', 5)
+        structured = bool(data.get('structured', False))
 
         logger.info(f"Received research request: {user_query}")
 
         if not user_query:
             return jsonify({'error': 'Query cannot be empty'}), 400
 
-        # Use asyncio to call the MCP client
-        async def perform_research():
-            client = get_mcp_client()
-            result = await client.research(
-                query=user_query,
-                start_date=start_date if start_date else None,
-                end_date=end_date if end_date else None,
-                max_sources=max_sources
-            )
-            return result
-
-        # Run async function
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        try:
-            result = loop.run_until_complete(perform_research())
+        client = get_mcp_client()
+        research = client.structured_research if structured else client.research
+
+        async def perform_research(traceparent):
+            # The loop thread has its own context: carry the API span over
+            with remote_parent(traceparent):
+                return await research(
+                    query=user_query,
+                    start_date=start_date if start_date else None,
+                    end_date=end_date if end_date else None,
+                    max_sources=max_sources,
+                    priority="interactive",  # UI requests go ahead of batch work
+                    session_id=data.get('session_id'),
+                    force_refresh=bool(data.get('force_refresh', False))
+                )
+
+        # A traceparent header from the caller joins its trace; otherwise one starts here
+        with remote_parent(request.headers.get('traceparent')), \
+                span("api.research", query=user_query, max_sources=max_sources, structured=structured) as trace:
+            result = run_async(perform_research(trace.traceparent))
             logger.info(f"Research completed successfully")
-        finally:
-            loop.close()
 
-        return jsonify({
+        response = {
             'success': True,
             'final_summary': result,
             'query': user_query,
             'sources_requested': max_sources
-        })
+        }
+        if structured:
+            response.update(result)
+        if trace.traceparent:
+            response['trace_id'] = trace.traceparent.split('-')[1]
+        return jsonify(response)
 
     except Exception as e:
         logger.error(f"Research error: {e}")
@@ -78,17 +105,7 @@ def research_query():
 def get_capabilities():
     """Get MCP server capabilities"""
     try:
-        async def fetch_capabilities():
-            client = get_mcp_client()
-            return await client.get_capabilities()
-
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        try:
-            capabilities = loop.run_until_complete(fetch_capabilities())
-        finally:
-            loop.close()
+        capabilities = run_async(get_mcp_client().get_capabilities())
 
         return jsonify({
             'success': True,
@@ -108,18 +125,14 @@ def health_check():
         'version': '1.0.0'
     })
 
-# Cleanup on shutdown
-@app.teardown_appcontext
-def cleanup_mcp_client(error):
+# Cleanup on shutdown (not per request: the connection is reused)
+@atexit.register
+def cleanup_mcp_client():
     """Cleanup MCP client connections"""
-    global mcp_client
     if mcp_client:
         try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(mcp_client.disconnect())
-            loop.close()
-        except:
+            run_async(mcp_client.disconnect(), timeout=10)
+        except Exception:
             pass  # Ignore cleanup errors
 
 if __name__ == '__main__':
@@ -6,9 +6,11 @@ Using exact main.py logic with categorized summaries and fact check prompt
 """
 
 import asyncio
+import json
 import logging
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 from mcp.server import Server
 from mcp.server.models import InitializationOptions
 import mcp.server.stdio
@@ -21,10 +23,24 @@ from mcp.types import (
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from model import GGUFModel
-    from scrapper import scrape_multiple_urls
+    from model import GGUFModel, render_facts, summarize_stats
+    from scrapper import scrape_source
     from social_media import RapidAIAgent
     from url_generator import generate_urls
+    from batch_research import run_batch
+    from date_range import build_date_filter
+    from doc_index import DocumentIndex, categorize_scraped_data, source_category
+    from segment_store import open_store
+    from autotune import load_host_profile, model_settings
+    from admission import BATCH, Overloaded, from_environment, parse_priority
+    from sessions import SessionStore, summary_key
+    from source_gain import adaptive_gain
+    from report_cache import ReportCache
+    from broker import Broker, RemoteModel, remote_scrape_source
+    from model_manager import warm_up
+    from content_store import EMPTY_HASH, ContentStore
+    from profiling import ProfileStore, RequestProfiler
+    from tracing import configure as configure_tracing, remote_parent, span
 except ImportError as e:
     print(f"Error importing modules: {e}")
     sys.exit(1)
@@ -34,52 +50,113 @@ logger = logging.getLogger("deep-research-mcp")
 
 MODEL_PATH = r"C:\Users\jashp\Downloads\Deep Research Agent\mistral-7b-instruct-v0.2.Q4_K_S.gguf"
 LLAMA_CLI_BIN = r"C:\Users\jashp\Downloads\Deep Research Agent\llama.cpp\build\bin\Release\llama-cli.exe"
+DRAFT_MODEL_PATH = os.environ.get("DRAFT_MODEL_PATH")  # optional draft model for speculative decoding
+RESEARCH_BROKER = os.environ.get("RESEARCH_BROKER")  # set to run generation and scraping on worker.py nodes
 RAPIDAI_API_KEY = "YOUR API"
 
 model = None
 rapid_agent = None
+doc_index = None
+raw_store = None
+admission = None
+report_cache = None
+broker = None
+sessions = SessionStore()
+# Requests waiting for an admission slot block one of these threads each
+admission_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="admission")
+# Texts and summaries the fine-grained tools hand out by content hash
+content_store = ContentStore()
+STAGE_SCRAPE_CONCURRENCY = 4
+# In-flight draft answers by content-store key, shared by concurrent summarize calls
+initial_drafts = {}
+profiles = ProfileStore()  # opt-in request profiles, see research://profiles
+
+def scrape(url, date_filter):
+    """scrape_source() locally, or on a worker node in distributed mode."""
+    if broker is not None:
+        return remote_scrape_source(broker, url, date_filter)
+    return scrape_source(url, date_filter, doc_index, raw_store)
+
+def select_sources(query, date_filter, max_sources):
+    """Pick the URLs to scrape: fresh indexed documents first, then RapidAI / url_generator."""
+    # Fresh documents already in the local index are used first; the
+    # network only fills the remaining source slots.
+    indexed = doc_index.search(query, limit=max_sources)
+    logger.info(f"Retrieved {len(indexed)} fresh documents from the local index")
+
+    urls, aggregated_content = [], ""
+    dropped_by_date = 0
+    try:
+        with span("rapidai.fetch", max_results=max_sources) as trace:
+            rapidai_data = rapid_agent.fetch_data(query, date_range=date_filter, max_results=max_sources)
+            trace.set(urls=len(rapidai_data.get("urls", [])))
+        urls = rapidai_data.get("urls", [])
+        aggregated_content = rapidai_data.get("content", "")
+        dropped_by_date += rapidai_data.get("dropped_by_date", 0)
+        logger.info(f"Retrieved {len(urls)} URLs from RapidAI")
+    except Exception as e:
+        logger.warning(f"RapidAI fetch failed: {e}")
 
-def categorize_scraped_data(urls, scraped_texts, rapidai_content=""):
-    categorized = {}
-    if rapidai_content.strip():
-        categorized["RapidAI"] = [rapidai_content]
-    for url, text in zip(urls, scraped_texts):
-        if not text.strip():
-            continue
-        if "google.com/search" in url:
-            source = "Google Search"
-        elif "news.google.com" in url:
-            source = "Google News"
-        elif "wikipedia.org" in url:
-            source = "Wikipedia"
-        elif "reddit.com" in url:
-            source = "Reddit"
-        elif "medium.com" in url:
-            source = "Medium"
-        elif "bbc.com" in url or "cnn.com" in url:
-            source = "News Site"
-        else:
-            source = "Other"
-        categorized.setdefault(source, []).append(text)
-    return categorized
+    if not urls:
+        logger.info("Generating URLs using url_generator...")
+        with span("generate_urls"):
+            urls = generate_urls(query, date_filter)
+
+    source_urls = [doc["url"] for doc in indexed]
+    for url in urls:
+        if len(source_urls) >= max_sources:
+            break
+        if url not in source_urls:
+            source_urls.append(url)
+    return source_urls, aggregated_content, dropped_by_date
 
 def initialize_components():
-    global model, rapid_agent
+    global model, rapid_agent, doc_index, raw_store, admission, report_cache, broker
     try:
-        model = GGUFModel(
-            model_path=MODEL_PATH,
-            llama_cli_path=LLAMA_CLI_BIN,
-            threads=6,
-            max_tokens=256,
-            temperature=0.7,
-            timeout=600,
-        )
-        rapid_agent = RapidAIAgent(RAPIDAI_API_KEY)
+        # threads / max_tokens / ctx / batch / mmap come from `python autotune.py`
+        profile = load_host_profile()
+        settings = model_settings(profile)
+        if RESEARCH_BROKER:
+            # Distributed mode: this node only orchestrates, workers run the model
+            broker = Broker(RESEARCH_BROKER)
+            model = RemoteModel(broker)
+            logger.info(f"Distributed mode: jobs go through broker {RESEARCH_BROKER}")
+        else:
+            model = GGUFModel(
+                model_path=MODEL_PATH,
+                llama_cli_path=LLAMA_CLI_BIN,
+                temperature=0.7,
+                timeout=600,
+                draft_model_path=DRAFT_MODEL_PATH,
+                **settings,
+            )
+        if profile:
+            logger.info(f"Loaded host profile for {profile.get('host')}: {profile.get('settings')}")
+        if admission is None:
+            admission = from_environment(profile, settings["threads"])
+            logger.info(f"Admission control: {admission.capacity} concurrent research request(s)")
+        if raw_store is None:
+            raw_store = open_store()
+        rapid_agent = RapidAIAgent(RAPIDAI_API_KEY, store=raw_store)
+        doc_index = DocumentIndex()
+        report_cache = ReportCache()
         logger.info("Components initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize components: {e}")
         raise
 
+async def admit(priority):
+    """Wait for an admission slot without blocking the event loop."""
+    future = admission_executor.submit(admission.acquire, priority)
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        # Call was cancelled while queued: hand the slot back once it is granted
+        future.add_done_callback(
+            lambda f: f.result().release() if not f.cancelled() and f.exception() is None else None
+        )
+        raise
+
 
 server = Server("deep-research-agent")
 
@@ -91,7 +168,19 @@ async def handle_list_resources() -> list[Resource]:
             name="Research Capabilities",
             description="Available research tools and data sources",
             mimeType="text/plain",
-        )
+        ),
+        Resource(
+            uri="research://admission",
+            name="Admission Control",
+            description="Research capacity, queue depth and wait times",
+            mimeType="application/json",
+        ),
+        Resource(
+            uri="research://profiles",
+            name="Request Profiles",
+            description="Recent profiled deep_research calls (duration, samples, peak memory)",
+            mimeType="application/json",
+        ),
     ]
 
 @server.read_resource()
@@ -123,6 +212,10 @@ async def handle_read_resource(uri: str) -> str:
    - Professional formatting
    - Comprehensive research report
 """
+    if uri == "research://admission":
+        return json.dumps(admission.stats() if admission else {})
+    if uri == "research://profiles":
+        return json.dumps(profiles.summary())
     raise ValueError(f"Unknown resource: {uri}")
 
 @server.list_tools()
@@ -138,87 +231,560 @@ async def handle_list_tools() -> list[Tool]:
                     "start_date": {"type": "string", "description": "Optional start date in YYYY-MM-DD format"},
                     "end_date": {"type": "string", "description": "Optional end date in YYYY-MM-DD format"},
                     "max_sources": {"type": "integer", "description": "Maximum number of sources to scrape (default: 5)", "default": 5},
+                    "structured": {"type": "boolean", "description": "Return schema-constrained {fact, source_url} items as JSON alongside the text (default: false)", "default": False},
+                    "priority": {"type": "string", "enum": ["interactive", "batch"], "description": "Scheduling class when the server is busy (default: batch)", "default": "batch"},
+                    "session_id": {"type": "string", "description": "Continue a research session: reuse its fetched documents and unchanged summaries for a follow-up query"},
+                    "force_refresh": {"type": "boolean", "description": "Bypass the report cache and research again (default: false)", "default": False},
+                    "profile": {"type": "boolean", "description": "Append a CPU (collapsed stacks) and memory (top allocation sites) profile of this call as JSON (default: false)", "default": False},
+                    "adaptive": {"type": "boolean", "description": "Stop fetching and summarizing sources once they add little new query coverage or content (default: false)", "default": False},
+                    "min_gain": {"type": "number", "description": "Adaptive mode: minimum marginal gain (0-1) for a source to be kept (default: 0.1)", "default": 0.1},
+                },
+                "required": ["query"],
+            },
+        ),
+        Tool(
+            name="batch_research",
+            description="Research many queries in one job, sharing URL fetches across the batch",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "queries": {"type": "array", "items": {"type": "string"}, "description": "Research questions or topics"},
+                    "max_sources": {"type": "integer", "description": "Maximum number of sources to scrape per query (default: 5)", "default": 5},
+                },
+                "required": ["queries"],
+            },
+        ),
+        Tool(
+            name="generate_urls",
+            description="Stage 1 of deep_research: pick the source URLs for a query (plus RapidAI social content)",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "The research question or topic"},
+                    "start_date": {"type": "string", "description": "Optional start date in YYYY-MM-DD format"},
+                    "end_date": {"type": "string", "description": "Optional end date in YYYY-MM-DD format"},
+                    "max_sources": {"type": "integer", "description": "Maximum number of URLs (default: 5)", "default": 5},
+                    "known_hashes": {"type": "array", "items": {"type": "string"}, "description": "Content hashes the client already holds; their text is left out of the response"},
                 },
                 "required": ["query"],
             },
         ),
+        Tool(
+            name="scrape",
+            description="Stage 2: fetch URLs concurrently and return cleaned, date-filtered text with content hashes. Sends progress per URL",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "urls": {"type": "array", "items": {"type": "string"}, "description": "URLs to fetch"},
+                    "start_date": {"type": "string", "description": "Optional start date in YYYY-MM-DD format"},
+                    "end_date": {"type": "string", "description": "Optional end date in YYYY-MM-DD format"},
+                    "known_hashes": {"type": "array", "items": {"type": "string"}, "description": "Content hashes the client already holds; their text is left out of the response"},
+                },
+                "required": ["urls"],
+            },
+        ),
+        Tool(
+            name="categorize",
+            description="Stage 3: group documents by source category. Documents without text or hash are grouped by URL only, so clients can plan per-category work before fetching",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "documents": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "url": {"type": "string"},
+                                "source": {"type": "string", "description": "Explicit category (e.g. RapidAI)"},
+                                "content_hash": {"type": "string"},
+                                "text": {"type": "string"},
+                            },
+                        },
+                    },
+                },
+                "required": ["documents"],
+            },
+        ),
+        Tool(
+            name="summarize",
+            description="Stage 4: fact-check summary per category. Categories map to content hashes (or {text} objects). Summaries are cached by input hash; pass known_hashes to skip ones you already hold. Sends progress per category",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "The research question or topic"},
+                    "categories": {"type": "object", "description": "Category name -> list of content hashes or {\"text\": ...} objects"},
+                    "structured": {"type": "boolean", "description": "Schema-constrained {fact, source_url} items (default: false)", "default": False},
+                    "max_tokens": {"type": "integer", "description": "Token budget per summary (default: 400)", "default": 400},
+                    "priority": {"type": "string", "enum": ["interactive", "batch"], "description": "Scheduling class when the server is busy (default: batch)", "default": "batch"},
+                    "known_hashes": {"type": "array", "items": {"type": "string"}, "description": "Summary hashes the client already holds; those categories are not generated or returned"},
+                },
+                "required": ["query", "categories"],
+            },
+        ),
     ]
 
 @server.call_tool()
 async def handle_call_tool(name: str, arguments: dict | None) -> list[TextContent]:
+    # Continue the caller's trace: DeepResearchMCPClient sends a traceparent in _meta
+    meta = server.request_context.meta
+    with remote_parent(getattr(meta, "traceparent", None)), span(f"tool.{name}"):
+        return await dispatch_tool(name, arguments)
+
+async def dispatch_tool(name: str, arguments: dict | None) -> list[TextContent]:
     if name == "deep_research":
+        if (arguments or {}).get("profile"):
+            return await profiled(perform_deep_research, arguments)
         return await perform_deep_research(arguments or {})
+    elif name == "batch_research":
+        return await perform_batch_research(arguments or {})
+    elif name == "generate_urls":
+        return await perform_generate_urls(arguments or {})
+    elif name == "scrape":
+        return await perform_scrape(arguments or {})
+    elif name == "categorize":
+        return await perform_categorize(arguments or {})
+    elif name == "summarize":
+        return await perform_summarize(arguments or {})
     else:
         raise ValueError(f"Unknown tool: {name}")
 
+async def profiled(handler, args: dict) -> list[TextContent]:
+    """Run a tool call under RequestProfiler and append the profile as a JSON text item."""
+    # The call hops between the event loop and worker threads, so sample every busy thread
+    profiler = RequestProfiler(label=str(args.get("query", "")))
+    if not profiler.start():
+        contents = await handler(args)
+        return contents + [TextContent(type="text", text=json.dumps({"profile": {"error": "Another request is being profiled"}}))]
+    try:
+        contents = await handler(args)
+    finally:
+        profile = profiler.stop()
+        profiles.add(profile)
+    logger.info(f"Profiled request {profile['id']}: {profile['duration_s']}s, {profile['samples']} samples, "
+                f"peak {profile['memory']['peak_kb']} KB")
+    return contents + [TextContent(type="text", text=json.dumps({"profile": profile}))]
+
 async def perform_deep_research(args: dict) -> list[TextContent]:
     query = args.get("query", "").strip()
     start_date = args.get("start_date", "").strip()
     end_date = args.get("end_date", "").strip()
     max_sources = args.get("max_sources", 5)
+    structured = bool(args.get("structured", False))
+    force_refresh = bool(args.get("force_refresh", False))
+    # Adaptive mode stops collecting sources once they add little new
+    gain = adaptive_gain(query, args)
+    cache_options = {"structured": structured}
+    if gain is not None:
+        cache_options["min_gain"] = gain.min_gain
 
     if not query:
         return [TextContent(type="text", text="Error: Query cannot be empty")]
+    try:
+        date_filter = build_date_filter(start_date, end_date)
+    except ValueError as e:
+        return [TextContent(type="text", text=f"Error: {e}")]
 
+    ticket = None
     try:
         global model, rapid_agent
         if model is None or rapid_agent is None:
             initialize_components()
 
-        date_filter = {}
-        if start_date:
-            date_filter["start"] = start_date + "T00:00:00Z"
-        if end_date:
-            date_filter["end"] = end_date + "T23:59:59Z"
-
-        logger.info(f"Starting research for query: {query}")
-        initial_output = model.generate_text(query)
-
-        urls, aggregated_content = [], ""
+        # The same question in other words, casing or order is served from the report cache
+        if not force_refresh:
+            hit = report_cache.lookup(query, date_filter, max_sources, **cache_options)
+            if hit:
+                logger.info(f"Serving cached report ({hit['match']} match for '{hit['cached_query']}')")
+                note = f"_Served from cache: {hit['match']} match for \"{hit['cached_query']}\", {hit['age_s'] / 60:.0f} min old._"
+                contents = [TextContent(type="text", text=f"{hit['report']['text']}\n\n{note}")]
+                if structured:
+                    contents.append(TextContent(type="text", text=json.dumps({"facts": hit['report']['facts']})))
+                return contents
+
+        # MCP callers are scheduled as batch work unless they ask otherwise
         try:
-            rapidai_data = rapid_agent.fetch_data(query, max_results=max_sources)
-            urls = rapidai_data.get("urls", [])
-            aggregated_content = rapidai_data.get("content", "")
-            logger.info(f"Retrieved {len(urls)} URLs from RapidAI")
-        except Exception as e:
-            logger.warning(f"RapidAI fetch failed: {e}")
+            ticket = await admit(parse_priority(args.get("priority"), BATCH))
+        except Overloaded as e:
+            logger.warning(f"Rejected research request: {e}")
+            return [TextContent(type="text", text=f"Server busy, retry in {e.retry_after}s: {e}")]
+        max_sources, summary_tokens = ticket.limits(max_sources, 400)
 
-        if not urls:
-            logger.info("Generating URLs using url_generator...")
-            urls = generate_urls(query)
+        # Follow-up queries in a session reuse its documents and summaries
+        session = sessions.get_or_create(args.get("session_id"))
+        session.queries.append(query)
+        reused_documents = reused_summaries = 0
+
+        logger.info(f"Starting research for query: {query}")
+        # The draft answer and source selection don't depend on each other
+        initial_output, (source_urls, aggregated_content, dropped_by_date) = await asyncio.gather(
+            model.agenerate_text(query),
+            asyncio.to_thread(select_sources, query, date_filter, max_sources),
+        )
 
         logger.info("Scraping URLs...")
-        scraped_texts = [scrape_multiple_urls([url], max_urls=1) for url in urls[:max_sources]]
+        if gain is not None:
+            gain.plan(source_urls)
+            gain.seed(aggregated_content)
+        used_urls, scraped_texts = [], []
+        for url in source_urls:
+            scraped_text = session.document(url, date_filter)
+            if scraped_text is not None:
+                reused_documents += 1
+            else:
+                scraped_text, dropped = await asyncio.to_thread(scrape, url, date_filter)
+                session.add_document(url, date_filter, scraped_text, dropped)
+                dropped_by_date += dropped
+            if gain is None or gain.add(url, scraped_text):
+                used_urls.append(url)
+                scraped_texts.append(scraped_text)
+            if gain is not None and gain.saturated:
+                logger.info(f"Sources saturated after {len(gain.scores)} of {len(source_urls)}, skipping the rest")
+                break
+        logger.info(f"Reused {reused_documents} documents from session {session.id}")
 
         logger.info("Categorizing scraped data...")
-        categorized_data = categorize_scraped_data(urls, scraped_texts, aggregated_content)
+        with span("categorize", documents=len(scraped_texts)) as trace:
+            categorized_data = categorize_scraped_data(used_urls, scraped_texts, aggregated_content)
+            trace.set(categories=len(categorized_data))
 
         logger.info("Generating category summaries with fact check prompt...")
         final_sections = []
+        facts = {}
+        generation_stats = {}
         for source, texts in categorized_data.items():
             combined_text = "\n\n".join(texts)
-            summary = model.enhanced_generation(
+            key = summary_key(source, texts, query, structured, summary_tokens)
+            cached = session.summary(source, key)
+            if cached is not None:
+                reused_summaries += 1
+                if structured:
+                    facts[source] = cached
+                    cached = render_facts(cached)
+                final_sections.append(f"### {source} Summary\n{cached}")
+                continue
+            if structured:
+                # Schema-constrained: no echo cleanup needed, output length is bounded
+                facts[source] = await model.astructured_generation(
+                    f"Extract ONLY facts present in the following text from {source} for the query: {query}. "
+                    f"Do not invent or hallucinate.",
+                    combined_text,
+                    # RapidAI text has no "--- Content from" header to take URLs from
+                    source_urls=["RapidAI"] if source == "RapidAI" else None,
+                    max_tokens=summary_tokens,
+                    timeout=600,
+                    stats=generation_stats,
+                )
+                session.add_summary(source, key, facts[source])
+                final_sections.append(f"### {source} Summary\n{render_facts(facts[source])}")
+                continue
+            summary = await model.aenhanced_generation(
                 f"Summarize ONLY facts present in the following text from {source} for the query: {query}. "
                 f"Do not invent or hallucinate. Return only structured headlines or facts that exactly appear in the input text. "
                 f"If there is not enough relevant information, say \"Not enough explicit information found.\"",
                 initial_output,
                 combined_text,
-                max_total_tokens=400,
+                max_total_tokens=summary_tokens,
                 chunk_size=200,
                 timeout=600,
+                stats=generation_stats,
             )
+            session.add_summary(source, key, summary)
             final_sections.append(f"### {source} Summary\n{summary}")
 
         final_output = "\n\n".join(final_sections)
-        return [TextContent(type="text", text=final_output)]
+        sessions.save(session)
+        generation_stats = summarize_stats(generation_stats)
+        logger.info(f"Generation stats: {generation_stats}")
+        if date_filter:
+            logger.info(f"Dropped {dropped_by_date} items outside the date range before summarization")
+            final_output += f"\n\n_{dropped_by_date} item(s) outside the requested date range were dropped before summarization._"
+        if gain is not None:
+            adaptive = gain.report()
+            logger.info(f"Adaptive mode avoided {adaptive['fetches_avoided']} fetches, "
+                        f"{adaptive['generations_avoided']} generations")
+            final_output += (f"\n\n_Adaptive mode: used {adaptive['sources_used']} of {adaptive['sources_planned']} "
+                             f"source(s), {adaptive['fetches_avoided']} fetch(es) and "
+                             f"{adaptive['generations_avoided']} summary generation(s) avoided._")
+        if ticket.degraded:
+            final_output += f"\n\n_Server busy: research was limited to {max_sources} source(s)._"
+        else:
+            report_cache.store(query, {"text": final_output, "facts": facts}, date_filter, max_sources,
+                               **cache_options)
+        logger.info(f"Session {session.id}: reused {reused_documents} documents, {reused_summaries} summaries")
+        final_output += f"\n\n_Session: {session.id} (pass as session_id to refine this research)_"
+        contents = [TextContent(type="text", text=final_output)]
+        if structured:
+            contents.append(TextContent(type="text", text=json.dumps({"facts": facts})))
+        return contents
 
     except Exception as e:
         logger.error(f"Research failed: {e}")
         return [TextContent(type="text", text=f"Research failed: {str(e)}")]
+    finally:
+        if ticket is not None:
+            ticket.release()
+
+async def perform_batch_research(args: dict) -> list[TextContent]:
+    queries = [str(q) for q in args.get("queries", []) if str(q).strip()]
+    max_sources = args.get("max_sources", 5)
+
+    if not queries:
+        return [TextContent(type="text", text="Error: queries cannot be empty")]
+
+    try:
+        global model, rapid_agent
+        if model is None or rapid_agent is None:
+            initialize_components()
+
+        ctx = server.request_context
+        progress_token = ctx.meta.progressToken if ctx.meta else None
+
+        try:
+            ticket = await admit(BATCH)
+        except Overloaded as e:
+            logger.warning(f"Rejected batch research request: {e}")
+            return [TextContent(type="text", text=f"Server busy, retry in {e.retry_after}s: {e}")]
+        max_sources, _ = ticket.limits(max_sources, 400)
+
+        with ticket:
+            logger.info(f"Starting batch research for {len(queries)} queries")
+            results = run_batch(queries, model, rapid_agent, max_sources=max_sources, scrape=scrape)
+            contents, done = [], 0
+            while True:
+                result = await asyncio.to_thread(next, results, None)
+                if result is None:
+                    break
+                if result.get("batch_complete"):
+                    contents.append(TextContent(type="text", text=json.dumps(result)))
+                    break
+
+                done += 1
+                contents.append(TextContent(type="text", text=f"## {result['query']}\n\n{result['final_summary']}"))
+                logger.info(f"Batch progress: {done}/{len(queries)} ('{result['query']}')")
+                if progress_token is not None:
+                    await ctx.session.send_progress_notification(progress_token, done, len(queries))
+
+        return contents
+
+    except Exception as e:
+        logger.error(f"Batch research failed: {e}")
+        return [TextContent(type="text", text=f"Batch research failed: {str(e)}")]
+
+def text_item(digest, text, known):
+    """A {content_hash, text} item; the text is left out when the client already holds it."""
+    item = {"content_hash": digest}
+    if digest not in known:
+        item["text"] = text
+    return item
+
+def resolve_text(entry):
+    """Text for a content hash or {"text": ...} entry; None if the hash was evicted."""
+    if isinstance(entry, dict):
+        if entry.get("text") is not None:
+            content_store.put(entry["text"])
+            return entry["text"]
+        entry = entry.get("content_hash", "")
+    return content_store.get(entry)
+
+async def report_progress(done, total):
+    ctx = server.request_context
+    if ctx.meta and ctx.meta.progressToken is not None:
+        await ctx.session.send_progress_notification(ctx.meta.progressToken, done, total)
+
+async def perform_generate_urls(args: dict) -> list[TextContent]:
+    query = args.get("query", "").strip()
+    if not query:
+        return [TextContent(type="text", text="Error: Query cannot be empty")]
+
+    try:
+        date_filter = build_date_filter(args.get("start_date", "").strip(), args.get("end_date", "").strip())
+        if model is None or rapid_agent is None:
+            initialize_components()
+        urls, aggregated_content, dropped_by_date = await asyncio.to_thread(
+            select_sources, query, date_filter, args.get("max_sources", 5)
+        )
+        result = {"urls": urls, "rapidai": None, "dropped_by_date": dropped_by_date}
+        if aggregated_content.strip():
+            digest = content_store.put(aggregated_content)
+            result["rapidai"] = {"source": "RapidAI", **text_item(digest, aggregated_content, set(args.get("known_hashes") or []))}
+        return [TextContent(type="text", text=json.dumps(result))]
+
+    except Exception as e:
+        logger.error(f"URL generation failed: {e}")
+        return [TextContent(type="text", text=f"URL generation failed: {str(e)}")]
+
+async def perform_scrape(args: dict) -> list[TextContent]:
+    urls = [str(u) for u in args.get("urls", []) if str(u).strip()]
+    if not urls:
+        return [TextContent(type="text", text="Error: urls cannot be empty")]
+
+    try:
+        date_filter = build_date_filter(args.get("start_date", "").strip(), args.get("end_date", "").strip())
+        if model is None or rapid_agent is None:
+            initialize_components()
+        known = set(args.get("known_hashes") or [])
+        semaphore = asyncio.Semaphore(STAGE_SCRAPE_CONCURRENCY)
+
+        async def fetch(index, url):
+            async with semaphore:
+                try:
+                    text, dropped = await asyncio.to_thread(scrape, url, date_filter)
+                    return index, text, dropped, None
+                except Exception as e:
+                    return index, "", 0, str(e)
+
+        documents = [None] * len(urls)
+        dropped_by_date = 0
+        for done, next_done in enumerate(asyncio.as_completed([fetch(i, url) for i, url in enumerate(urls)]), 1):
+            index, text, dropped, error = await next_done
+            documents[index] = {"url": urls[index], **text_item(content_store.put(text), text, known)}
+            if error:
+                documents[index]["error"] = error
+            dropped_by_date += dropped
+            await report_progress(done, len(urls))
+
+        return [TextContent(type="text", text=json.dumps({"documents": documents, "dropped_by_date": dropped_by_date}))]
+
+    except Exception as e:
+        logger.error(f"Scrape failed: {e}")
+        return [TextContent(type="text", text=f"Scrape failed: {str(e)}")]
+
+async def perform_categorize(args: dict) -> list[TextContent]:
+    categories = {}
+    for doc in args.get("documents") or []:
+        digest = doc.get("content_hash")
+        if doc.get("text") is not None:
+            digest = content_store.put(doc["text"])
+        if digest == EMPTY_HASH:
+            continue  # nothing survived scraping, same as deep_research
+        entry = categories.setdefault(doc.get("source") or source_category(doc.get("url", "")),
+                                      {"urls": [], "content_hashes": []})
+        if doc.get("url"):
+            entry["urls"].append(doc["url"])
+        if digest:
+            entry["content_hashes"].append(digest)
+    return [TextContent(type="text", text=json.dumps({"categories": categories}))]
+
+async def perform_summarize(args: dict) -> list[TextContent]:
+    query = args.get("query", "").strip()
+    categories = args.get("categories") or {}
+    structured = bool(args.get("structured", False))
+    known = set(args.get("known_hashes") or [])
+
+    if not query or not categories:
+        return [TextContent(type="text", text="Error: query and categories are required")]
+
+    try:
+        if model is None or rapid_agent is None:
+            initialize_components()
+        try:
+            ticket = await admit(parse_priority(args.get("priority"), BATCH))
+        except Overloaded as e:
+            logger.warning(f"Rejected summarize request: {e}")
+            return [TextContent(type="text", text=f"Server busy, retry in {e.retry_after}s: {e}")]
+        _, summary_tokens = ticket.limits(1, args.get("max_tokens", 400))
+
+        with ticket:
+            summaries, generation_stats = {}, {}
+            for done, (source, entries) in enumerate(categories.items(), 1):
+                texts = [resolve_text(entry) for entry in entries]
+                missing = [entry for entry, text in zip(entries, texts) if text is None]
+                if missing:
+                    # Evicted from the content store: the client resends these as {"text": ...}
+                    summaries[source] = {"missing_hashes": missing}
+                    await report_progress(done, len(categories))
+                    continue
+
+                # The query is part of the key: a summary is written for one question
+                key = summary_key(source, texts, query, structured, summary_tokens)
+                if key in known:
+                    summaries[source] = {"summary_hash": key, "known": True}
+                    await report_progress(done, len(categories))
+                    continue
+
+                stored = content_store.get(key)
+                if stored is not None:
+                    summary, cached = json.loads(stored), True
+                else:
+                    summary, cached = await summarize_texts(
+                        query, source, texts, structured, summary_tokens, generation_stats
+                    ), False
+                    content_store.put(json.dumps(summary), key=key)
+
+                summaries[source] = {
+                    "summary_hash": key,
+                    "summary": render_facts(summary) if structured else summary,
+                    "cached": cached,
+                }
+                if structured:
+                    summaries[source]["facts"] = summary
+                await report_progress(done, len(categories))
+
+        result = {"summaries": summaries, "generation_stats": summarize_stats(generation_stats)}
+        return [TextContent(type="text", text=json.dumps(result))]
+
+    except Exception as e:
+        logger.error(f"Summarize failed: {e}")
+        return [TextContent(type="text", text=f"Summarize failed: {str(e)}")]
+
+async def initial_draft(query):
+    """
+    The draft answer used as summary context, generated once per query rather
+    than per category. staged_research summarizes its categories concurrently,
+    so callers that miss the content store wait on the same generation.
+    """
+    initial_key = summary_key("initial", [query])
+    cached = content_store.get(initial_key)
+    if cached is not None:
+        return cached
+    task = initial_drafts.get(initial_key)
+    if task is None:
+        task = asyncio.ensure_future(model.agenerate_text(query))
+        initial_drafts[initial_key] = task
+
+        def done(t):
+            initial_drafts.pop(initial_key, None)
+            if not t.cancelled() and t.exception() is None:
+                content_store.put(t.result(), key=initial_key)
+
+        task.add_done_callback(done)
+    # One caller giving up must not cancel the generation the others wait on
+    return await asyncio.shield(task)
+
+async def summarize_texts(query, source, texts, structured, summary_tokens, stats):
+    """One category summary with the deep_research prompts."""
+    combined_text = "\n\n".join(texts)
+    if structured:
+        return await model.astructured_generation(
+            f"Extract ONLY facts present in the following text from {source} for the query: {query}. "
+            f"Do not invent or hallucinate.",
+            combined_text,
+            source_urls=["RapidAI"] if source == "RapidAI" else None,
+            max_tokens=summary_tokens,
+            timeout=600,
+            stats=stats,
+        )
+    initial_output = await initial_draft(query)
+    return await model.aenhanced_generation(
+        f"Summarize ONLY facts present in the following text from {source} for the query: {query}. "
+        f"Do not invent or hallucinate. Return only structured headlines or facts that exactly appear in the input text. "
+        f"If there is not enough relevant information, say \"Not enough explicit information found.\"",
+        initial_output,
+        combined_text,
+        max_total_tokens=summary_tokens,
+        chunk_size=200,
+        timeout=600,
+        stats=stats,
+    )
 
 async def main():
     try:
+        if configure_tracing("mcp-server"):
+            logger.info("Tracing enabled")
         initialize_components()
+        if broker is None:
+            # Pay the model load before the first tool call, not during it
+            logger.info(f"Model warmed up in {warm_up(model)}s")
         async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
             await server.run(
                 read_stream,